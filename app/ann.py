@@ -0,0 +1,241 @@
+import os
+
+import numpy as np
+
+import metricas
+
+# Camada de índice vetorial (ANN) sobre o armazém em disco (vetores.py). Os
+# vetores são normalizados e comparados por produto interno (= similaridade de
+# cosseno, a métrica do MiniLM). Três tipos:
+#   'flat'  -> busca exata varrendo o arquivo mapeado; nada além dele na memória
+#   'hnsw'  -> grafo HNSW com vetores em 8 bits, recall alto em corpora médios
+#   'ivfpq' -> IVF + product quantization, ~48 bytes por vetor em corpora grandes
+# A posição i no índice FAISS é a linha i do armazém, então as lápides e o mapa
+# posição -> chave vêm de lá. Os candidatos do HNSW/IVF-PQ são reordenados com
+# os vetores originais lidos do arquivo (só as páginas desses candidatos).
+LIMITE_FLAT = 20_000
+LIMITE_HNSW = 500_000
+TIPO_FORCADO = os.getenv("MEMORO_ANN")  # 'flat', 'hnsw' ou 'ivfpq' ignora a escolha automática
+
+# Recall x latência (ver benchmarks/ann.py)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+PQ_SUBVETORES = 48  # 384 / 48 = 8 dimensões por subquantizador
+PQ_BITS = 8
+REFINO = 16  # IVF-PQ busca k * REFINO candidatos e reordena pelos vetores do armazém
+REFINO_HNSW = 2
+AMOSTRA_TREINO = 50_000
+LAPIDES_MAX = 0.2  # fração de posições mortas que dispara reconstrução
+
+TIPOS = ('flat', 'hnsw', 'ivfpq')
+
+
+def escolher_tipo(n: int) -> str:
+    if TIPO_FORCADO in TIPOS and (TIPO_FORCADO != 'ivfpq' or n >= 39 * 2 ** PQ_BITS):
+        return TIPO_FORCADO
+    if n < LIMITE_FLAT:
+        return 'flat'
+    if n < LIMITE_HNSW or n < 39 * 2 ** PQ_BITS:
+        return 'hnsw'  # IVF-PQ precisa de pontos suficientes para treinar os codebooks
+    return 'ivfpq'
+
+
+def normalizar(vetores):
+    import faiss
+    vetores = np.array(vetores, dtype='float32', ndmin=2)  # cópia: normalize_L2 altera no lugar
+    faiss.normalize_L2(vetores)
+    return vetores
+
+
+def _listas_ivf(n: int) -> int:
+    # ~4*sqrt(n) listas, com pelo menos 39 pontos de treino por lista
+    return max(1, min(int(4 * np.sqrt(n)), n // 39, 65536))
+
+
+def criar_faiss(tipo: str, dimensao: int, n: int = 0):
+    import faiss
+    if tipo == 'hnsw':
+        index = faiss.IndexHNSWSQ(dimensao, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    if tipo == 'ivfpq':
+        quantizador = faiss.IndexFlatIP(dimensao)
+        index = faiss.IndexIVFPQ(quantizador, dimensao, _listas_ivf(n), PQ_SUBVETORES, PQ_BITS,
+                                 faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = IVF_NPROBE
+        return index
+    raise ValueError(f"Tipo de índice desconhecido: {tipo}")
+
+
+def _amostra_treino(armazem):
+    vivas = np.flatnonzero(np.asarray(armazem.chaves) != -1)
+    if len(vivas) > AMOSTRA_TREINO:
+        vivas = np.sort(np.random.default_rng(0).choice(vivas, AMOSTRA_TREINO, replace=False))
+    return np.ascontiguousarray(armazem.vetores[vivas])
+
+
+class IndiceVetorial:
+
+    def __init__(self, armazem, tipo: str, index=None):
+        self.armazem = armazem
+        self.tipo = tipo
+        self.index = index  # None no flat: a busca varre o armazém
+        self.refino = REFINO_HNSW if tipo == 'hnsw' else REFINO
+
+    @classmethod
+    def construir(cls, armazem, tipo: str = None):
+        # Treina (HNSW-SQ/IVF-PQ) e preenche lendo o armazém em blocos; pode levar minutos em corpora grandes
+        tipo = tipo or escolher_tipo(armazem.ntotal)
+        with metricas.medir('index.build', tipo=tipo):
+            if tipo == 'flat':
+                return cls(armazem, tipo)
+            index = criar_faiss(tipo, armazem.dimensao, armazem.ntotal)
+            if len(armazem):
+                index.train(_amostra_treino(armazem))
+                _anexar_blocos(index, armazem)
+            return cls(armazem, tipo, index)
+
+    @property
+    def ntotal(self) -> int:
+        return self.armazem.ntotal
+
+    @property
+    def lapides(self) -> int:
+        return self.armazem.lapides
+
+    def contem(self, chave: int) -> bool:
+        return self.armazem.posicao(chave) is not None
+
+    def ids(self):
+        return self.armazem.ids()
+
+    def precisa_reconstruir(self) -> bool:
+        if len(self.armazem) and self.lapides / len(self.armazem) > LAPIDES_MAX:
+            return True
+        return escolher_tipo(self.ntotal) != self.tipo
+
+    def configurar(self, ef_search: int = None, nprobe: int = None, refino: int = None):
+        if ef_search is not None and self.tipo == 'hnsw':
+            self.index.hnsw.efSearch = ef_search
+        if nprobe is not None and self.tipo == 'ivfpq':
+            self.index.nprobe = nprobe
+        if refino is not None and self.tipo == 'ivfpq':
+            self.refino = refino
+
+    def remover(self, ids):
+        self.armazem.remover(ids)
+
+    def adicionar(self, ids, vetores):
+        ids = np.asarray(ids, dtype='int64')
+        vetores = normalizar(np.asarray(vetores, dtype='float32'))
+        self.armazem.remover(ids)
+        self.armazem.anexar(ids, vetores)
+        if self.index is not None:
+            self.index.add(vetores)
+
+    def _varrer(self, consulta, k: int):
+        # Busca exata bloco a bloco: só um bloco de vetores por vez fora do cache de páginas
+        melhores_sim = np.full((len(consulta), 0), -np.inf, dtype='float32')
+        melhores_pos = np.zeros((len(consulta), 0), dtype='int64')
+        for inicio, chaves, vetores in self.armazem.blocos():
+            similaridades = consulta @ np.asarray(vetores).T
+            similaridades[:, chaves == -1] = -np.inf
+            posicoes = np.broadcast_to(np.arange(inicio, inicio + len(chaves)), similaridades.shape)
+            similaridades = np.concatenate([melhores_sim, similaridades], axis=1)
+            posicoes = np.concatenate([melhores_pos, posicoes], axis=1)
+            if similaridades.shape[1] > k:
+                topo = np.argpartition(-similaridades, k - 1, axis=1)[:, :k]
+                similaridades = np.take_along_axis(similaridades, topo, axis=1)
+                posicoes = np.take_along_axis(posicoes, topo, axis=1)
+            melhores_sim, melhores_pos = similaridades, posicoes
+        return [melhores_pos[linha][np.isfinite(melhores_sim[linha])] for linha in range(len(consulta))]
+
+    def _candidatos(self, consulta, k: int):
+        # Posições vivas vindas do FAISS; pede mais se as lápides comerem os k
+        total = len(self.armazem)
+        pedir = min(k * self.refino, total)
+        while True:
+            _, posicoes = self.index.search(consulta, pedir)
+            chaves = np.asarray(self.armazem.chaves)
+            candidatos = [linha[(linha >= 0) & (chaves[np.maximum(linha, 0)] != -1)] for linha in posicoes]
+            if pedir == total or min(len(c) for c in candidatos) >= min(k, self.ntotal):
+                return candidatos
+            pedir = min(pedir * 4, total)
+
+    def buscar(self, vetores, k: int):
+        # Devolve (similaridades, ids) como index.search, já sem as lápides
+        saida_ids = np.full((len(vetores), k), -1, dtype='int64')
+        saida_sim = np.zeros((len(vetores), k), dtype='float32')
+        if self.ntotal == 0:
+            return saida_sim, saida_ids
+        with metricas.medir('index.search', tipo=self.tipo):
+            consulta = normalizar(np.asarray(vetores, dtype='float32'))
+            if self.index is None:
+                candidatos = self._varrer(consulta, k)
+            else:
+                candidatos = self._candidatos(consulta, k)
+            for linha, posicoes in enumerate(candidatos):
+                # Similaridade exata com os vetores do armazém (lê só essas linhas)
+                posicoes = np.sort(posicoes)
+                similaridades = np.asarray(self.armazem.vetores[posicoes]) @ consulta[linha]
+                ordem = np.argsort(-similaridades)[:k]
+                saida_ids[linha, :len(ordem)] = self.armazem.chaves[posicoes[ordem]]
+                saida_sim[linha, :len(ordem)] = similaridades[ordem]
+            return saida_sim, saida_ids
+
+    def buscar_entre(self, vetores, chaves, k: int):
+        # Como buscar(), mas exata e só entre estas chaves (pré-filtro): lê do
+        # armazém apenas as linhas delas, sem passar pelo FAISS
+        saida_ids = np.full((len(vetores), k), -1, dtype='int64')
+        saida_sim = np.zeros((len(vetores), k), dtype='float32')
+        posicoes = self.armazem.posicoes(chaves)
+        if len(posicoes) == 0:
+            return saida_sim, saida_ids
+        with metricas.medir('index.search', tipo='prefiltro'):
+            consulta = normalizar(np.asarray(vetores, dtype='float32'))
+            similaridades = np.asarray(self.armazem.vetores[posicoes]) @ consulta.T
+            for linha in range(len(consulta)):
+                ordem = np.argsort(-similaridades[:, linha])[:k]
+                saida_ids[linha, :len(ordem)] = self.armazem.chaves[posicoes[ordem]]
+                saida_sim[linha, :len(ordem)] = similaridades[ordem, linha]
+            return saida_sim, saida_ids
+
+    def salvar(self):
+        # Os vetores já estão no armazém; aqui só a estrutura do FAISS (grafo, códigos)
+        import faiss
+        self.armazem.sincronizar()
+        if self.index is None:
+            return
+        caminho = self.armazem.caminho + ".faiss"
+        faiss.write_index(self.index, caminho + ".tmp")
+        os.replace(caminho + ".tmp", caminho)
+
+    @classmethod
+    def ler(cls, armazem):
+        import faiss
+        caminho = armazem.caminho + ".faiss"
+        if not os.path.exists(caminho):
+            return cls(armazem, 'flat')
+        index = faiss.read_index(caminho)
+        if index.d != armazem.dimensao or index.ntotal > len(armazem):
+            raise ValueError("índice FAISS não bate com o armazém")
+        if isinstance(index, faiss.IndexHNSW):
+            tipo = 'hnsw'
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        elif isinstance(index, faiss.IndexIVFPQ):
+            tipo = 'ivfpq'
+            index.nprobe = IVF_NPROBE
+        else:
+            raise ValueError(f"tipo de índice não suportado: {type(index).__name__}")
+        # Linhas anexadas depois do último salvamento estão no armazém mas não no FAISS
+        _anexar_blocos(index, armazem, index.ntotal)
+        return cls(armazem, tipo, index)
+
+
+def _anexar_blocos(index, armazem, inicio: int = 0):
+    # Lápides entram também: a posição no FAISS tem de ser a linha do armazém
+    for _, _, vetores in armazem.blocos(inicio):
+        index.add(np.ascontiguousarray(vetores))
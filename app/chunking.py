@@ -0,0 +1,53 @@
+import re
+
+# Divide o conteúdo em trechos sobrepostos para o embedding: o MiniLM corta a
+# entrada em 256 word-pieces, então um vetor só para a nota inteira enxerga
+# apenas o começo. ~150 palavras em português cabem folgadas nesse limite.
+PALAVRAS_POR_TRECHO = 150
+SOBREPOSICAO = 30
+# O índice de um trecho ocupa db.BITS_TRECHO bits da chave no índice vetorial;
+# num texto maior que isso (~8 milhões de palavras) o último trecho vai até o fim
+MAXIMO_TRECHOS = 1 << 16
+
+_PALAVRA = re.compile(r'\S+')
+
+
+def dividir(texto: str, tamanho: int = PALAVRAS_POR_TRECHO, sobreposicao: int = SOBREPOSICAO):
+    # Lista de (inicio, fim) em caracteres de `texto`; sempre ao menos um trecho
+    palavras = [(m.start(), m.end()) for m in _PALAVRA.finditer(texto)]
+    if len(palavras) <= tamanho:
+        return [(0, len(texto))]
+    passo = max(1, tamanho - sobreposicao)
+    trechos = []
+    for inicio in range(0, len(palavras), passo):
+        fim = min(inicio + tamanho, len(palavras))
+        if len(trechos) == MAXIMO_TRECHOS - 1:
+            fim = len(palavras)
+        trechos.append((palavras[inicio][0], palavras[fim - 1][1]))
+        if fim == len(palavras):
+            break
+    return trechos
+
+
+def quantidade(texto: str) -> int:
+    return len(dividir(texto))
+
+
+def dividir_por_caracteres(texto: str, maximo: int):
+    # Lista de (inicio, fim) sem sobreposição com até `maximo` caracteres cada,
+    # cortando de preferência num parágrafo e, se não houver, num espaço
+    trechos = []
+    inicio = 0
+    while len(texto) - inicio > maximo:
+        janela = texto[inicio:inicio + maximo]
+        corte = janela.rfind('\n\n', maximo // 2)
+        if corte == -1:
+            corte = max(janela.rfind('\n', maximo // 2), janela.rfind(' ', maximo // 2))
+        fim = inicio + (corte if corte > 0 else maximo)
+        trechos.append((inicio, fim))
+        inicio = fim
+        while inicio < len(texto) and texto[inicio].isspace():
+            inicio += 1
+    if inicio < len(texto) or not trechos:
+        trechos.append((inicio, len(texto)))
+    return trechos
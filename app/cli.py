@@ -0,0 +1,253 @@
+import argparse
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+
+import db
+import metricas
+
+
+def cmd_migrate_embeddings(args):
+    pendentes = db.count_legacy_embeddings()
+    if not pendentes:
+        print("✅ Nenhum embedding no formato antigo.")
+        return
+    print(f"🔄 Convertendo {pendentes} embeddings para BLOB float32 (lotes de {args.batch_size})...")
+    total = db.migrate_embeddings_to_blob(
+        batch_size=args.batch_size,
+        progresso=lambda n: print(f"   {n}/{pendentes}"),
+    )
+    print(f"✅ {total} embeddings convertidos.")
+
+
+def cmd_import(args):
+    import importer
+
+    def progresso(feitos, total, por_segundo):
+        print(f"📥 {feitos}/{total} arquivos · {por_segundo:.1f} notas/s")
+
+    resultado = importer.importar_diretorio(
+        args.diretorio,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        enriquecer_agora=not args.skip_enrichment,
+        progresso=progresso,
+    )
+    print(f"✅ {resultado['importadas']} notas importadas de {resultado['total']} arquivos novos "
+          f"em {resultado['segundos']:.1f}s ({resultado['falhas']} falhas).")
+    if args.skip_enrichment:
+        print("ℹ️ Resumo e tags ficaram pendentes: rode `python app/cli.py enrich` depois.")
+
+
+def cmd_enrich(args):
+    import importer
+    if args.retry_failed:
+        print(f"🔁 {db.retry_failed_jobs()} jobs com falha voltaram para a fila")
+    feitas = importer.enriquecer_pendentes(
+        workers=args.workers,
+        progresso=lambda ok, falhas: print(f"🧠 {ok} jobs concluídos · {falhas} com falha"),
+        timeout=args.timeout,
+    )
+    print(f"✅ {feitas['done']} jobs concluídos, {feitas['failed']} falharam.")
+
+
+def cmd_reindex(args):
+    import ia
+    import reindexer
+    if args.all:
+        print(f"♻️ {db.mark_all_stale()} notas marcadas para reindexar")
+    pendentes = db.count_stale_notes(ia.MODEL_EMBEDDING)
+    if not pendentes:
+        print(f"✅ Todos os embeddings estão em dia ({ia.MODEL_EMBEDDING}).")
+        return
+
+    def progresso(feitas, total, notas_por_s, trechos_por_s):
+        print(f"🧮 {feitas}/{total} notas · {notas_por_s:.1f} notas/s · {trechos_por_s:.1f} trechos/s")
+
+    import embeddings
+    embeddings.carregar_indice()
+    resultado = reindexer.reindexar(tamanho=args.batch_size, limite=args.limit, progresso=progresso)
+    embeddings.salvar_indice()
+    print(f"✅ {resultado['notas']} notas ({resultado['trechos']} trechos) reindexadas em "
+          f"{resultado['segundos']:.1f}s ({resultado['notas_por_s']:.1f} notas/s).")
+
+
+def cmd_related(args):
+    import embeddings
+    import relacionadas
+    if args.rebuild:
+        embeddings.carregar_indice()
+        resultado = relacionadas.reconstruir(
+            progresso=lambda feitas, total: print(f"🔗 {feitas}/{total} notas"),
+        )
+        print(f"✅ Vizinhas de {resultado['notas']} notas calculadas em {resultado['segundos']:.1f}s.")
+        return
+    if args.note_id is None:
+        print(f"🔗 {db.count_related()} notas com vizinhas calculadas (use --rebuild para refazer todas).")
+        return
+    vizinhas = db.get_related_notes(args.note_id, args.limit)
+    if vizinhas is None:
+        # No CLI não há worker da fila: calcula aqui mesmo
+        relacionadas.calcular([args.note_id])
+        vizinhas = db.get_related_notes(args.note_id, args.limit) or []
+    if not vizinhas:
+        print(f"ℹ️ Nenhuma nota relacionada a {args.note_id}.")
+    for vizinha, resumo, _, timestamp, score in vizinhas:
+        print(f"{score:6.3f}  #{vizinha:<6} {timestamp[:10]}  {(resumo or '—')[:80]}")
+
+
+def cmd_serve(args):
+    import server
+    try:
+        tokens = server.carregar_tokens(args.tokens) if args.tokens else None
+        server.servir(args.host, args.port, threads=args.threads, aquecer=not args.lazy_model,
+                      tokens=tokens, permitir_remoto=args.allow_remote)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+
+
+def cmd_export(args):
+    import exporter
+    # Com destino '-' o arquivo vai para a saída padrão; os avisos, para stderr
+    saida = sys.stderr if args.destino == '-' else sys.stdout
+    try:
+        resultado = exporter.exportar(
+            args.destino,
+            formato=args.format,
+            desde=args.since,
+            ate=args.until,
+            tags=args.tag,
+            modo_tags='or' if args.any_tag else 'and',
+            com_embeddings=args.with_embeddings,
+            progresso=lambda n: print(f"📤 {n} notas exportadas...", file=saida),
+        )
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(2)
+    tamanho = f" ({resultado['bytes'] / 1e6:.1f} MB)" if resultado['bytes'] is not None else ""
+    print(f"✅ {resultado['notas']} notas exportadas para {resultado['caminho']}{tamanho} "
+          f"em {resultado['segundos']:.1f}s.", file=saida)
+
+
+def cmd_cache(args):
+    import llm_cache
+    if args.clear:
+        llm_cache.limpar()
+        print("🧹 Cache de respostas da IA esvaziado.")
+        return
+    stats = llm_cache.estatisticas()
+    print(f"🧠 Respostas da IA em cache: {stats['itens_disco']} "
+          f"(até {llm_cache.MAX_ITENS}, por no máximo {llm_cache.MAX_IDADE_DIAS} dias)")
+    print(f"♻️ Chamadas ao OpenRouter evitadas até agora: {stats['hits_acumulados']}")
+
+
+def cmd_usage(args):
+    linhas = db.get_llm_usage(args.since)
+    if not linhas:
+        print("ℹ️ Nenhuma chamada à IA registrada no período.")
+        return
+    print(f"{'tipo':<15} {'modelo':<42} {'chamadas':>8} {'falhas':>6} {'entrada':>9} {'saída':>8} "
+          f"{'média ms':>9} {'máx ms':>8}")
+    for tipo, modelo, chamadas, falhas, entrada, saida, media, maximo in linhas:
+        print(f"{tipo:<15} {modelo:<42} {chamadas:>8} {falhas:>6} {entrada:>9} {saida:>8} "
+              f"{media or 0:>9.0f} {maximo or 0:>8.0f}")
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: {valor!r} (use AAAA-MM-DD)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="memoro", description="Ferramentas de linha de comando do Memoro")
+    parser.add_argument("--user", help="opera no banco deste usuário (usuarios/<id>.db) em vez do padrão")
+    parser.add_argument("--trace", metavar="ARQ.jsonl",
+                        help="grava cada operação medida (span) em JSON lines e mostra um resumo no fim")
+    parser.add_argument("--profile", metavar="ARQ.prof", help="roda o comando sob cProfile e salva as estatísticas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("migrate-embeddings", help="converte embeddings JSON antigos para BLOB float32")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=cmd_migrate_embeddings)
+
+    p = sub.add_parser("import", help="importa uma pasta de textos (.txt/.md) e imagens (OCR)")
+    p.add_argument("diretorio")
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--workers", type=int, default=4, help="threads para OCR e chamadas à IA")
+    p.add_argument("--skip-enrichment", action="store_true", help="não gera resumo/tags agora (ver `enrich`)")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("enrich", help="processa a fila de enriquecimento (resumo, tags, embeddings) até esvaziar")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--timeout", type=float, default=None, help="segundos máximos de espera")
+    p.add_argument("--retry-failed", action="store_true", help="reenfileira jobs que já desistiram")
+    p.set_defaults(func=cmd_enrich)
+
+    p = sub.add_parser("reindex", help="refaz embeddings de notas editadas, sem vetor ou de outro modelo")
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--limit", type=int, default=None, help="no máximo N notas nesta execução")
+    p.add_argument("--all", action="store_true", help="reindexa todas as notas, mesmo as que estão em dia")
+    p.set_defaults(func=cmd_reindex)
+
+    p = sub.add_parser("related", help="notas relacionadas (grafo kNN guardado) de uma nota, ou --rebuild")
+    p.add_argument("note_id", type=int, nargs="?")
+    p.add_argument("--limit", type=int, default=8)
+    p.add_argument("--rebuild", action="store_true", help="recalcula as vizinhas de todas as notas em lote")
+    p.set_defaults(func=cmd_related)
+
+    p = sub.add_parser("serve", help="API HTTP local (JSON) com modelo e índice carregados")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--lazy-model", action="store_true", help="carrega o modelo só na primeira busca")
+    p.add_argument("--tokens", metavar="ARQ.json",
+                   help='exige Authorization: Bearer; {"<token>": "<usuário>" ou null} (ver server.py)')
+    p.add_argument("--allow-remote", action="store_true",
+                   help="escuta fora de loopback mesmo sem --tokens (qualquer um na rede lê e grava as notas)")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("cache", help="mostra ou esvazia o cache de resumos e tags gerados pela IA")
+    p.add_argument("--clear", action="store_true", help="apaga todas as respostas guardadas")
+    p.set_defaults(func=cmd_cache)
+
+    p = sub.add_parser("usage", help="tokens e latência das chamadas à IA, por tipo e modelo")
+    p.add_argument("--since", type=_data, help="só chamadas a partir desta data (AAAA-MM-DD)")
+    p.set_defaults(func=cmd_usage)
+
+    p = sub.add_parser("export", help="exporta as notas para Markdown, JSONL ou zip (ex.: backup agendado)")
+    p.add_argument("destino", help="arquivo de saída (.md, .jsonl ou .zip) ou '-' para a saída padrão")
+    p.add_argument("--format", choices=["md", "jsonl", "zip"], help="padrão: pela extensão do destino")
+    p.add_argument("--since", type=_data, help="só notas a partir desta data (AAAA-MM-DD)")
+    p.add_argument("--until", type=_data, help="só notas até esta data, inclusive (AAAA-MM-DD)")
+    p.add_argument("--tag", action="append", help="só notas com esta tag (repita para exigir várias)")
+    p.add_argument("--any-tag", action="store_true", help="com várias --tag, basta ter uma delas")
+    p.add_argument("--with-embeddings", action="store_true", help="inclui os vetores de cada trecho no JSONL")
+    p.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.user is not None:
+        try:
+            db.caminho_usuario(args.user)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.trace:
+        metricas.SQL = metricas.ATIVO  # o trace inclui cada consulta (conexões abertas daqui em diante)
+        metricas.gravar_jsonl(args.trace)
+    with db.usuario(args.user), metricas.perfilar(args.profile) if args.profile else nullcontext():
+        db.init_db()
+        args.func(args)
+    if args.trace:
+        metricas.gravar_jsonl(None)
+        print(metricas.resumo(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
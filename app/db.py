@@ -1,64 +1,703 @@
-from datetime import datetime
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import contextvars
+import hashlib
 import sqlite3
 import os
 import json
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+import metricas
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'memoro.db')
 
-def save_note(content, summary, tags, embedding=None):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    timestamp = datetime.now().isoformat()
-    embedding_str = json.dumps(embedding) if embedding and isinstance(embedding, list) and len(embedding) == 384 else None
-    c.execute('''
-        INSERT INTO notes (content, summary, timestamp, tags, embedding)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (content, summary, timestamp, ','.join(tags), embedding_str))
-    conn.commit()
-    conn.close()
-
-
-def get_all_embeddings():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT id, embedding FROM notes WHERE embedding IS NOT NULL")
-    data = [(row[0], json.loads(row[1])) for row in c.fetchall()]
-    conn.close()
-    return data
-
-def adicionar_coluna_embedding():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+EMBEDDING_DIM = 384
+EMBEDDING_BYTES = EMBEDDING_DIM * 4  # float32
+# Cada trecho (note_chunks) entra no índice vetorial com a chave
+# note_id << BITS_TRECHO | chunk_index; ver chave_trecho()
+BITS_TRECHO = 16
+
+# Multiusuário: cada usuário tem o próprio arquivo (usuarios/<id>.db ao lado de
+# DB_PATH), com notas, fila de jobs e índice vetorial separados — uma busca
+# nunca enxerga vetores de outro usuário. O usuário vale para o contexto atual
+# (`with usuario(id):`); fora disso é o banco padrão, o do app desktop.
+_usuario = contextvars.ContextVar('memoro_usuario', default=None)
+_ID_USUARIO = re.compile(r'[A-Za-z0-9_-]{1,64}')
+_inicializados = set()
+_inicializados_lock = threading.Lock()
+
+def pasta_usuarios():
+    return os.path.join(os.path.dirname(DB_PATH), 'usuarios')
+
+def caminho_usuario(user_id: str) -> str:
+    if not isinstance(user_id, str) or not _ID_USUARIO.fullmatch(user_id):
+        raise ValueError("Identificador de usuário inválido (use letras, números, '-' ou '_').")
+    return os.path.join(pasta_usuarios(), f"{user_id}.db")
+
+def usuario_atual():
+    return _usuario.get()
+
+def caminho_atual() -> str:
+    user_id = _usuario.get()
+    return DB_PATH if user_id is None else caminho_usuario(user_id)
+
+def listar_usuarios():
+    pasta = pasta_usuarios()
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(nome[:-3] for nome in os.listdir(pasta)
+                  if nome.endswith('.db') and _ID_USUARIO.fullmatch(nome[:-3]))
+
+@contextmanager
+def usuario(user_id):
+    # None = banco padrão. O banco do usuário é criado e migrado no primeiro uso.
+    caminho = DB_PATH if user_id is None else caminho_usuario(user_id)
+    token = _usuario.set(user_id)
     try:
-        c.execute("ALTER TABLE notes ADD COLUMN embedding TEXT")
-        conn.commit()
-    except sqlite3.OperationalError as e:
-        if "duplicate column name" not in str(e):
-            raise
-    conn.close()
+        if user_id is not None and caminho not in _inicializados:
+            with _inicializados_lock:
+                if caminho not in _inicializados:
+                    os.makedirs(pasta_usuarios(), exist_ok=True)
+                    init_db()
+        yield
+    finally:
+        _usuario.reset(token)
+
+# Conexões reutilizáveis por thread, uma por banco (sqlite3 não compartilha
+# conexões entre threads). Em modo WAL leitores não esperam o escritor;
+# autocommit por padrão e transaction() para operações com mais de um comando.
+CACHE_SIZE_KB = 20000
+BUSY_TIMEOUT_MS = 5000
+CONEXOES_POR_THREAD = 8  # bancos de usuários abertos ao mesmo tempo em cada thread
+
+_local = threading.local()
+
+# Com MEMORO_METRICAS_SQL=1 (metricas.SQL), cada execute vira um span 'sqlite'
+# com o nome da função que o chamou (get_notes_page, transaction...): o tempo
+# por consulta sem mudar os chamadores. Em SELECT o execute cobre o plano e a
+# primeira linha; fetch* não entra. Desligado, a conexão é a sqlite3 comum.
+def _medir_sql(executar, sql, parametros, funcao):
+    inicio = time.perf_counter()
+    try:
+        return executar(sql, parametros)
+    finally:
+        metricas.registrar('sqlite', (time.perf_counter() - inicio) * 1000, {"consulta": funcao})
+
+class _CursorMedido(sqlite3.Cursor):
+    def execute(self, sql, parametros=()):
+        return _medir_sql(super().execute, sql, parametros, sys._getframe(1).f_code.co_name)
+
+    def executemany(self, sql, parametros):
+        return _medir_sql(super().executemany, sql, parametros, sys._getframe(1).f_code.co_name)
+
+class _ConexaoMedida(sqlite3.Connection):
+    def cursor(self, factory=_CursorMedido):
+        return super().cursor(factory)
 
+    def execute(self, sql, parametros=()):
+        return _medir_sql(super().execute, sql, parametros, sys._getframe(1).f_code.co_name)
 
-def ensure_embedding_column_exists():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    def executemany(self, sql, parametros):
+        return _medir_sql(super().executemany, sql, parametros, sys._getframe(1).f_code.co_name)
+
+def get_connection():
+    caminho = caminho_atual()
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = OrderedDict()
+        _local.depth = 0
+    conn = conexoes.get(caminho)
+    if conn is not None:
+        conexoes.move_to_end(caminho)
+        return conn
+    conn = sqlite3.connect(caminho, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000,
+                           factory=_ConexaoMedida if metricas.SQL else sqlite3.Connection)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL em WAL: sem fsync a cada commit, ainda consistente após queda de energia
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conexoes[caminho] = conn
+    while len(conexoes) > CONEXOES_POR_THREAD:
+        _, antiga = conexoes.popitem(last=False)
+        antiga.close()
+    return conn
+
+def close_connection():
+    # Fecha as conexões desta thread (de todos os bancos)
+    conexoes = getattr(_local, 'conexoes', None)
+    while conexoes:
+        conexoes.popitem()[1].close()
+
+@contextmanager
+def transaction():
+    # BEGIN IMMEDIATE pega o lock de escrita logo no início (sem deadlock de
+    # upgrade leitura->escrita). Chamadas aninhadas reaproveitam a transação externa.
+    conn = get_connection()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    _local.depth = 1
     try:
-        c.execute("ALTER TABLE notes ADD COLUMN embedding TEXT")
-        conn.commit()
-        print("✅ Coluna 'embedding' adicionada com sucesso.")
-    except sqlite3.OperationalError as e:
-        if "duplicate column name" in str(e):
-            print("⚠️ A coluna 'embedding' já existe.")
-        else:
-            raise
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
     finally:
-        conn.close()
+        _local.depth = 0
+
+# Funções chamadas a cada alteração de nota: fn(evento, note_id, embedding)
+# com evento em 'save', 'update' ou 'delete' (ex.: índice FAISS em embeddings.py).
+# embedding é a matriz (n_trechos, 384) dos trechos da nota, ou None quando
+# eles não mudaram. Em 'save_many' e 'update_many' note_id e embedding são
+# listas alinhadas.
+_observadores = []
+
+def registrar_observador(fn):
+    if fn not in _observadores:
+        _observadores.append(fn)
+
+def _notificar(evento, note_id, embedding=None):
+    for fn in _observadores:
+        try:
+            fn(evento, note_id, embedding)
+        except Exception as e:
+            metricas.contar('erros', onde='observador')
+            print(f"⚠️ Falha ao propagar '{evento}' da nota {note_id}: {e}")
+
+def _embedding_para_blob(embedding):
+    if embedding is None:
+        return None
+    vetor = np.asarray(embedding, dtype=np.float32)
+    if vetor.shape != (EMBEDDING_DIM,):
+        return None
+    return vetor.tobytes()
+
+def chave_trecho(note_id: int, chunk_index: int) -> int:
+    # chunking.MAXIMO_TRECHOS mantém o índice dentro dos bits; passar disso
+    # faria a chave apontar para o trecho de outra nota
+    if not 0 <= chunk_index < 1 << BITS_TRECHO:
+        raise ValueError(f"trecho {chunk_index} da nota {note_id} não cabe em {BITS_TRECHO} bits")
+    return (note_id << BITS_TRECHO) | chunk_index
+
+def nota_da_chave(chave: int):
+    return chave >> BITS_TRECHO, chave & ((1 << BITS_TRECHO) - 1)
+
+def _trechos_padrao(content, embedding):
+    # Vetor único (chamadores antigos, fixtures): um trecho cobrindo a nota toda
+    blob = _embedding_para_blob(embedding)
+    if blob is None:
+        return None, None
+    return [(0, len(content))], np.asarray(embedding, dtype=np.float32).reshape(1, EMBEDDING_DIM)
+
+def hash_conteudo(content) -> str:
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+# Tags: notes.tags guarda o texto como o usuário vê ("Arte, Viagem"); tags e
+# note_tags são o índice para filtros e contagens. O nome normalizado (sem
+# acento, minúsculo) é a chave: "Arte" e "arte " são a mesma tag e "arte" não
+# casa com "artesanato". label é a primeira grafia vista, para exibição.
+MODOS_TAGS = ('and', 'or')
+
+def normalizar_tag(tag: str) -> str:
+    sem_acento = ''.join(ch for ch in unicodedata.normalize('NFKD', tag or '') if not unicodedata.combining(ch))
+    return ' '.join(sem_acento.casefold().strip().lstrip('#').split())
+
+def _separar_tags(tags):
+    # Lista ou texto separado por vírgula -> {normalizado: grafia original}, sem vazias nem repetidas
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    unicas = {}
+    for tag in tags or []:
+        nome = normalizar_tag(tag)
+        if nome and nome not in unicas:
+            unicas[nome] = ' '.join(tag.split())
+    return unicas
+
+def _gravar_tags(c, note_id, tags):
+    # Substitui as tags da nota no índice (dentro da transação de quem chama)
+    unicas = _separar_tags(tags)
+    c.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+    if not unicas:
+        return
+    c.executemany("INSERT OR IGNORE INTO tags (name, label) VALUES (?, ?)", list(unicas.items()))
+    c.executemany("INSERT OR IGNORE INTO note_tags (note_id, tag_id) SELECT ?, id FROM tags WHERE name = ?",
+                  [(note_id, nome) for nome in unicas])
+
+def _filtro_tags(tags, modo='and'):
+    # (subconsulta com os note_id que passam no filtro, parâmetros), ou None sem tags.
+    # 'and' exige todas as tags; 'or', qualquer uma.
+    if modo not in MODOS_TAGS:
+        raise ValueError(f"Modo de filtro de tags inválido: use {' ou '.join(MODOS_TAGS)}.")
+    nomes = list(_separar_tags(tags))
+    if not nomes:
+        return None
+    marcadores = ','.join('?' * len(nomes))
+    sql = f"SELECT nt.note_id FROM note_tags nt JOIN tags t ON t.id = nt.tag_id WHERE t.name IN ({marcadores})"
+    if modo == 'and' and len(nomes) > 1:
+        sql += f" GROUP BY nt.note_id HAVING COUNT(*) = {len(nomes)}"
+    return sql, nomes
+
+def _gravar_trechos(c, note_id, spans, vetores, content_hash=None, model=None):
+    # Substitui os trechos da nota; notes.embedding fica com a média normalizada.
+    # content_hash/model dizem de qual texto e modelo os vetores vieram: se não
+    # baterem com o conteúdo atual, a nota continua na fila do reindexador.
+    vetores = np.asarray(vetores, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    c.execute("DELETE FROM note_chunks WHERE note_id = ?", (note_id,))
+    c.executemany(
+        "INSERT INTO note_chunks (note_id, chunk_index, start_pos, end_pos, embedding) VALUES (?, ?, ?, ?, ?)",
+        [(note_id, i, inicio, fim, vetor.tobytes()) for i, ((inicio, fim), vetor) in enumerate(zip(spans, vetores))],
+    )
+    media = vetores.mean(axis=0)
+    norma = np.linalg.norm(media)
+    if norma > 0:
+        media = media / norma
+    c.execute("UPDATE notes SET embedding = ?, embedded_hash = ?, embedding_model = ? WHERE id = ?",
+              (media.astype(np.float32).tobytes(), content_hash, model, note_id))
+    _invalidar_relacionadas(c, note_id)
+    return vetores
+
+def _invalidar_relacionadas(c, note_id):
+    # Vetores novos ou nota apagada: a lista da nota e as listas em que ela
+    # aparece deixam de valer e são refeitas (relacionadas.py) na próxima leitura
+    c.execute('''
+        DELETE FROM related_lists WHERE note_id = ?
+           OR note_id IN (SELECT note_id FROM note_neighbors WHERE neighbor_id = ?)
+    ''', (note_id, note_id))
+    c.execute('''
+        DELETE FROM note_neighbors WHERE note_id = ?
+           OR note_id IN (SELECT note_id FROM note_neighbors WHERE neighbor_id = ?)
+    ''', (note_id, note_id))
+
+def _modelo_padrao(model):
+    # Vetor sem modelo informado saiu de ia.generate_embedding: com NULL em
+    # embedding_model a nota contaria como desatualizada e seria recodificada
+    if model is not None:
+        return model
+    import ia  # ia importa db
+    return ia.MODEL_EMBEDDING
+
+def save_note(content, summary, tags, embedding=None, enrichment_status='done', model=None):
+    timestamp = datetime.now().isoformat()
+    spans, vetores = _trechos_padrao(content, embedding)
+    content_hash = hash_conteudo(content)
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute('''
+            INSERT INTO notes (content, summary, timestamp, tags, enrichment_status, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (content, summary, timestamp, ','.join(tags), enrichment_status, content_hash))
+        note_id = c.lastrowid
+        _gravar_tags(c, note_id, tags)
+        if spans is not None:
+            _gravar_trechos(c, note_id, spans, vetores, content_hash, _modelo_padrao(model))
+    _notificar('save', note_id, vetores)
+    return note_id
+
+def save_notes_batch(notes, sources=None, chunks=None, model=None):
+    # notes: lista de (content, summary, tags, timestamp, embedding);
+    # sources: lista alinhada de (path, size, mtime) para o checkpoint da importação;
+    # chunks: lista alinhada de (spans, vetores) de ia.generate_chunk_embeddings;
+    # model: modelo que gerou os vetores (None = reindexador refaz depois).
+    # Sem chunks, o embedding da nota vira um único trecho.
+    # Notas sem resumo entram como 'pending' com um job 'enrich' na fila.
+    # Tudo numa única transação: o lote entra inteiro ou não entra.
+    if not notes:
+        return []
+    with transaction() as conn:
+        c = conn.cursor()
+        # executemany não devolve lastrowid, então os ids são reservados aqui
+        # (seguro: ninguém mais escreve enquanto o lock está com a gente)
+        c.execute("SELECT seq FROM sqlite_sequence WHERE name = 'notes'")
+        row = c.fetchone()
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM notes")
+        primeiro = max(row[0] if row else 0, c.fetchone()[0]) + 1
+        ids = list(range(primeiro, primeiro + len(notes)))
+
+        linhas = []
+        pendentes = []
+        for note_id, (content, summary, tags, timestamp, embedding) in zip(ids, notes):
+            status = 'done' if summary is not None else 'pending'
+            if status == 'pending':
+                pendentes.append(note_id)
+            linhas.append((note_id, content, summary, timestamp or datetime.now().isoformat(),
+                           ','.join(tags), status, hash_conteudo(content)))
+        c.executemany('''
+            INSERT INTO notes (id, content, summary, timestamp, tags, enrichment_status, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', linhas)
+        for note_id, (_, _, tags, _, _) in zip(ids, notes):
+            _gravar_tags(c, note_id, tags)
+        embeddings = []
+        for i, (note_id, (content, _, _, _, embedding)) in enumerate(zip(ids, notes)):
+            spans, vetores = chunks[i] if chunks else _trechos_padrao(content, embedding)
+            embeddings.append(_gravar_trechos(c, note_id, spans, vetores, linhas[i][6], model) if spans else None)
+        for note_id in pendentes:
+            enqueue_job(note_id, 'enrich')
+
+        if sources:
+            agora = datetime.now().isoformat()
+            c.executemany('''
+                INSERT OR REPLACE INTO imported_files (path, size, mtime, note_id, imported_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(path, size, mtime, note_id, agora) for (path, size, mtime), note_id in zip(sources, ids)])
+    _notificar('save_many', ids, embeddings)
+    return ids
+
+def get_imported_files():
+    # {path: (size, mtime)} dos arquivos já importados
+    c = get_connection().cursor()
+    c.execute("SELECT path, size, mtime FROM imported_files")
+    arquivos = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+    return arquivos
+
+def get_note_content(note_id: int):
+    c = get_connection().cursor()
+    c.execute("SELECT content FROM notes WHERE id = ?", (note_id,))
+    row = c.fetchone()
+    return row[0] if row else None
+
+def update_enrichment(note_id: int, summary: str, tags):
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE notes SET summary = ?, tags = ?, enrichment_status = 'done' WHERE id = ?",
+                  (summary, ','.join(tags), note_id))
+        _gravar_tags(c, note_id, tags)
+
+def update_summary(note_id: int, summary: str):
+    c = get_connection().cursor()
+    c.execute("UPDATE notes SET summary = ?, enrichment_status = 'done' WHERE id = ?", (summary, note_id))
+
+def update_chunks(note_id: int, spans, vetores, content_hash=None, model=None):
+    with transaction() as conn:
+        vetores = _gravar_trechos(conn.cursor(), note_id, spans, vetores, content_hash, model)
+    _notificar('update', note_id, vetores)
+
+def update_chunks_batch(itens, model=None):
+    # itens: [(note_id, content_hash, spans, vetores)] gravados numa transação só
+    if not itens:
+        return
+    with transaction() as conn:
+        c = conn.cursor()
+        matrizes = [_gravar_trechos(c, note_id, spans, vetores, content_hash, model)
+                    for note_id, content_hash, spans, vetores in itens]
+    _notificar('update_many', [item[0] for item in itens], matrizes)
+
+def _condicao_desatualizada():
+    # Sem vetores, vetores de outro texto (edição) ou de outro modelo. Nota com
+    # job 'embed' na fila ou rodando fica com o job: o reindexador não a repete.
+    return '''(embedded_hash IS NULL OR embedded_hash != content_hash OR embedding_model IS NOT ?)
+        AND NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.note_id = notes.id AND jobs.kind = 'embed'
+                        AND jobs.status IN ('queued', 'running'))'''
+
+def get_stale_notes(model: str, limit: int, after_id: int = 0):
+    c = get_connection().cursor()
+    c.execute(f'''
+        SELECT id, content, content_hash FROM notes
+        WHERE id > ? AND {_condicao_desatualizada()}
+        ORDER BY id LIMIT ?
+    ''', (after_id, model, limit))
+    return c.fetchall()
+
+def count_stale_notes(model: str) -> int:
+    c = get_connection().cursor()
+    c.execute(f"SELECT COUNT(*) FROM notes WHERE {_condicao_desatualizada()}", (model,))
+    return c.fetchone()[0]
+
+def mark_all_stale():
+    c = get_connection().cursor()
+    c.execute("UPDATE notes SET embedded_hash = NULL")
+    return c.rowcount
+
+def set_enrichment_status(note_id: int, status: str):
+    c = get_connection().cursor()
+    c.execute("UPDATE notes SET enrichment_status = ? WHERE id = ?", (status, note_id))
+
+# ---- Fila de jobs (jobs.py roda os workers; aqui fica só o SQL) ----
+
+def enqueue_job(note_id: int, kind: str):
+    # Um job ativo por (nota, tipo): reenfileirar só reagenda o existente
+    c = get_connection().cursor()
+    agora = datetime.now().isoformat()
+    c.execute('''
+        UPDATE jobs SET next_run_at = 0, updated_at = ?
+        WHERE note_id = ? AND kind = ? AND status = 'queued'
+    ''', (agora, note_id, kind))
+    if c.rowcount:
+        return
+    c.execute('''
+        INSERT INTO jobs (note_id, kind, status, attempts, next_run_at, created_at, updated_at)
+        VALUES (?, ?, 'queued', 0, 0, ?, ?)
+    ''', (note_id, kind, agora, agora))
+
+def claim_next_job(now: float):
+    # Marca o próximo job vencido como 'running' e o devolve (id, note_id, kind, attempts).
+    # BEGIN IMMEDIATE garante que dois workers não peguem o mesmo job.
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT id, note_id, kind, attempts FROM jobs
+            WHERE status = 'queued' AND next_run_at <= ?
+            ORDER BY next_run_at, id LIMIT 1
+        ''', (now,))
+        job = c.fetchone()
+        if job is None:
+            return None
+        c.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                  (datetime.now().isoformat(), job[0]))
+    return job[0], job[1], job[2], job[3] + 1
+
+def complete_job(job_id: int):
+    c = get_connection().cursor()
+    c.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+def reschedule_job(job_id: int, error: str, next_run_at: float):
+    c = get_connection().cursor()
+    c.execute("UPDATE jobs SET status = 'queued', last_error = ?, next_run_at = ?, updated_at = ? WHERE id = ?",
+              (error, next_run_at, datetime.now().isoformat(), job_id))
+
+def fail_job(job_id: int, error: str):
+    c = get_connection().cursor()
+    c.execute("UPDATE jobs SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+              (error, datetime.now().isoformat(), job_id))
+
+def reset_running_jobs():
+    # Jobs que estavam rodando quando o app fechou voltam para a fila
+    c = get_connection().cursor()
+    c.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+    return c.rowcount
+
+def retry_failed_jobs():
+    c = get_connection().cursor()
+    c.execute("UPDATE jobs SET status = 'queued', attempts = 0, next_run_at = 0 WHERE status = 'failed'")
+    return c.rowcount
+
+def record_llm_call(kind: str, model: str, prompt_tokens, completion_tokens, estimated: bool,
+                    latency_ms: float, attempts: int, status: str):
+    c = get_connection().cursor()
+    c.execute('''
+        INSERT INTO llm_calls (created_at, kind, model, prompt_tokens, completion_tokens, estimated,
+                               latency_ms, attempts, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (datetime.now().isoformat(), kind, model, prompt_tokens, completion_tokens, int(estimated),
+          latency_ms, attempts, status))
+
+def get_llm_usage(desde: str = None):
+    # [(kind, model, chamadas, falhas, tokens de entrada, tokens de saída, latência média ms, máxima ms)]
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT kind, model, COUNT(*), SUM(status != 'ok'), COALESCE(SUM(prompt_tokens), 0),
+               COALESCE(SUM(completion_tokens), 0), AVG(latency_ms), MAX(latency_ms)
+        FROM llm_calls WHERE created_at >= ?
+        GROUP BY kind, model ORDER BY kind, model
+    ''', (desde or '',))
+    return c.fetchall()
+
+def count_jobs():
+    c = get_connection().cursor()
+    c.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+    return dict(c.fetchall())
+
+
+def iter_chunk_embeddings(lote: int = 8192):
+    # (chaves, matriz float32 (n, 384)) dos trechos em lotes, montados direto dos
+    # BLOBs: a memória usada não cresce com o número de notas
+    c = get_connection().cursor()
+    c.execute(f"SELECT (note_id << {BITS_TRECHO}) | chunk_index, embedding FROM note_chunks")
+    while True:
+        rows = c.fetchmany(lote)
+        if not rows:
+            return
+        chaves = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        matriz = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        yield chaves, matriz
+
+def get_chunk_embeddings(chaves):
+    # (chaves, matriz) só dos trechos pedidos (chaves de chave_trecho)
+    pares = [nota_da_chave(int(chave)) for chave in chaves]
+    if not pares:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    c = get_connection().cursor()
+    rows = []
+    for inicio in range(0, len(pares), 500):  # limite de parâmetros do SQLite
+        lote = pares[inicio:inicio + 500]
+        valores = ','.join('(?, ?)' for _ in lote)
+        c.execute(f'''
+            WITH pedidos(note_id, chunk_index) AS (VALUES {valores})
+            SELECT (ch.note_id << {BITS_TRECHO}) | ch.chunk_index, ch.embedding
+            FROM pedidos p JOIN note_chunks ch ON ch.note_id = p.note_id AND ch.chunk_index = p.chunk_index
+        ''', [v for par in lote for v in par])
+        rows.extend(c.fetchall())
+    chaves = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    matriz = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    return chaves, matriz
+
+def get_chunk_keys(note_ids=None):
+    # Chaves (chave_trecho) de todos os trechos, ou só dos trechos destas notas
+    c = get_connection().cursor()
+    if note_ids is None:
+        c.execute(f"SELECT (note_id << {BITS_TRECHO}) | chunk_index FROM note_chunks")
+        return [row[0] for row in c.fetchall()]
+    note_ids = list(note_ids)
+    chaves = []
+    for inicio in range(0, len(note_ids), 500):  # limite de parâmetros do SQLite
+        lote = note_ids[inicio:inicio + 500]
+        c.execute(f"SELECT (note_id << {BITS_TRECHO}) | chunk_index FROM note_chunks "
+                  f"WHERE note_id IN ({','.join('?' * len(lote))})", lote)
+        chaves.extend(row[0] for row in c.fetchall())
+    return chaves
+
+def get_note_embeddings(note_ids):
+    # (ids, matriz float32 (n, 384)) com o vetor médio (notes.embedding) das notas
+    # pedidas que têm trechos, na ordem do id
+    note_ids = list(note_ids)
+    c = get_connection().cursor()
+    rows = []
+    for inicio in range(0, len(note_ids), 500):  # limite de parâmetros do SQLite
+        lote = note_ids[inicio:inicio + 500]
+        c.execute(f"SELECT id, embedding FROM notes WHERE id IN ({','.join('?' * len(lote))}) "
+                  f"AND typeof(embedding) = 'blob' AND length(embedding) = {EMBEDDING_BYTES} ORDER BY id", lote)
+        rows.extend(c.fetchall())
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    matriz = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    return ids, matriz
+
+def get_embedded_note_ids():
+    c = get_connection().cursor()
+    c.execute(f"SELECT id FROM notes WHERE typeof(embedding) = 'blob' AND length(embedding) = {EMBEDDING_BYTES}")
+    return [row[0] for row in c.fetchall()]
+
+def get_related_notes(note_id: int, limit: int = None):
+    # [(id, summary, tags, timestamp, score)] já calculados para a nota, do mais
+    # parecido para o menos: uma leitura pela chave (note_id, rank). None se a
+    # lista ainda não foi calculada; [] se foi e nenhuma nota passou no corte.
+    c = get_connection().cursor()
+    c.execute("SELECT 1 FROM related_lists WHERE note_id = ?", (note_id,))
+    if c.fetchone() is None:
+        return None
+    c.execute('''
+        SELECT n.id, n.summary, n.tags, n.timestamp, r.score
+        FROM note_neighbors r JOIN notes n ON n.id = r.neighbor_id
+        WHERE r.note_id = ? ORDER BY r.rank LIMIT ?
+    ''', (note_id, -1 if limit is None else limit))
+    return c.fetchall()
+
+def get_related_scores(note_ids):
+    # {note_id: [(neighbor_id, score)]} só das notas que já têm a lista calculada
+    note_ids = list(note_ids)
+    c = get_connection().cursor()
+    listas = {}
+    for inicio in range(0, len(note_ids), 500):
+        lote = note_ids[inicio:inicio + 500]
+        marcadores = ','.join('?' * len(lote))
+        c.execute(f"SELECT note_id FROM related_lists WHERE note_id IN ({marcadores})", lote)
+        for (note_id,) in c.fetchall():
+            listas[note_id] = []
+        c.execute(f"SELECT note_id, neighbor_id, score FROM note_neighbors "
+                  f"WHERE note_id IN ({marcadores}) ORDER BY note_id, rank", lote)
+        for note_id, vizinho, score in c.fetchall():
+            if note_id in listas:
+                listas[note_id].append((vizinho, score))
+    return listas
+
+def replace_related(listas):
+    # listas: {note_id: [(neighbor_id, score)] em ordem}; substitui as listas
+    # dessas notas numa transação. Uma lista vazia também fica marcada como
+    # calculada em related_lists.
+    if not listas:
+        return
+    with transaction() as conn:
+        c = conn.cursor()
+        c.executemany("DELETE FROM note_neighbors WHERE note_id = ?", [(note_id,) for note_id in listas])
+        c.executemany(
+            "INSERT INTO note_neighbors (note_id, rank, neighbor_id, score) VALUES (?, ?, ?, ?)",
+            [(note_id, rank, vizinho, float(score))
+             for note_id, vizinhos in listas.items() for rank, (vizinho, score) in enumerate(vizinhos)],
+        )
+        c.executemany("INSERT OR IGNORE INTO related_lists (note_id) VALUES (?)", [(note_id,) for note_id in listas])
+
+def count_related() -> int:
+    c = get_connection().cursor()
+    c.execute("SELECT COUNT(*) FROM related_lists")
+    return c.fetchone()[0]
+
+def get_passages(pares):
+    # pares: [(note_id, chunk_index)] -> {note_id: texto do trecho}
+    if not pares:
+        return {}
+    c = get_connection().cursor()
+    valores = ','.join('(?, ?)' for _ in pares)
+    c.execute(f'''
+        WITH pedidos(note_id, chunk_index) AS (VALUES {valores})
+        SELECT ch.note_id, substr(n.content, ch.start_pos + 1, ch.end_pos - ch.start_pos)
+        FROM pedidos p
+        JOIN note_chunks ch ON ch.note_id = p.note_id AND ch.chunk_index = p.chunk_index
+        JOIN notes n ON n.id = ch.note_id
+    ''', [v for par in pares for v in par])
+    return dict(c.fetchall())
+
+def count_legacy_embeddings():
+    c = get_connection().cursor()
+    c.execute("SELECT COUNT(*) FROM notes WHERE typeof(embedding) = 'text'")
+    total = c.fetchone()[0]
+    return total
+
+def migrate_embeddings_to_blob(batch_size=500, progresso=None):
+    # Converte embeddings JSON (TEXT) para BLOB float32. Cada lote é
+    # commitado, então uma execução interrompida continua de onde parou.
+    c = get_connection().cursor()
+    convertidos = 0
+    while True:
+        c.execute("SELECT id, embedding FROM notes WHERE typeof(embedding) = 'text' LIMIT ?", (batch_size,))
+        rows = c.fetchall()
+        if not rows:
+            break
+        updates = []
+        trechos = []
+        for note_id, texto in rows:
+            try:
+                blob = _embedding_para_blob(json.loads(texto))
+            except ValueError:
+                blob = None
+            if blob is None:
+                print(f"⚠️ Embedding inválido descartado (id={note_id})")
+            else:
+                trechos.append((note_id, blob, note_id))
+            updates.append((blob, blob, note_id))
+        with transaction():
+            # Vetor descartado: a nota volta a contar como desatualizada (reindexador)
+            c.executemany('''
+                UPDATE notes SET embedding = ?, embedded_hash = CASE WHEN ? IS NULL THEN NULL ELSE embedded_hash END
+                WHERE id = ?
+            ''', updates)
+            # Vetor antigo vira o trecho 0; notas longas ganham trechos de verdade pela fila
+            c.executemany('''
+                INSERT OR REPLACE INTO note_chunks (note_id, chunk_index, start_pos, end_pos, embedding)
+                SELECT ?, 0, 0, length(content), ? FROM notes WHERE id = ?
+            ''', trechos)
+        convertidos += len(updates)
+        if progresso:
+            progresso(convertidos)
+    return convertidos
 
 def get_notes_grouped_by_day():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute("SELECT id, summary, tags, timestamp FROM notes ORDER BY timestamp DESC")
     rows = c.fetchall()
-    conn.close()
 
     grouped = {}
     for note in rows:
@@ -66,10 +705,12 @@ def get_notes_grouped_by_day():
         grouped.setdefault(date, []).append(note)
     return grouped
 
-def init_db():
-    
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+# Migrações publicadas não chamam helpers nem constantes vivas (_gravar_tags,
+# enqueue_job, chunking, ia.MODEL_EMBEDDING, EMBEDDING_BYTES): o SQL e a lógica
+# de cada uma ficam congelados aqui, como eram quando ela saiu, para que mudar
+# o código de hoje não mude o que um banco antigo recebe ao ser migrado.
+
+def _migracao_tabela_notes(c):
     c.execute('''
         CREATE TABLE IF NOT EXISTS notes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -79,49 +720,416 @@ def init_db():
             timestamp TEXT
         )
     ''')
-    conn.commit()
-    conn.close()
 
-def adicionar_coluna_embedding():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    try:
-        c.execute("ALTER TABLE notes ADD COLUMN embedding TEXT")
-        conn.commit()
-    except sqlite3.OperationalError as e:
-        if "duplicate column name" not in str(e):
-            raise
-    conn.close()
+def _migracao_coluna_embedding(c):
+    # Bancos anteriores ao schema_version podem já ter a coluna (como TEXT)
+    colunas = [row[1] for row in c.execute("PRAGMA table_info(notes)")]
+    if 'embedding' not in colunas:
+        c.execute("ALTER TABLE notes ADD COLUMN embedding BLOB")
 
+def _migracao_fts(c):
+    # Índice de palavras-chave (external content) mantido por triggers em notes.
+    # O UPDATE só dispara para colunas indexadas, não a cada troca de embedding.
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            content, summary, tags,
+            content='notes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, content, summary, tags)
+            VALUES (new.id, new.content, new.summary, new.tags);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, content, summary, tags)
+            VALUES ('delete', old.id, old.content, old.summary, old.tags);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF content, summary, tags ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, content, summary, tags)
+            VALUES ('delete', old.id, old.content, old.summary, old.tags);
+            INSERT INTO notes_fts(rowid, content, summary, tags)
+            VALUES (new.id, new.content, new.summary, new.tags);
+        END
+    ''')
+    c.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
 
+def _migracao_arquivos_importados(c):
+    # Checkpoint do `cli.py import`: arquivo já importado é pulado se não mudou
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS imported_files (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            note_id INTEGER,
+            imported_at TEXT
+        )
+    ''')
 
-def get_all_notes():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT id, summary, tags, timestamp FROM notes ORDER BY timestamp DESC")
+def _migracao_indice_timestamp(c):
+    # get_all_notes e get_notes_grouped_by_day ordenam por timestamp
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notes_timestamp ON notes(timestamp)")
+
+def _migracao_fila_jobs(c):
+    # Nota é salva na hora; resumo, tags e embedding chegam depois via jobs
+    colunas = [row[1] for row in c.execute("PRAGMA table_info(notes)")]
+    if 'enrichment_status' not in colunas:
+        c.execute("ALTER TABLE notes ADD COLUMN enrichment_status TEXT NOT NULL DEFAULT 'done'")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_run_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_fila ON jobs(status, next_run_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_nota ON jobs(note_id)")
+    # Importações com enriquecimento adiado (summary NULL) entram na fila
+    agora = datetime.now().isoformat()
+    c.execute("UPDATE notes SET enrichment_status = 'pending' WHERE summary IS NULL")
+    c.execute('''
+        INSERT INTO jobs (note_id, kind, status, created_at, updated_at)
+        SELECT id, 'enrich', 'queued', ?, ? FROM notes WHERE summary IS NULL
+    ''', (agora, agora))
+
+def _migracao_trechos(c):
+    # Embeddings por trecho. O vetor que já existe vira o trecho 0 (a busca
+    # continua funcionando); notas com mais de um trecho (mais de 150 palavras,
+    # o tamanho do trecho nesta versão) ganham um job 'embed'
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS note_chunks (
+            note_id INTEGER NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            start_pos INTEGER NOT NULL,
+            end_pos INTEGER NOT NULL,
+            embedding BLOB NOT NULL,
+            PRIMARY KEY (note_id, chunk_index)
+        )
+    ''')
+    c.execute('''
+        INSERT OR IGNORE INTO note_chunks (note_id, chunk_index, start_pos, end_pos, embedding)
+        SELECT id, 0, 0, length(content), embedding FROM notes
+        WHERE typeof(embedding) = 'blob' AND length(embedding) = 1536
+    ''')
+    agora = datetime.now().isoformat()
+    longas = [(note_id, agora) for note_id, content in c.execute("SELECT id, content FROM notes").fetchall()
+              if len(re.findall(r'\S+', content or '')) > 150]
+    c.executemany('''
+        INSERT INTO jobs (note_id, kind, status, attempts, next_run_at, created_at, updated_at)
+        SELECT ?1, 'embed', 'queued', 0, 0, ?2, ?2
+        WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE note_id = ?1 AND kind = 'embed' AND status = 'queued')
+    ''', longas)
+
+def _migracao_hash_conteudo(c):
+    # content_hash acompanha o texto; embedded_hash/embedding_model registram de
+    # onde vieram os vetores. Os vetores que já existem (BLOB ou JSON ainda não
+    # convertido) contam como em dia: até aqui só houve o all-MiniLM-L6-v2, e
+    # recodificar a base inteira na primeira abertura custaria caro. Quem editou
+    # notas antes desta versão (edições não reindexavam) usa `reindex --all`.
+    colunas = [row[1] for row in c.execute("PRAGMA table_info(notes)")]
+    for coluna in ('content_hash', 'embedded_hash', 'embedding_model'):
+        if coluna not in colunas:
+            c.execute(f"ALTER TABLE notes ADD COLUMN {coluna} TEXT")
+    rows = c.execute("SELECT id, content FROM notes").fetchall()
+    c.executemany("UPDATE notes SET content_hash = ? WHERE id = ?",
+                  [(hashlib.sha256((content or '').encode('utf-8')).hexdigest(), note_id)
+                   for note_id, content in rows])
+    c.execute('''
+        UPDATE notes SET embedded_hash = content_hash, embedding_model = 'all-MiniLM-L6-v2'
+        WHERE (typeof(embedding) = 'blob' AND length(embedding) = 1536) OR typeof(embedding) = 'text'
+    ''')
+
+def _migracao_tags(c):
+    # Índice normalizado de tags, preenchido a partir de notes.tags com a mesma
+    # normalização de normalizar_tag/_gravar_tags nesta versão (sem acento,
+    # casefold, sem '#', espaços colapsados)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            label TEXT NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS note_tags (
+            note_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            PRIMARY KEY (note_id, tag_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags(tag_id, note_id)")
+    for note_id, tags in c.execute("SELECT id, tags FROM notes WHERE tags IS NOT NULL AND tags != ''").fetchall():
+        unicas = {}
+        for tag in tags.split(','):
+            sem_acento = ''.join(ch for ch in unicodedata.normalize('NFKD', tag) if not unicodedata.combining(ch))
+            nome = ' '.join(sem_acento.casefold().strip().lstrip('#').split())
+            if nome and nome not in unicas:
+                unicas[nome] = ' '.join(tag.split())
+        c.executemany("INSERT OR IGNORE INTO tags (name, label) VALUES (?, ?)", list(unicas.items()))
+        c.executemany("INSERT OR IGNORE INTO note_tags (note_id, tag_id) SELECT ?, id FROM tags WHERE name = ?",
+                      [(note_id, nome) for nome in unicas])
+
+def _migracao_chamadas_ia(c):
+    # Uma linha por chamada ao OpenRouter: tokens (do provedor ou estimados) e latência
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS llm_calls (
+            id INTEGER PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            estimated INTEGER NOT NULL DEFAULT 0,
+            latency_ms REAL,
+            attempts INTEGER,
+            status TEXT NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_data ON llm_calls(created_at)")
+
+def _migracao_notas_relacionadas(c):
+    # Grafo kNN das notas (relacionadas.py): os K vizinhos de cada nota em ordem
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS note_neighbors (
+            note_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            neighbor_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (note_id, rank)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_note_neighbors_vizinho ON note_neighbors(neighbor_id)")
+
+def _migracao_listas_relacionadas(c):
+    # Notas com a lista de vizinhas calculada, inclusive as que ficaram sem
+    # nenhuma acima da similaridade mínima: sem a marca, a lista
+    # vazia seria recalculada a cada leitura
+    c.execute("CREATE TABLE IF NOT EXISTS related_lists (note_id INTEGER PRIMARY KEY)")
+    c.execute("INSERT OR IGNORE INTO related_lists (note_id) SELECT DISTINCT note_id FROM note_neighbors")
+
+# (versão, função) aplicadas em ordem por init_db(); nunca alterar uma já publicada
+SCHEMA_MIGRATIONS = [
+    (1, _migracao_tabela_notes),
+    (2, _migracao_coluna_embedding),
+    (3, _migracao_fts),
+    (4, _migracao_arquivos_importados),
+    (5, _migracao_indice_timestamp),
+    (6, _migracao_fila_jobs),
+    (7, _migracao_trechos),
+    (8, _migracao_hash_conteudo),
+    (9, _migracao_tags),
+    (10, _migracao_chamadas_ia),
+    (11, _migracao_notas_relacionadas),
+    (12, _migracao_listas_relacionadas),
+]
+
+def get_schema_version(c):
+    c.execute("SELECT MAX(version) FROM schema_version")
+    return c.fetchone()[0] or 0
+
+def init_db():
+    c = get_connection().cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            applied_at TEXT
+        )
+    ''')
+    atual = get_schema_version(c)
+    for versao, migracao in SCHEMA_MIGRATIONS:
+        if versao <= atual:
+            continue
+        with transaction():
+            migracao(c)
+            c.execute("INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+                      (versao, datetime.now().isoformat()))
+    _inicializados.add(caminho_atual())
+
+
+def get_all_notes(limit=None, offset=0, tags=None, modo_tags='and'):
+    c = get_connection().cursor()
+    filtro = _filtro_tags(tags, modo_tags)
+    where, parametros = (f"WHERE id IN ({filtro[0]})", filtro[1]) if filtro else ("", [])
+    if limit is None:
+        c.execute(f"SELECT id, summary, tags, timestamp FROM notes {where} ORDER BY timestamp DESC", parametros)
+    else:
+        c.execute(f"SELECT id, summary, tags, timestamp FROM notes {where} ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                  parametros + [limit, offset])
     rows = c.fetchall()
-    conn.close()
     return rows
 
+def get_notes_page(limit: int, before=None, tags=None, modo_tags='and'):
+    # Paginação keyset (timestamp, id) do mais novo para o mais antigo: before é
+    # o (timestamp, id) da última nota já carregada. Custo constante por página,
+    # ao contrário de OFFSET, e usa idx_notes_timestamp (que já inclui o rowid).
+    condicoes, parametros = [], []
+    if before is not None:
+        condicoes.append("(timestamp, id) < (?, ?)")
+        parametros += [before[0], before[1]]
+    filtro = _filtro_tags(tags, modo_tags)
+    if filtro:
+        condicoes.append(f"id IN ({filtro[0]})")
+        parametros += filtro[1]
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    c = get_connection().cursor()
+    c.execute(f'''
+        SELECT id, summary, tags, timestamp FROM notes
+        {where}
+        ORDER BY timestamp DESC, id DESC LIMIT ?
+    ''', parametros + [limit])
+    return c.fetchall()
+
+def get_notes_by_ids(note_ids):
+    # Mesma ordem de note_ids (ex.: ranking da busca); ids inexistentes são ignorados
+    if not note_ids:
+        return []
+    c = get_connection().cursor()
+    marcadores = ','.join('?' * len(note_ids))
+    c.execute(f"SELECT id, summary, tags, timestamp FROM notes WHERE id IN ({marcadores})", list(note_ids))
+    por_id = {row[0]: row for row in c.fetchall()}
+    return [por_id[i] for i in note_ids if i in por_id]
+
+# Quantas notas (as mais recentes que casam) o bm25 ordena por busca. Termos
+# comuns casam com quase toda a base e ranquear tudo custa ~100 ms em 100k
+# notas; com o teto o custo fica limitado e a ordem só muda quando há mais
+# candidatos que isso, caso em que ganham as notas mais novas.
+CANDIDATOS_FTS = 500
+
+def search_keyword(match_expr: str, limit: int, tags=None, modo_tags='and'):
+    # Ids ordenados por bm25 (menor = mais relevante); resumo e tags pesam mais que o conteúdo
+    c = get_connection().cursor()
+    filtro = _filtro_tags(tags, modo_tags)
+    # "+rowid": sem o +, o FTS5 recebe o IN como restrição e testa o MATCH nota a nota (100x mais lento)
+    extra, parametros = (f"AND +rowid IN ({filtro[0]})", filtro[1]) if filtro else ("", [])
+    # A subconsulta para no teto (rowid decrescente = mais recente primeiro) e
+    # só calcula o bm25 das linhas que devolve; a ordenação fica de fora
+    c.execute(f'''
+        SELECT rowid FROM (
+            SELECT rowid, bm25(notes_fts, 1.0, 2.0, 3.0) AS score FROM notes_fts
+            WHERE notes_fts MATCH ? {extra}
+            ORDER BY rowid DESC
+            LIMIT ?
+        )
+        ORDER BY score
+        LIMIT ?
+    ''', [match_expr] + parametros + [max(CANDIDATOS_FTS, limit), limit])
+    ids = [row[0] for row in c.fetchall()]
+    return ids
+
+def get_note_ids_with_tags(tags, modo_tags='and'):
+    # Ids das notas que passam no filtro (ex.: pré-filtro da busca semântica);
+    # None quando não há tag nenhuma para filtrar
+    filtro = _filtro_tags(tags, modo_tags)
+    if filtro is None:
+        return None
+    c = get_connection().cursor()
+    c.execute(filtro[0], filtro[1])
+    return [row[0] for row in c.fetchall()]
+
+def get_tag_counts(tags=None, modo_tags='and', limit=None):
+    # Facetas: [(tag, número de notas)] da mais usada para a menos usada. Com
+    # tags, conta só entre as notas que passam no filtro (refinar a seleção).
+    filtro = _filtro_tags(tags, modo_tags)
+    where, parametros = (f"WHERE nt.note_id IN ({filtro[0]})", filtro[1]) if filtro else ("", [])
+    c = get_connection().cursor()
+    c.execute(f'''
+        SELECT t.label, COUNT(*) AS n FROM note_tags nt JOIN tags t ON t.id = nt.tag_id
+        {where}
+        GROUP BY t.id ORDER BY n DESC, t.name
+        LIMIT ?
+    ''', parametros + [-1 if limit is None else limit])
+    return c.fetchall()
+
+def iter_notes_for_export(desde=None, ate=None, tags=None, modo_tags='and', com_trechos=False, lote=500):
+    # (id, content, summary, tags, timestamp, trechos) do mais antigo para o mais
+    # novo, lidos de um único cursor em lotes de fetchmany: a memória não cresce
+    # com o acervo. desde/ate são datas ISO ('2024-01-31'), ambas inclusivas.
+    # trechos: [(start, end, embedding BLOB)] com com_trechos, senão None.
+    condicoes, parametros = [], []
+    if desde:
+        condicoes.append("n.timestamp >= ?")
+        parametros.append(desde)
+    if ate:
+        condicoes.append("n.timestamp < ?")
+        parametros.append((datetime.fromisoformat(ate) + timedelta(days=1)).date().isoformat())
+    filtro = _filtro_tags(tags, modo_tags)
+    if filtro:
+        condicoes.append(f"n.id IN ({filtro[0]})")
+        parametros += filtro[1]
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    c = get_connection().cursor()
+    if com_trechos:
+        c.execute(f'''
+            SELECT n.id, n.content, n.summary, n.tags, n.timestamp, ch.start_pos, ch.end_pos, ch.embedding
+            FROM notes n LEFT JOIN note_chunks ch ON ch.note_id = n.id
+            {where}
+            ORDER BY n.timestamp, n.id, ch.chunk_index
+        ''', parametros)
+    else:
+        c.execute(f'''
+            SELECT n.id, n.content, n.summary, n.tags, n.timestamp FROM notes n
+            {where}
+            ORDER BY n.timestamp, n.id
+        ''', parametros)
+
+    atual = None
+    while True:
+        rows = c.fetchmany(lote)
+        if not rows:
+            break
+        for row in rows:
+            if not com_trechos:
+                yield row + (None,)
+                continue
+            # Linhas consecutivas da mesma nota (uma por trecho) viram uma só
+            if atual is not None and atual[0] != row[0]:
+                yield atual
+                atual = None
+            if atual is None:
+                atual = row[:5] + ([],)
+            if row[5] is not None:
+                atual[5].append(row[5:])
+    if atual is not None:
+        yield atual
+
 def get_note_by_id(note_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute("SELECT content, summary, tags, timestamp FROM notes WHERE id=?", (note_id,))
     note = c.fetchone()
-    conn.close()
     return note
 
-def update_note(note_id: int, new_content: str, new_summary: str, new_tags: str):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE notes SET content = ?, summary = ?, tags = ? WHERE id = ?",
-              (new_content, new_summary, new_tags, note_id))
-    conn.commit()
-    conn.close()
+def update_note(note_id: int, new_content: str, new_summary: str, new_tags: str, new_embedding=None, model=None):
+    # Sem new_embedding a nota fica desatualizada (content_hash muda) até o job
+    # 'embed' ou o reindexador refazer os trechos
+    spans, vetores = _trechos_padrao(new_content, new_embedding)
+    content_hash = hash_conteudo(new_content)
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE notes SET content = ?, summary = ?, tags = ?, content_hash = ? WHERE id = ?",
+                  (new_content, new_summary, new_tags, content_hash, note_id))
+        _gravar_tags(c, note_id, new_tags)
+        if spans is not None:
+            vetores = _gravar_trechos(c, note_id, spans, vetores, content_hash, _modelo_padrao(model))
+    _notificar('update', note_id, vetores)
 
 def delete_note(note_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        c.execute("DELETE FROM note_chunks WHERE note_id = ?", (note_id,))
+        c.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+        c.execute("DELETE FROM jobs WHERE note_id = ?", (note_id,))
+        _invalidar_relacionadas(c, note_id)
+    _notificar('delete', note_id)
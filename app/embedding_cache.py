@@ -0,0 +1,163 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+import db
+
+# Cache de embeddings keyed pelo sha256 do texto: camada LRU em memória e,
+# opcionalmente, uma camada SQLite (memoro_cache.db) que sobrevive ao reinício.
+# Cada linha guarda o nome do modelo; trocar de modelo descarta o que sobrou.
+# Cada usuário (db.usuario) tem o próprio arquivo e as próprias chaves na
+# memória: um acerto nunca revela a um usuário o texto guardado por outro.
+MAX_MEMORIA = 2048
+PERSISTIR = True
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+_modelos_verificados = {}  # caminho do cache -> modelo já conferido
+_estatisticas = {"hits_memoria": 0, "hits_disco": 0, "misses": 0}
+_local = threading.local()
+
+
+def caminho_cache():
+    # memoro_cache.db ao lado do banco padrão; usuarios/<id>.cache.db para cada
+    # usuário (o ponto não cabe num id, então nunca colide com usuarios/<id>.db)
+    user_id = db.usuario_atual()
+    if user_id is None:
+        return os.path.splitext(db.DB_PATH)[0] + "_cache.db"
+    return os.path.splitext(db.caminho_usuario(user_id))[0] + ".cache.db"
+
+
+def conexao():
+    # Conexão desta thread com o cache do usuário atual, reaproveitada como em
+    # db.get_connection: WAL (leitores não esperam os jobs que gravam), busy
+    # timeout e no máximo db.CONEXOES_POR_THREAD abertas. Também usada pelo
+    # cache da IA (llm_cache) e do OCR.
+    caminho = caminho_cache()
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = OrderedDict()
+    conn = conexoes.get(caminho)
+    if conn is not None:
+        conexoes.move_to_end(caminho)
+        return conn
+    conn = sqlite3.connect(caminho, timeout=db.BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conexoes[caminho] = conn
+    while len(conexoes) > db.CONEXOES_POR_THREAD:
+        conexoes.popitem(last=False)[1].close()
+    return conn
+
+
+def chave(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _conectar(modelo: str):
+    caminho = caminho_cache()
+    conn = conexao()
+    if _modelos_verificados.get(caminho) != modelo:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                created_at TEXT,
+                PRIMARY KEY (model, hash)
+            )
+        ''')
+        removidos = conn.execute("DELETE FROM embedding_cache WHERE model != ?", (modelo,)).rowcount
+        conn.commit()
+        if removidos:
+            print(f"🧹 {removidos} embeddings de outro modelo removidos do cache")
+        _modelos_verificados[caminho] = modelo
+    return conn
+
+
+def obter(texto: str, modelo: str):
+    h = chave(texto)
+    na_memoria = (db.usuario_atual(), modelo, h)
+    with _lock:
+        vetor = _lru.get(na_memoria)
+        if vetor is not None:
+            _lru.move_to_end(na_memoria)
+            _estatisticas["hits_memoria"] += 1
+            return vetor
+
+    if PERSISTIR:
+        conn = _conectar(modelo)
+        row = conn.execute("SELECT embedding FROM embedding_cache WHERE model = ? AND hash = ?",
+                           (modelo, h)).fetchone()
+        if row is not None:
+            vetor = np.frombuffer(row[0], dtype=np.float32)
+            _guardar_memoria(modelo, h, vetor)
+            with _lock:
+                _estatisticas["hits_disco"] += 1
+            return vetor
+
+    with _lock:
+        _estatisticas["misses"] += 1
+    return None
+
+
+def _guardar_memoria(modelo, h, vetor):
+    na_memoria = (db.usuario_atual(), modelo, h)
+    with _lock:
+        _lru[na_memoria] = vetor
+        _lru.move_to_end(na_memoria)
+        while len(_lru) > MAX_MEMORIA:
+            _lru.popitem(last=False)
+
+
+def guardar(texto: str, modelo: str, vetor):
+    vetor = np.asarray(vetor, dtype=np.float32)
+    h = chave(texto)
+    _guardar_memoria(modelo, h, vetor)
+    if PERSISTIR:
+        conn = _conectar(modelo)
+        conn.execute(
+            "INSERT OR REPLACE INTO embedding_cache (hash, model, embedding, created_at) VALUES (?, ?, ?, ?)",
+            (h, modelo, vetor.tobytes(), datetime.now().isoformat()),
+        )
+        conn.commit()
+
+
+def guardar_varios(textos, modelo: str, vetores):
+    linhas = []
+    agora = datetime.now().isoformat()
+    for texto, vetor in zip(textos, vetores):
+        vetor = np.asarray(vetor, dtype=np.float32)
+        h = chave(texto)
+        _guardar_memoria(modelo, h, vetor)
+        linhas.append((h, modelo, vetor.tobytes(), agora))
+    if PERSISTIR and linhas:
+        conn = _conectar(modelo)
+        conn.executemany(
+            "INSERT OR REPLACE INTO embedding_cache (hash, model, embedding, created_at) VALUES (?, ?, ?, ?)",
+            linhas,
+        )
+        conn.commit()
+
+
+def estatisticas():
+    with _lock:
+        stats = dict(_estatisticas)
+        stats["itens_memoria"] = len(_lru)
+    consultas = stats["hits_memoria"] + stats["hits_disco"] + stats["misses"]
+    stats["taxa_acerto"] = (stats["hits_memoria"] + stats["hits_disco"]) / consultas if consultas else 0.0
+    return stats
+
+
+def limpar():
+    with _lock:
+        _lru.clear()
+    if PERSISTIR and os.path.exists(caminho_cache()):
+        conn = conexao()
+        conn.execute("DELETE FROM embedding_cache")
+        conn.commit()
@@ -1,41 +1,447 @@
-import faiss
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
-dimension = 384
-index = faiss.IndexFlatL2(dimension)
 import numpy as np
-from db import get_all_embeddings
+
+import ann
+import db
+import metricas
+import vetores
 from ia import generate_embedding
 
-def criar_indice_faiss():
-    dados = get_all_embeddings()
-    if not dados:
-        return None, []
-
-    dimension = 384  # compatível com sentence-transformers
-    ids, vetores = zip(*dados)
-
-    # Filtro: apenas vetores válidos com dimensão correta
-    vetores_validos = []
-    ids_validos = []
-    for i, v in zip(ids, vetores):
-        if isinstance(v, list) and len(v) == dimension:
-            vetores_validos.append(v)
-            ids_validos.append(i)
+dimension = 384  # compatível com sentence-transformers
+
+# faiss é importado dentro das funções para não pesar na abertura do app.
+# Índice persistente de trechos (ann.IndiceVetorial keyed por db.chave_trecho),
+# carregado uma vez e atualizado a cada save/update/delete em db.py. Os vetores
+# ficam no armazém mapeado em disco (vetores.py); na memória só a estrutura do
+# HNSW/IVF-PQ. O tipo (flat/HNSW/IVF-PQ) acompanha o tamanho do corpus: quando
+# muda, ou quando as lápides se acumulam, o armazém é compactado e um novo
+# índice é treinado numa thread enquanto o atual continua atendendo.
+#
+# Cada banco (o padrão e o de cada usuário, ver db.usuario) tem o seu índice.
+# Só os MAX_INDICES usados mais recentemente ficam carregados; os outros são
+# salvos e fechados, e voltam do disco na próxima busca do usuário.
+MAX_INDICES = int(os.getenv("MEMORO_MAX_INDICES", "8"))
+REPARO_MAX = 0.1  # fração de chaves divergentes corrigida no lugar ao carregar
+
+
+class _Estado:
+    # Índice de um banco e o que está em andamento nele
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.lock = threading.RLock()
+        self.index = None
+        self.sujo = False
+        self.reconstrucao = None  # thread em andamento
+        self.alteracoes = None  # eventos recebidos durante a reconstrução, reaplicados na troca
+
+
+_estados = OrderedDict()  # caminho do banco -> _Estado, do menos para o mais usado
+_lock = threading.Lock()
+
+
+def _estado(caminho=None):
+    caminho = caminho or db.caminho_atual()
+    with _lock:
+        estado = _estados.get(caminho)
+        if estado is None:
+            estado = _estados[caminho] = _Estado(caminho)
+        _estados.move_to_end(caminho)
+        return estado
+
+
+@contextmanager
+def _travado():
+    # Estado do banco atual com o lock na mão; enquanto travado ele não é despejado
+    while True:
+        estado = _estado()
+        estado.lock.acquire()
+        if _estados.get(estado.caminho) is estado:
+            break
+        estado.lock.release()  # despejado entre _estado() e o lock: pega o novo
+    try:
+        yield estado
+    finally:
+        estado.lock.release()
+
+
+def _despejar(manter):
+    # Fecha os índices menos usados além de MAX_INDICES. Só tenta o lock de cada
+    # um (sem esperar): quem está em uso ou reconstruindo fica para a próxima.
+    # Quem segura o lock de um estado tem a garantia de que ele não sai de _estados.
+    vitimas = []
+    with _lock:
+        carregados = [e for e in _estados.values() if e.index is not None]
+        excesso = len(carregados) - MAX_INDICES
+        for estado in carregados:
+            if len(vitimas) >= excesso:
+                break
+            if estado.caminho != manter and estado.reconstrucao is None and estado.lock.acquire(blocking=False):
+                del _estados[estado.caminho]
+                vitimas.append(estado)
+    for estado in vitimas:
+        try:
+            _fechar(estado, salvar=True)
+        finally:
+            estado.lock.release()
+
+
+def pasta_vetores(caminho=None):
+    return os.path.splitext(caminho or db.caminho_atual())[0] + ".vetores"
+
+
+def _remover_formato_antigo():
+    # Até a versão anterior o índice inteiro (com os vetores) ia para memoro.faiss
+    base = os.path.splitext(db.caminho_atual())[0] + ".faiss"
+    for caminho in (base, base + ".ids"):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+@metricas.cronometrado('index.create')
+def criar_indice_faiss(tipo=None):
+    # Armazém novo com os trechos do banco, lidos em lotes (sem montar a matriz inteira)
+    armazem = vetores.ArmazemVetorial.criar(pasta_vetores(), dimension)
+    for chaves, matriz in db.iter_chunk_embeddings():
+        armazem.anexar(chaves, ann.normalizar(matriz))
+    index = ann.IndiceVetorial.construir(armazem, tipo)
+    armazem.publicar()
+    return index
+
+
+def _sincronizar_com_banco(index):
+    # O armazém pode estar desatualizado (app encerrado no meio de uma gravação,
+    # notas alteradas por outro processo, ou uma gravação já commitada cujo
+    # evento ainda não chegou aqui) — compara as chaves com note_chunks e aplica
+    # a diferença. False quando ela é grande demais e vale reconstruir do zero.
+    ids_indice = index.ids()
+    ids_banco = np.array(db.get_chunk_keys(), dtype='int64')
+    sobrando = np.setdiff1d(ids_indice, ids_banco)
+    faltando = np.setdiff1d(ids_banco, ids_indice)
+    if len(sobrando) + len(faltando) > max(REPARO_MAX * len(ids_banco), 100):
+        return False
+    index.remover(sobrando)
+    if len(faltando):
+        chaves, matriz = db.get_chunk_embeddings(faltando)
+        index.adicionar(chaves, matriz)
+    return True
+
+
+@metricas.cronometrado('index.load')
+def carregar_indice():
+    # Índice do banco atual (padrão ou do usuário no contexto)
+    with _travado() as estado:
+        _remover_formato_antigo()
+        index = None
+        armazem = vetores.ArmazemVetorial.abrir(pasta_vetores(), dimension)
+        if armazem is not None:
+            try:
+                index = ann.IndiceVetorial.ler(armazem)
+                if not _sincronizar_com_banco(index):
+                    metricas.contar('erros', onde='indice_desatualizado')
+                    print("⚠️ Índice vetorial desatualizado, reconstruindo...")
+                    index = None
+            except Exception as e:
+                metricas.contar('erros', onde='indice_invalido')
+                print(f"⚠️ Índice vetorial inválido ({e}), reconstruindo...")
+                index = None
+            if index is None:
+                armazem.fechar()
+
+        if estado.index is not None:
+            estado.index.armazem.fechar()
+        if index is None:
+            index = criar_indice_faiss()
+            estado.index = index
+            estado.sujo = True
+            _salvar(estado)
         else:
-            print(f"⚠️ Vetor com dimensão inválida ignorado (id={i}): {len(v) if isinstance(v, list) else 'N/A'}")
+            estado.index = index
+            estado.sujo = False
+        _verificar_reconstrucao(estado)
+        _despejar(manter=estado.caminho)
+        return index
+
+
+def obter_indice():
+    with _travado() as estado:
+        if estado.index is not None:
+            return estado.index
+        return carregar_indice()
+
+
+def _salvar(estado):
+    with estado.lock:
+        if estado.index is None or not estado.sujo:
+            return
+        estado.index.salvar()
+        estado.sujo = False
+
+
+def salvar_indice():
+    with _lock:
+        estados = list(_estados.values())
+    for estado in estados:
+        _salvar(estado)
+
+
+def _fechar(estado, salvar):
+    if salvar:
+        _salvar(estado)
+    if estado.index is not None:
+        estado.index.armazem.fechar()
+        estado.index = None
+
+
+def descarregar(caminho=None, salvar: bool = True):
+    # Tira o índice do banco da memória (o armazém continua em disco)
+    caminho = caminho or db.caminho_atual()
+    with _lock:
+        estado = _estados.get(caminho)
+    if estado is None:
+        return
+    while True:
+        with estado.lock:
+            reconstrucao = estado.reconstrucao
+            if reconstrucao is None:
+                with _lock:
+                    if _estados.get(caminho) is estado:
+                        del _estados[caminho]
+                _fechar(estado, salvar)
+                return
+        # Fechar agora tiraria o armazém de baixo do treino em segundo plano,
+        # que ainda vai publicar e salvar a geração nova: espera ele terminar
+        reconstrucao.join()
+
 
-    if not vetores_validos:
-        return None, []
+def configurar_busca(ef_search: int = None, nprobe: int = None, refino: int = None):
+    # Troca recall por latência nos índices carregados (e nos próximos)
+    if ef_search is not None:
+        ann.HNSW_EF_SEARCH = ef_search
+    if nprobe is not None:
+        ann.IVF_NPROBE = nprobe
+    if refino is not None:
+        ann.REFINO = refino
+    with _lock:
+        estados = list(_estados.values())
+    for estado in estados:
+        with estado.lock:
+            if estado.index is not None:
+                estado.index.configurar(ef_search, nprobe, refino)
 
-    matriz = np.array(vetores_validos).astype('float32')
-    index = faiss.IndexFlatL2(dimension)
-    index.add(matriz)
-    return index, ids_validos
 
-def buscar_semanticamente(query_text, top_k=5):
-    index, ids = criar_indice_faiss()
-    if not index:
+def _verificar_reconstrucao(estado):
+    with estado.lock:
+        index = estado.index
+        if estado.reconstrucao is not None or index is None or not index.precisa_reconstruir():
+            return
+        tipo = ann.escolher_tipo(index.ntotal)
+        print(f"🔧 Treinando índice {tipo} em segundo plano ({index.ntotal} vetores)...")
+        estado.alteracoes = []
+        # Linhas anexadas depois deste ponto chegam ao índice novo pelos eventos em alteracoes
+        args = (estado, index.armazem, len(index.armazem), tipo)
+        estado.reconstrucao = threading.Thread(target=_reconstruir, args=args, name="memoro-indice", daemon=True)
+        estado.reconstrucao.start()
+
+
+def _reconstruir(estado, armazem, linhas, tipo):
+    inicio = time.perf_counter()
+    compactado = None
+    try:
+        compactado = armazem.compactar(linhas)
+        novo = ann.IndiceVetorial.construir(compactado, tipo)
+    except Exception as e:
+        metricas.contar('erros', onde='indice_reconstrucao')
+        print(f"⚠️ Falha ao reconstruir o índice: {e}")
+        if compactado is not None:
+            compactado.descartar()
+        with estado.lock:
+            estado.reconstrucao = None
+            estado.alteracoes = None
+        return
+    with estado.lock:
+        # O que mudou enquanto o treino rodava entra no índice novo antes da troca
+        for evento, note_ids, embeddings in estado.alteracoes:
+            _aplicar(novo, evento, note_ids, embeddings)
+        antigo = estado.index
+        estado.index = novo
+        estado.sujo = True
+        estado.reconstrucao = None
+        estado.alteracoes = None
+        if antigo is not None:
+            antigo.armazem.fechar()
+        compactado.publicar()  # apaga a geração antiga
+    print(f"✅ Índice {novo.tipo} pronto em {time.perf_counter() - inicio:.1f}s")
+    _salvar(estado)
+
+
+def _chaves_indexadas(index, note_id):
+    # Os trechos de uma nota são sempre 0..n-1
+    chaves = []
+    while index.contem(db.chave_trecho(note_id, len(chaves))):
+        chaves.append(db.chave_trecho(note_id, len(chaves)))
+    return chaves
+
+
+def _aplicar(index, evento, note_ids, embeddings):
+    # embeddings: por nota, a matriz de trechos (ou None em 'delete')
+    for i, note_id in enumerate(note_ids):
+        vetores = None if evento == 'delete' else embeddings[i]
+        if evento != 'save_many' or vetores is None:
+            index.remover(_chaves_indexadas(index, note_id))
+        if vetores is not None and len(vetores):
+            index.adicionar([db.chave_trecho(note_id, j) for j in range(len(vetores))], vetores)
+
+
+def _registrar(evento, note_ids, embeddings=None):
+    with _travado() as estado:
+        if estado.index is None:
+            _aplicar_em_disco(evento, note_ids, embeddings)
+            return
+        _aplicar(estado.index, evento, note_ids, embeddings)
+        if estado.alteracoes is not None:
+            estado.alteracoes.append((evento, note_ids, embeddings))
+        estado.sujo = True
+    _verificar_reconstrucao(estado)
+
+
+def _aplicar_em_disco(evento, note_ids, embeddings):
+    # Índice fora da memória (nunca carregado ou despejado): a alteração vai
+    # direto para o armazém e o FAISS alcança as linhas novas ao carregar.
+    # Sem armazém ainda, não há o que fazer: carregar_indice() monta do banco.
+    armazem = vetores.ArmazemVetorial.abrir(pasta_vetores(), dimension)
+    if armazem is None:
+        return
+    try:
+        _aplicar(ann.IndiceVetorial(armazem, 'flat'), evento, note_ids, embeddings)
+    finally:
+        armazem.fechar()
+
+
+def indexar_nota(note_id: int, embedding):
+    if embedding is None:
+        _registrar('delete', [note_id])
+    else:
+        _registrar('update', [note_id], [embedding])
+
+
+def indexar_lote(note_ids, embeddings):
+    _registrar('save_many', list(note_ids), list(embeddings))
+
+
+def remover_do_indice(note_id: int):
+    _registrar('delete', [note_id])
+
+
+def _ao_alterar_nota(evento, note_id, embedding):
+    if evento == 'delete':
+        remover_do_indice(note_id)
+    elif evento == 'save_many':
+        indexar_lote(note_id, embedding)
+    elif evento == 'update_many':
+        _registrar('update_many', list(note_id), list(embedding))
+    elif embedding is not None:
+        indexar_nota(note_id, embedding)
+
+
+db.registrar_observador(_ao_alterar_nota)
+atexit.register(salvar_indice)
+
+
+TRECHOS_POR_NOTA = 3  # busca top_k * isso trechos antes de agrupar por nota
+PREFILTRO_MAX = 20_000  # até quantas notas filtradas a busca é exata só entre elas
+
+
+def _melhor_trecho_por_nota(chaves, similaridades, notas=None):
+    # {note_id: (chunk_index, similaridade)} na ordem dos resultados, que já vêm
+    # ordenados: fica o melhor trecho de cada nota
+    melhores = {}
+    for chave, similaridade in zip(chaves, similaridades):
+        if chave == -1:
+            continue
+        note_id, chunk_index = db.nota_da_chave(int(chave))
+        if notas is not None and note_id not in notas:
+            continue
+        if note_id not in melhores:
+            melhores[note_id] = (chunk_index, float(similaridade))
+    return melhores
+
+
+def buscar_trechos(query_text, top_k=5, tempos=None, notas=None):
+    # [(note_id, chunk_index, similaridade)] com o melhor trecho de cada nota,
+    # da mais para a menos parecida. tempos: dict opcional que recebe 'embed' e 'search' em ms
+    # notas: só estes note_ids entram no resultado (ex.: filtro de tags)
+    # Só o índice do banco atual: outros usuários nunca entram na busca
+    if obter_indice().ntotal == 0 or (notas is not None and not notas):
         return []
+    inicio = time.perf_counter()
     query_vec = np.array([generate_embedding(query_text)]).astype('float32')
-    distancias, indices = index.search(query_vec, top_k)
-    return [ids[i] for i in indices[0] if i < len(ids)]
\ No newline at end of file
+    meio = time.perf_counter()
+    chaves_permitidas = None
+    if notas is not None:
+        notas = set(notas)
+        # Poucas notas: busca exata só nos trechos delas, em vez de filtrar o ANN depois
+        chaves_permitidas = db.get_chunk_keys(notas) if len(notas) <= PREFILTRO_MAX else None
+    with _travado() as estado:
+        # Pode ter sido despejado ou trocado pela reconstrução enquanto a consulta era codificada
+        index = estado.index if estado.index is not None else carregar_indice()
+        limite = index.ntotal if chaves_permitidas is None else len(chaves_permitidas)
+        pedir = top_k * TRECHOS_POR_NOTA
+        if notas is not None and chaves_permitidas is None:
+            # Filtro amplo: pede mais candidatos na proporção do que fica de fora
+            pedir *= max(1, -(-index.ntotal // len(notas)))
+        pedir = min(pedir, limite)
+        melhores = {}
+        while pedir:
+            if chaves_permitidas is None:
+                similaridades, chaves = index.buscar(query_vec, pedir)
+            else:
+                similaridades, chaves = index.buscar_entre(query_vec, chaves_permitidas, pedir)
+            melhores = _melhor_trecho_por_nota(chaves[0], similaridades[0], notas)
+            # Notas longas ocupam vários dos trechos pedidos: pede mais até ter
+            # top_k notas distintas (como ann.IndiceVetorial._candidatos)
+            if len(melhores) >= top_k or pedir == limite:
+                break
+            pedir = min(pedir * 4, limite)
+    if tempos is not None:
+        tempos['embed'] = tempos.get('embed', 0.0) + (meio - inicio) * 1000
+        tempos['search'] = tempos.get('search', 0.0) + (time.perf_counter() - meio) * 1000
+    return [(note_id, chunk_index, similaridade)
+            for note_id, (chunk_index, similaridade) in list(melhores.items())[:top_k]]
+
+
+def indice_carregado() -> bool:
+    # Se o índice do banco atual está na memória (buscar sem pagar o carregamento)
+    with _travado() as estado:
+        return estado.index is not None
+
+
+def buscar_notas_por_vetores(vetores, top_k=5):
+    # Para cada vetor (já calculado: nenhuma inferência), [(note_id, similaridade)]
+    # das top_k notas pelo melhor trecho, numa única busca em lote no índice
+    vetores = np.asarray(vetores, dtype='float32').reshape(-1, dimension)
+    if len(vetores) == 0:
+        return []
+    with _travado() as estado:
+        index = estado.index if estado.index is not None else carregar_indice()
+        pedir = min(top_k * TRECHOS_POR_NOTA, index.ntotal)
+        if pedir == 0:
+            return [[] for _ in vetores]
+        while True:
+            similaridades, chaves = index.buscar(vetores, pedir)
+            melhores = [_melhor_trecho_por_nota(linha_chaves, linha_sim)
+                        for linha_chaves, linha_sim in zip(chaves, similaridades)]
+            if min(len(m) for m in melhores) >= top_k or pedir == index.ntotal:
+                break
+            pedir = min(pedir * 4, index.ntotal)
+    return [[(note_id, similaridade) for note_id, (_, similaridade) in list(m.items())[:top_k]]
+            for m in melhores]
+
+
+def buscar_semanticamente(query_text, top_k=5, tempos=None):
+    return [note_id for note_id, _, _ in buscar_trechos(query_text, top_k, tempos)]
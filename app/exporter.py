@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+import db
+
+# Exportação em massa: as notas vêm de um único cursor (db.iter_notes_for_export)
+# e são escritas uma a uma no destino, então a memória não depende do tamanho
+# do acervo. Como a leitura é uma transação só, o arquivo é um retrato
+# consistente do banco mesmo com o app gravando ao mesmo tempo (WAL).
+#   'md'    -> um Markdown com todas as notas, da mais antiga para a mais nova
+#   'jsonl' -> um objeto JSON por linha; com embeddings, os vetores de cada trecho
+#   'zip'   -> um .md por nota (notas/AAAA-MM-DD-<id>.md) + notas.jsonl
+FORMATOS = ('md', 'jsonl', 'zip')
+AVISO_A_CADA = 1000  # notas entre chamadas de progresso
+
+
+def formato_do_caminho(caminho: str):
+    extensao = os.path.splitext(caminho)[1].lower().lstrip('.')
+    return extensao if extensao in FORMATOS else None
+
+
+def _lista_tags(tags):
+    return [t.strip() for t in (tags or '').split(',') if t.strip()]
+
+
+def nota_markdown(note_id, content, summary, tags, timestamp) -> str:
+    tags = _lista_tags(tags)
+    return (
+        f"# 🗂 Anotação de {timestamp[:16].replace('T', ' ')}\n\n"
+        f"*id {note_id}*" + (f" · 🏷 {', '.join(tags)}" if tags else "") + "\n\n"
+        f"## 🧠 Resumo\n\n{summary or '—'}\n\n"
+        f"## 📄 Conteúdo\n\n{content or ''}\n"
+    )
+
+
+def nota_json(note_id, content, summary, tags, timestamp, trechos=None) -> str:
+    nota = {"id": note_id, "timestamp": timestamp, "content": content, "summary": summary,
+            "tags": _lista_tags(tags)}
+    if trechos is not None:
+        nota["chunks"] = [
+            {"start": inicio, "end": fim, "embedding": np.frombuffer(blob, dtype=np.float32).tolist()}
+            for inicio, fim, blob in trechos
+        ]
+    return json.dumps(nota, ensure_ascii=False)
+
+
+def _escrever_md(notas, f):
+    for i, nota in enumerate(notas):
+        if i:
+            f.write("\n---\n\n")
+        f.write(nota_markdown(*nota[:5]))
+        yield
+
+
+def _escrever_jsonl(notas, f):
+    for nota in notas:
+        f.write(nota_json(*nota))
+        f.write("\n")
+        yield
+
+
+def _escrever_zip(notas, f):
+    # O zipfile só escreve uma entrada por vez: os .md vão direto para o zip e
+    # o notas.jsonl acumula num arquivo temporário, copiado no fim
+    with zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_DEFLATED) as zf, \
+            tempfile.TemporaryFile('w+', encoding='utf-8') as jsonl:
+        for nota in notas:
+            note_id, timestamp = nota[0], nota[4]
+            zf.writestr(f"notas/{timestamp[:10]}-{note_id}.md", nota_markdown(*nota[:5]))
+            jsonl.write(nota_json(*nota))
+            jsonl.write("\n")
+            yield
+        jsonl.seek(0)
+        with zf.open("notas.jsonl", 'w') as destino:
+            for linha in jsonl:
+                destino.write(linha.encode('utf-8'))
+
+
+ESCRITORES = {
+    'md': _escrever_md,
+    'jsonl': _escrever_jsonl,
+    'zip': _escrever_zip,
+}
+
+
+def exportar(destino: str, formato: str = None, desde: str = None, ate: str = None, tags=None,
+             modo_tags: str = 'and', com_embeddings: bool = False, progresso=None):
+    # destino '-' escreve md/jsonl na saída padrão (ex.: para um pipe). O arquivo
+    # é escrito ao lado com .tmp e só substitui o destino quando termina.
+    formato = formato or formato_do_caminho(destino)
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação desconhecido: use {', '.join(FORMATOS)}.")
+    if destino == '-' and formato == 'zip':
+        raise ValueError("O formato zip precisa de um arquivo de destino.")
+
+    inicio = time.perf_counter()
+    notas = db.iter_notes_for_export(desde, ate, tags, modo_tags, com_trechos=com_embeddings)
+    total = 0
+    if destino == '-':
+        for _ in ESCRITORES[formato](notas, sys.stdout):
+            total += 1
+        sys.stdout.flush()
+    else:
+        pasta = os.path.dirname(os.path.abspath(destino))
+        os.makedirs(pasta, exist_ok=True)
+        temporario = destino + ".tmp"
+        modo = {'mode': 'wb'} if formato == 'zip' else {'mode': 'w', 'encoding': 'utf-8', 'newline': '\n'}
+        try:
+            with open(temporario, **modo) as f:
+                for _ in ESCRITORES[formato](notas, f):
+                    total += 1
+                    if progresso and total % AVISO_A_CADA == 0:
+                        progresso(total)
+            os.replace(temporario, destino)
+        except BaseException:
+            try:
+                os.remove(temporario)
+            except OSError:
+                pass
+            raise
+        finally:
+            notas.close()
+
+    return {"notas": total, "caminho": destino, "segundos": time.perf_counter() - inicio,
+            "bytes": os.path.getsize(destino) if destino != '-' else None}
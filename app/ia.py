@@ -1,19 +1,33 @@
+import contextvars
+import json
+import math
 import os
-from sentence_transformers import SentenceTransformer
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from PIL import Image
+import requests.adapters
 from datetime import datetime
 from dotenv import load_dotenv
-import pytesseract
 import re
 
-pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
-os.environ["TESSDATA_PREFIX"] = r"C:\\Program Files\\Tesseract-OCR\\tessdata"
+import numpy as np
+
+import chunking
+import db
+import embedding_cache
+import llm_cache
+import metricas
+
+# torch/sentence-transformers são importados só no primeiro uso: a janela abre
+# sem esperar por eles. O OCR (PIL, pytesseract) vive em ocr.py
 
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPEN_API_KEY")
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Sobrescrevível para apontar para um servidor local de teste
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
 
 HEADERS = {
     "Authorization": f"Bearer {OPENROUTER_API_KEY}",
@@ -22,46 +36,334 @@ HEADERS = {
 
 MODEL_SUMMARY = "meta-llama/llama-3.3-70b-instruct:free"
 MODEL_TAGS = "mistralai/mistral-7b-instruct:free"
+MODEL_ENRICH = MODEL_SUMMARY  # resumo + tags numa chamada só, em JSON
+# Mudou o texto de um prompt? Incremente a versão: as respostas em cache
+# (llm_cache) do prompt antigo deixam de valer
+PROMPT_VERSAO_RESUMO = 1
+PROMPT_VERSAO_TAGS = 1
+PROMPT_VERSAO_ENRIQUECIMENTO = 1
+
+# Orçamento de entrada por chamada, em tokens estimados: os modelos free têm
+# janelas curtas. Notas maiores são resumidas por partes (map) e os resumos
+# parciais viram a entrada da chamada final (reduce).
+ORCAMENTO_TOKENS = int(os.getenv("MEMORO_ORCAMENTO_TOKENS", "3000"))
+CARACTERES_POR_TOKEN = 3.5  # média em português; o provedor devolve o valor exato
+MAX_TOKENS_SAIDA = 300
+MAX_TOKENS_ENRIQUECIMENTO = 400
+# Cada rodada do map-reduce resume partes de até um orçamento em até
+# MAX_TOKENS_SAIDA: com orçamento >= 2x isso a junção ao menos cai pela metade.
+# Depois de MAX_RODADAS_REDUCAO (modelo que ignora o limite de saída), corta.
+ORCAMENTO_MINIMO = 2 * MAX_TOKENS_SAIDA
+MAX_RODADAS_REDUCAO = 3
+MAX_TAGS = 8
+
+TIMEOUT = (5, 60)  # (conexão, leitura) em segundos
+MAX_TENTATIVAS = 4
+BACKOFF_BASE = 1.0  # segundos; dobra a cada tentativa, com jitter
+ESPERA_MAXIMA = 60.0  # teto para o Retry-After do servidor, em segundos
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+# O plano free do OpenRouter aceita ~20 requisições/minuto
+REQUISICOES_POR_MINUTO = 20
+RAJADA = 4
+
+
+class TokenBucket:
+    # Rate limit no cliente: cada chamada consome um token; tokens voltam a
+    # taxa/segundo até o limite de capacidade (rajada)
+    def __init__(self, taxa: float, capacidade: int):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._tokens = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+
+_limite = TokenBucket(REQUISICOES_POR_MINUTO / 60, RAJADA)
+_sessao = None
+_sessao_lock = threading.Lock()
+# Partes de notas longas são resumidas em paralelo; poucos workers bastam (o gargalo é a API)
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memoro-ia")
+
+
+def _get_sessao():
+    # Sessão keep-alive compartilhada: sem novo handshake TLS por chamada
+    global _sessao
+    if _sessao is None:
+        with _sessao_lock:
+            if _sessao is None:
+                sessao = requests.Session()
+                adaptador = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=8)
+                sessao.mount("https://", adaptador)
+                sessao.mount("http://", adaptador)
+                sessao.headers.update(HEADERS)
+                _sessao = sessao
+    return _sessao
+
+
+def _espera_retentativa(tentativa, response=None):
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                espera = float(retry_after)
+            except ValueError:
+                espera = None
+            # Negativo, NaN ou infinito conta como ausente; valores altos param no teto
+            if espera is not None and math.isfinite(espera) and espera >= 0:
+                return min(espera, ESPERA_MAXIMA)
+    # Backoff exponencial com "full jitter"
+    return random.uniform(0, BACKOFF_BASE * (2 ** tentativa))
+
 
+def estimar_tokens(texto: str) -> int:
+    return math.ceil(len(texto or '') / CARACTERES_POR_TOKEN)
 
-def call_openrouter(messages, model):
+def _registrar_chamada(tipo, model, messages, data, inicio, tentativas, status):
+    # Contabilidade por chamada (tabela llm_calls do banco atual); nunca derruba a chamada
+    try:
+        uso = (data or {}).get("usage") or {}
+        estimado = "prompt_tokens" not in uso
+        entrada = uso.get("prompt_tokens", sum(estimar_tokens(m["content"]) for m in messages))
+        saida = uso.get("completion_tokens")
+        if saida is None and data:
+            saida = estimar_tokens(data["choices"][0]["message"]["content"])
+        metricas.contar('llm_tokens', entrada or 0, tipo=tipo, direcao='entrada')
+        metricas.contar('llm_tokens', saida or 0, tipo=tipo, direcao='saida')
+        db.record_llm_call(tipo, model, entrada, saida, estimado, (time.perf_counter() - inicio) * 1000,
+                           tentativas, status)
+    except Exception as e:
+        print(f"⚠️ Não foi possível registrar a chamada à IA: {e}")
+
+def call_openrouter(messages, model, max_tokens: int = MAX_TOKENS_SAIDA, formato_json: bool = False,
+                    tipo: str = "chat"):
+    with metricas.medir('llm', tipo=tipo, modelo=model):
+        return _chamar_openrouter(messages, model, max_tokens, formato_json, tipo)
+
+def _chamar_openrouter(messages, model, max_tokens, formato_json, tipo):
     payload = {
         "model": model,
         "messages": messages,
         "temperature": 0.7,
-        "max_tokens": 300,
+        "max_tokens": max_tokens,
     }
-    response = requests.post(OPENROUTER_API_URL, headers=HEADERS, json=payload)
-    response.raise_for_status()
-    data = response.json()
-    return data["choices"][0]["message"]["content"].strip()
+    if formato_json:
+        payload["response_format"] = {"type": "json_object"}  # modelos que não suportam ignoram
+    inicio = time.perf_counter()
+    for tentativa in range(MAX_TENTATIVAS):
+        _limite.adquirir()
+        try:
+            response = _get_sessao().post(OPENROUTER_API_URL, json=payload, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if tentativa == MAX_TENTATIVAS - 1:
+                _registrar_chamada(tipo, model, messages, None, inicio, tentativa + 1, "error")
+                raise
+            metricas.contar('llm_retentativas', tipo=tipo, motivo='conexao')
+            time.sleep(_espera_retentativa(tentativa))
+            continue
+        if response.status_code in STATUS_RETENTAVEIS and tentativa < MAX_TENTATIVAS - 1:
+            metricas.contar('llm_retentativas', tipo=tipo, motivo=str(response.status_code))
+            time.sleep(_espera_retentativa(tentativa, response))
+            continue
+        if not response.ok:
+            _registrar_chamada(tipo, model, messages, None, inicio, tentativa + 1, "error")
+        response.raise_for_status()
+        data = response.json()
+        _registrar_chamada(tipo, model, messages, data, inicio, tentativa + 1, "ok")
+        return data["choices"][0]["message"]["content"].strip()
+
+def _em_paralelo(fn, itens):
+    # Cada tarefa leva o contexto de quem chamou (db.usuario: a contabilidade vai para o banco certo)
+    contexto = contextvars.copy_context()
+    futuros = [_executor.submit(contexto.copy().run, fn, item) for item in itens]
+    return [f.result() for f in futuros]
+
+def _resumir_parte(argumentos):
+    parte, numero, total = argumentos
+    prompt = (f"Este é o trecho {numero} de {total} de uma anotação longa. Resuma-o de forma clara e "
+              f"objetiva, mantendo nomes, datas e números importantes:\n\n{parte}")
+    return llm_cache.em_cache('summary_part', MODEL_SUMMARY, PROMPT_VERSAO_RESUMO, parte,
+                              lambda: call_openrouter([{"role": "user", "content": prompt}], MODEL_SUMMARY,
+                                                      tipo="summary_part"))
+
+def reduzir_para_orcamento(text: str, orcamento: int = None):
+    # (texto que cabe no orçamento, se ele é uma junção de resumos parciais).
+    # Map-reduce: partes resumidas em paralelo; se a junção ainda não couber, de novo.
+    orcamento = orcamento or ORCAMENTO_TOKENS
+    if orcamento < ORCAMENTO_MINIMO:
+        raise ValueError(f"Orçamento de {orcamento} tokens pequeno demais: use ao menos {ORCAMENTO_MINIMO} "
+                         f"(MEMORO_ORCAMENTO_TOKENS).")
+    parcial = False
+    for _ in range(MAX_RODADAS_REDUCAO):
+        if estimar_tokens(text) <= orcamento:
+            break
+        spans = chunking.dividir_por_caracteres(text, int(orcamento * CARACTERES_POR_TOKEN))
+        partes = [(text[inicio:fim], i + 1, len(spans)) for i, (inicio, fim) in enumerate(spans)]
+        text = "\n\n".join(_em_paralelo(_resumir_parte, partes))
+        parcial = True
+    if estimar_tokens(text) > orcamento:
+        print(f"⚠️ Resumos parciais ainda passam do orçamento após {MAX_RODADAS_REDUCAO} rodadas; cortando")
+        text = text[:int(orcamento * CARACTERES_POR_TOKEN)]
+    return text, parcial
 
 def summarize_text(text: str) -> str:
-    prompt = f"Resuma o seguinte texto de forma clara e objetiva:\n\n{text}"
-    return call_openrouter([{"role": "user", "content": prompt}], MODEL_SUMMARY)
+    # Mesmo texto, modelo e prompt: a resposta vem do cache, sem rede
+    entrada, parcial = reduzir_para_orcamento(text)
+    if parcial:
+        prompt = ("Os textos abaixo são resumos parciais, em ordem, de uma anotação longa. "
+                  f"Escreva um resumo claro e objetivo da anotação inteira:\n\n{entrada}")
+    else:
+        prompt = f"Resuma o seguinte texto de forma clara e objetiva:\n\n{entrada}"
+    return llm_cache.em_cache('summary_reduce' if parcial else 'summary', MODEL_SUMMARY, PROMPT_VERSAO_RESUMO,
+                              entrada, lambda: call_openrouter([{"role": "user", "content": prompt}],
+                                                               MODEL_SUMMARY, tipo="summary"))
+
+def _lista_tags(tags) -> list[str]:
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    if not isinstance(tags, list):
+        raise ValueError("tags não é uma lista")
+    limpas = []
+    for tag in tags:
+        if isinstance(tag, str) and tag.strip(" #\n\t") and tag.strip(" #\n\t") not in limpas:
+            limpas.append(tag.strip(" #\n\t"))
+    return limpas[:MAX_TAGS]
 
 def extract_tags(text: str) -> list[str]:
-    prompt = f"Extraia os principais tópicos e tags deste texto, separados por vírgula:\n\n{text}"
-    tags_str = call_openrouter([{"role": "user", "content": prompt}], MODEL_TAGS)
-    return [tag.strip() for tag in tags_str.split(",") if tag.strip()]
+    entrada, _ = reduzir_para_orcamento(text)
+    prompt = f"Extraia os principais tópicos e tags deste texto, separados por vírgula:\n\n{entrada}"
+    tags_str = llm_cache.em_cache('tags', MODEL_TAGS, PROMPT_VERSAO_TAGS, entrada,
+                                  lambda: call_openrouter([{"role": "user", "content": prompt}], MODEL_TAGS,
+                                                          tipo="tags"))
+    return _lista_tags(tags_str)
+
+def ler_enriquecimento(resposta: str) -> tuple[str, list[str]]:
+    # Valida a resposta JSON {"resumo": str, "tags": [str]}; tolera ```json e texto em volta
+    inicio, fim = resposta.find("{"), resposta.rfind("}")
+    if inicio == -1 or fim < inicio:
+        raise ValueError("resposta sem objeto JSON")
+    dados = json.loads(resposta[inicio:fim + 1])
+    if not isinstance(dados, dict):
+        raise ValueError("resposta JSON não é um objeto")
+    resumo = dados.get("resumo", dados.get("summary"))
+    if not isinstance(resumo, str) or not resumo.strip():
+        raise ValueError("resumo ausente na resposta")
+    return resumo.strip(), _lista_tags(dados.get("tags", []))
+
+def _prompt_enriquecimento(entrada: str, parcial: bool) -> str:
+    origem = ("Os textos abaixo são resumos parciais, em ordem, de uma anotação longa"
+              if parcial else "Leia a anotação abaixo")
+    return (f"{origem}. Responda somente com um objeto JSON no formato "
+            '{"resumo": "...", "tags": ["...", "..."]}, '
+            f"com um resumo claro e objetivo da anotação inteira e de 3 a {MAX_TAGS} tags curtas "
+            f"em minúsculas.\n\n{entrada}")
+
+def _enriquecer_validado(entrada: str, parcial: bool) -> str:
+    # Uma nova tentativa se o modelo não devolver JSON válido; a fila de jobs cuida do resto
+    messages = [{"role": "user", "content": _prompt_enriquecimento(entrada, parcial)}]
+    resposta = call_openrouter(messages, MODEL_ENRICH, MAX_TOKENS_ENRIQUECIMENTO, formato_json=True, tipo="enrich")
+    try:
+        resumo, tags = ler_enriquecimento(resposta)
+    except ValueError as e:
+        print(f"⚠️ Resposta de enriquecimento inválida ({e}), tentando de novo")
+        messages += [{"role": "assistant", "content": resposta},
+                     {"role": "user", "content": "Responda apenas com o objeto JSON pedido, sem nenhum outro texto."}]
+        resumo, tags = ler_enriquecimento(
+            call_openrouter(messages, MODEL_ENRICH, MAX_TOKENS_ENRIQUECIMENTO, formato_json=True, tipo="enrich"))
+    # O cache guarda a forma já validada
+    return json.dumps({"resumo": resumo, "tags": tags}, ensure_ascii=False)
+
+def enrich_text(text: str) -> tuple[str, list[str]]:
+    # Resumo e tags numa chamada só (JSON validado); notas acima do orçamento
+    # passam antes pelo map-reduce de reduzir_para_orcamento
+    entrada, parcial = reduzir_para_orcamento(text)
+    resposta = llm_cache.em_cache('enrich_reduce' if parcial else 'enrich', MODEL_ENRICH,
+                                  PROMPT_VERSAO_ENRIQUECIMENTO, entrada,
+                                  lambda: _enriquecer_validado(entrada, parcial))
+    return ler_enriquecimento(resposta)
 
 def ocr_image(image_path: str) -> str:
-    image = Image.open(image_path)
-    text = pytesseract.image_to_string(image, lang='por')
-    return text.strip()
+    # Todas as páginas (TIFF/PDF) num texto só; ver ocr.extrair_paginas para streaming
+    import ocr
+    return ocr.extrair_texto(image_path)
 
 def current_timestamp() -> str:
     return datetime.utcnow().isoformat()
 
 
+MODEL_EMBEDDING = 'all-MiniLM-L6-v2'  # gratuito e rápido
 
+# Carregado uma vez, no primeiro uso ou por aquecer_modelo()
+_model = None
+_model_lock = threading.Lock()
 
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                with metricas.medir('embed.load'):
+                    from sentence_transformers import SentenceTransformer
+                    _model = SentenceTransformer(MODEL_EMBEDDING)
+    return _model
 
+def model_carregado() -> bool:
+    return _model is not None
 
-
-# Carrega modelo uma vez (pode ser global)
-model = SentenceTransformer('all-MiniLM-L6-v2')  # gratuito e rápido
+def aquecer_modelo():
+    # Carrega o modelo em segundo plano; quem chamar generate_embedding antes
+    # disso apenas espera o mesmo carregamento terminar
+    thread = threading.Thread(target=get_model, name="memoro-modelo", daemon=True)
+    thread.start()
+    return thread
 
 def generate_embedding(text: str) -> list[float]:
-    embedding = model.encode(text)
-    return embedding.tolist()
\ No newline at end of file
+    # O mesmo texto (prefixos da busca, notas não alteradas) não é recodificado
+    embedding = embedding_cache.obter(text, MODEL_EMBEDDING)
+    if embedding is None:
+        modelo = get_model()
+        with metricas.medir('embed.encode', lote='1'):
+            embedding = modelo.encode(text)
+        embedding_cache.guardar(text, MODEL_EMBEDDING, embedding)
+    return embedding.tolist()
+
+def generate_embeddings(texts: list[str], batch_size: int = 64):
+    # Versão em lote: uma única chamada a model.encode para tudo que não está
+    # no cache. Devolve uma matriz float32 (len(texts), 384).
+    vetores = [embedding_cache.obter(t, MODEL_EMBEDDING) for t in texts]
+    faltando = [i for i, v in enumerate(vetores) if v is None]
+    metricas.contar('embed_cache', len(texts) - len(faltando), resultado='hit')
+    metricas.contar('embed_cache', len(faltando), resultado='miss')
+    if faltando:
+        modelo = get_model()
+        with metricas.medir('embed.encode', lote='varios'):
+            novos = modelo.encode([texts[i] for i in faltando], batch_size=batch_size)
+        embedding_cache.guardar_varios([texts[i] for i in faltando], MODEL_EMBEDDING, novos)
+        for i, v in zip(faltando, novos):
+            vetores[i] = v
+    return np.asarray(vetores, dtype=np.float32).reshape(len(texts), -1)
+
+def generate_chunk_embeddings(texts: list[str], batch_size: int = 64):
+    # Divide cada texto em trechos (chunking.dividir) e codifica os trechos de
+    # todos os textos numa única passada de generate_embeddings.
+    # Devolve, por texto, (spans, matriz float32 (n_trechos, 384)).
+    spans = [chunking.dividir(t) for t in texts]
+    trechos = [t[inicio:fim] for t, s in zip(texts, spans) for inicio, fim in s]
+    matriz = generate_embeddings(trechos, batch_size=batch_size)
+    resultado = []
+    inicio = 0
+    for s in spans:
+        resultado.append((s, matriz[inicio:inicio + len(s)]))
+        inicio += len(s)
+    return resultado
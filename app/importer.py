@@ -0,0 +1,134 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import db
+import ia
+import ocr
+
+EXTENSOES_TEXTO = ('.txt', '.md')
+EXTENSOES_IMAGEM = ocr.EXTENSOES
+
+# Importação em massa: descobrir -> ler/OCR -> embeddings dos trechos em lote ->
+# enriquecimento (LLM) concorrente -> INSERT único por lote.
+# Cada lote grava também o checkpoint (imported_files) na mesma transação.
+
+
+def descobrir_arquivos(diretorio: str):
+    importados = db.get_imported_files()
+    for raiz, _, nomes in os.walk(diretorio):
+        for nome in sorted(nomes):
+            if not nome.lower().endswith(EXTENSOES_TEXTO + EXTENSOES_IMAGEM):
+                continue
+            caminho = os.path.abspath(os.path.join(raiz, nome))
+            info = os.stat(caminho)
+            if importados.get(caminho) == (info.st_size, info.st_mtime):
+                continue
+            yield caminho, info.st_size, info.st_mtime
+
+
+def ler_arquivo(caminho: str) -> str:
+    if caminho.lower().endswith(EXTENSOES_IMAGEM):
+        return ocr.extrair_texto(caminho)
+    with open(caminho, encoding='utf-8', errors='replace') as f:
+        return f.read().strip()
+
+
+def _ler_seguro(caminho):
+    try:
+        return ler_arquivo(caminho)
+    except Exception as e:
+        print(f"⚠️ Não foi possível ler {caminho}: {e}")
+        return None
+
+
+def _lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def enriquecer(texto: str):
+    # (resumo, tags); resumo None quando a IA falha: a nota entra como 'pending'
+    # com um job na fila em vez de abortar o lote
+    try:
+        return ia.enrich_text(texto)
+    except Exception as e:
+        print(f"⚠️ Enriquecimento falhou, nota fica pendente: {e}")
+        return None, []
+
+
+def importar_diretorio(diretorio: str, batch_size: int = 64, workers: int = 4,
+                       enriquecer_agora: bool = True, progresso=None):
+    arquivos = list(descobrir_arquivos(diretorio))
+    total = len(arquivos)
+    importadas = 0
+    falhas = 0
+    inicio = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for lote in _lotes(arquivos, batch_size):
+            # Leitura em paralelo; as páginas de OCR vão para o pool de processos de ocr.py
+            textos = []
+            for (caminho, tamanho, mtime), texto in zip(lote, pool.map(_ler_seguro, [a[0] for a in lote])):
+                if texto:
+                    textos.append(((caminho, tamanho, mtime), texto))
+                else:
+                    falhas += 1
+            if not textos:
+                continue
+            origens, conteudos = zip(*textos)
+
+            # Todos os trechos do lote num único model.encode
+            trechos = ia.generate_chunk_embeddings(list(conteudos), batch_size=batch_size)
+
+            if enriquecer_agora:
+                # Cópia do contexto por tarefa: a contabilidade da IA vai para o banco do db.usuario atual
+                contexto = contextvars.copy_context()
+                enriquecidos = list(pool.map(lambda texto: contexto.copy().run(enriquecer, texto), conteudos))
+            else:
+                enriquecidos = [(None, [])] * len(conteudos)
+
+            notas = [
+                (conteudo, resumo, tags, datetime.fromtimestamp(mtime).isoformat(), None)
+                for conteudo, (resumo, tags), (_, _, mtime) in zip(conteudos, enriquecidos, origens)
+            ]
+            db.save_notes_batch(notas, sources=list(origens), chunks=trechos, model=ia.MODEL_EMBEDDING)
+            importadas += len(notas)
+
+            if progresso:
+                decorrido = time.perf_counter() - inicio
+                progresso(importadas + falhas, total, importadas / decorrido if decorrido else 0.0)
+
+    return {"total": total, "importadas": importadas, "falhas": falhas,
+            "segundos": time.perf_counter() - inicio}
+
+
+def enriquecer_pendentes(workers: int = 4, progresso=None, timeout=None):
+    # Notas importadas sem resumo já estão na fila como 'enrich'; aqui os
+    # workers rodam até ela esvaziar (útil em lote, fora do app)
+    import jobs
+    feitas = {'done': 0, 'failed': 0}
+    usuario = db.usuario_atual()
+
+    def contar(note_id, kind, status):
+        if db.usuario_atual() != usuario:
+            return  # os workers também atendem as filas de outros usuários
+        feitas[status] += 1
+        if progresso:
+            progresso(feitas['done'], feitas['failed'])
+
+    jobs.registrar_ouvinte(contar)
+    jobs.iniciar(workers)
+    try:
+        jobs.drenar(timeout)
+    finally:
+        jobs.parar()
+    return feitas
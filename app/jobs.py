@@ -0,0 +1,218 @@
+import threading
+import time
+
+import db
+import ia
+import metricas
+
+# Fila persistente (tabela jobs) para o que depende de IA depois que a nota já
+# foi salva. Tipos de job:
+#   'embed'   -> embeddings locais por trecho (atualiza o índice FAISS via db.update_chunks)
+#   'enrich'  -> resumo + tags (nota nova ou importada)
+#   'summary' -> só o resumo (edição: as tags digitadas pelo usuário ficam)
+#   'related' -> lista de notas relacionadas e listas vizinhas (relacionadas.py)
+MAX_TENTATIVAS = 5
+BACKOFF_BASE = 30  # segundos; dobra a cada falha
+INTERVALO_OCIOSO = 5  # segundos entre verificações quando a fila está vazia
+ENRIQUECIMENTO = ('enrich', 'summary')  # tipos refletidos em notes.enrichment_status
+
+_cond = threading.Condition()
+_workers = []
+_pausado = False
+_parar = False
+_ouvintes = []
+# Cada usuário (db.usuario) tem a própria tabela jobs. Os workers atendem, em
+# rodízio, os bancos com fila: None é o banco padrão
+_usuarios = {}
+
+
+def registrar_ouvinte(fn):
+    # fn(note_id, kind, status) com status em 'done' ou 'failed'; roda na thread
+    # do worker, dentro do db.usuario dono da nota
+    if fn not in _ouvintes:
+        _ouvintes.append(fn)
+
+
+def _avisar(note_id, kind, status):
+    for fn in _ouvintes:
+        try:
+            fn(note_id, kind, status)
+        except Exception as e:
+            print(f"⚠️ Ouvinte da fila falhou: {e}")
+
+
+def _executar_embed(note_id, content):
+    spans, vetores = ia.generate_chunk_embeddings([content])[0]
+    db.update_chunks(note_id, spans, vetores, db.hash_conteudo(content), ia.MODEL_EMBEDDING)
+
+
+def _executar_enrich(note_id, content):
+    summary, tags = ia.enrich_text(content)
+    db.update_enrichment(note_id, summary, tags)
+
+
+def _executar_summary(note_id, content):
+    db.update_summary(note_id, ia.summarize_text(content))
+
+
+def _executar_related(note_id, content):
+    import relacionadas  # relacionadas.py enfileira estes jobs (importa jobs)
+    relacionadas.atualizar_nota(note_id)
+
+
+EXECUTORES = {
+    'embed': _executar_embed,
+    'enrich': _executar_enrich,
+    'summary': _executar_summary,
+    'related': _executar_related,
+}
+
+
+def salvar_nota(content: str):
+    # Grava a nota imediatamente e enfileira embedding e enriquecimento
+    with db.transaction():
+        note_id = db.save_note(content, None, [], enrichment_status='pending')
+        db.enqueue_job(note_id, 'embed')
+        db.enqueue_job(note_id, 'enrich')
+    notificar()
+    return note_id
+
+
+def enfileirar(note_id: int, kind: str):
+    with db.transaction():
+        if kind in ENRIQUECIMENTO:
+            db.set_enrichment_status(note_id, 'pending')
+        db.enqueue_job(note_id, kind)
+    notificar()
+
+
+def notificar():
+    with _cond:
+        _usuarios[db.usuario_atual()] = True
+        _cond.notify_all()
+
+
+def processar_um():
+    # Executa um job vencido do próximo usuário com fila. Devolve False quando
+    # nenhuma fila tem nada a fazer agora.
+    with _cond:
+        usuarios = list(_usuarios)
+    for usuario in usuarios:
+        with db.usuario(usuario):
+            if _processar_do_banco():
+                with _cond:
+                    _usuarios.pop(usuario, None)
+                    _usuarios[usuario] = True  # vai para o fim do rodízio
+                return True
+            if usuario is not None and not pendentes():
+                with _cond:
+                    _usuarios.pop(usuario, None)
+    return False
+
+
+def _processar_do_banco():
+    job = db.claim_next_job(time.time())
+    if job is None:
+        return False
+    job_id, note_id, kind, tentativas = job
+    content = db.get_note_content(note_id)
+    if content is None:
+        db.complete_job(job_id)  # nota apagada nesse meio tempo
+        return True
+    try:
+        with metricas.medir('job', tipo=kind):
+            EXECUTORES[kind](note_id, content)
+    except Exception as e:
+        erro = f"{type(e).__name__}: {e}"
+        if tentativas >= MAX_TENTATIVAS:
+            metricas.contar('jobs_desistidos', tipo=kind)
+            db.fail_job(job_id, erro)
+            if kind in ENRIQUECIMENTO:
+                db.set_enrichment_status(note_id, 'failed')
+            print(f"❌ Job {kind} da nota {note_id} desistiu após {tentativas} tentativas: {erro}")
+            _avisar(note_id, kind, 'failed')
+        else:
+            db.reschedule_job(job_id, erro, time.time() + BACKOFF_BASE * 2 ** (tentativas - 1))
+        return True
+    db.complete_job(job_id)
+    _avisar(note_id, kind, 'done')
+    return True
+
+
+def _loop():
+    while True:
+        with _cond:
+            while _pausado and not _parar:
+                _cond.wait()
+            if _parar:
+                return
+        try:
+            trabalhou = processar_um()
+        except Exception as e:
+            metricas.contar('erros', onde='worker_fila')
+            print(f"⚠️ Erro no worker da fila: {e}")
+            trabalhou = False
+        with _cond:
+            _cond.notify_all()
+            if not trabalhou and not _parar:
+                _cond.wait(INTERVALO_OCIOSO)
+
+
+def iniciar(workers: int = 2):
+    global _parar
+    if _workers:
+        return
+    _parar = False
+    for usuario in dict.fromkeys([None, db.usuario_atual(), *db.listar_usuarios()]):
+        with db.usuario(usuario):
+            recuperados = db.reset_running_jobs()
+            if recuperados:
+                print(f"🔁 {recuperados} jobs interrompidos voltaram para a fila")
+        _usuarios[usuario] = True
+    for i in range(workers):
+        thread = threading.Thread(target=_loop, name=f"memoro-jobs-{i}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+
+
+def pausar():
+    global _pausado
+    with _cond:
+        _pausado = True
+
+
+def retomar():
+    global _pausado
+    with _cond:
+        _pausado = False
+        _cond.notify_all()
+
+
+def pausado() -> bool:
+    return _pausado
+
+
+def parar(timeout=None):
+    global _parar
+    with _cond:
+        _parar = True
+        _cond.notify_all()
+    for thread in _workers:
+        thread.join(timeout)
+    _workers.clear()
+
+
+def pendentes() -> int:
+    contagem = db.count_jobs()
+    return contagem.get('queued', 0) + contagem.get('running', 0)
+
+
+def drenar(timeout=None) -> bool:
+    # Espera a fila esvaziar (jobs em backoff incluídos). True se esvaziou a tempo.
+    limite = None if timeout is None else time.monotonic() + timeout
+    while pendentes():
+        if limite is not None and time.monotonic() >= limite:
+            return False
+        with _cond:
+            _cond.wait(0.5)
+    return True
@@ -0,0 +1,163 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import db
+import embedding_cache
+
+# Cache das respostas da IA (resumo, tags) endereçado pelo conteúdo: a chave é
+# o sha256 do texto normalizado junto com o tipo, o modelo e a versão do
+# prompt, então reimportar, duplicar ou salvar uma nota sem mudar o texto não
+# chama o OpenRouter de novo, e trocar de modelo ou de prompt invalida sozinho.
+# Fica no mesmo arquivo do cache de embeddings, um por usuário (db.usuario):
+# um acerto revelaria a um usuário que outro já guardou aquele texto. Em cima
+# dele, uma camada LRU em memória, também separada por usuário.
+# Poda: entradas mais velhas que MAX_IDADE_DIAS e, acima de MAX_ITENS, as
+# usadas há mais tempo.
+MAX_MEMORIA = 512
+MAX_ITENS = 20_000
+MAX_IDADE_DIAS = 90
+PODAR_A_CADA = 200  # gravações entre podas
+PERSISTIR = True
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+_tabelas_criadas = set()  # caminhos de cache já preparados neste processo
+_gravacoes = 0
+_estatisticas = {"hits_memoria": 0, "hits_disco": 0, "misses": 0, "podados": 0}
+
+
+def normalizar(texto: str) -> str:
+    # Diferenças só de espaços, quebras de linha ou composição Unicode não contam
+    return ' '.join(unicodedata.normalize('NFC', texto or '').split())
+
+
+def chave(tipo: str, modelo: str, versao: int, texto: str) -> str:
+    return hashlib.sha256(f"{tipo}\0{modelo}\0{versao}\0{normalizar(texto)}".encode("utf-8")).hexdigest()
+
+
+def _conectar():
+    caminho = embedding_cache.caminho_cache()
+    conn = embedding_cache.conexao()
+    if caminho not in _tabelas_criadas:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                hash TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                output TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_uso ON llm_cache(last_used)")
+        _podar(conn)
+        conn.commit()
+        _tabelas_criadas.add(caminho)
+    return conn
+
+
+def _podar(conn):
+    limite = time.time() - MAX_IDADE_DIAS * 86400
+    removidos = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (limite,)).rowcount
+    excesso = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - MAX_ITENS
+    if excesso > 0:
+        removidos += conn.execute('''
+            DELETE FROM llm_cache WHERE hash IN (
+                SELECT hash FROM llm_cache ORDER BY last_used LIMIT ?
+            )
+        ''', (excesso,)).rowcount
+    with _lock:
+        _estatisticas["podados"] += removidos
+
+
+def obter(tipo: str, modelo: str, versao: int, texto: str):
+    h = chave(tipo, modelo, versao, texto)
+    na_memoria = (db.usuario_atual(), h)
+    with _lock:
+        saida = _lru.get(na_memoria)
+        if saida is not None:
+            _lru.move_to_end(na_memoria)
+            _estatisticas["hits_memoria"] += 1
+            return saida
+
+    if PERSISTIR:
+        conn = _conectar()
+        row = conn.execute("SELECT output FROM llm_cache WHERE hash = ?", (h,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE hash = ?", (time.time(), h))
+            conn.commit()
+        if row is not None:
+            _guardar_memoria(h, row[0])
+            with _lock:
+                _estatisticas["hits_disco"] += 1
+            return row[0]
+
+    with _lock:
+        _estatisticas["misses"] += 1
+    return None
+
+
+def _guardar_memoria(h, saida):
+    na_memoria = (db.usuario_atual(), h)
+    with _lock:
+        _lru[na_memoria] = saida
+        _lru.move_to_end(na_memoria)
+        while len(_lru) > MAX_MEMORIA:
+            _lru.popitem(last=False)
+
+
+def guardar(tipo: str, modelo: str, versao: int, texto: str, saida: str):
+    global _gravacoes
+    h = chave(tipo, modelo, versao, texto)
+    _guardar_memoria(h, saida)
+    if not PERSISTIR:
+        return
+    agora = time.time()
+    conn = _conectar()
+    conn.execute(
+        "INSERT OR REPLACE INTO llm_cache (hash, kind, model, output, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+        (h, tipo, modelo, saida, agora, agora),
+    )
+    with _lock:
+        _gravacoes += 1
+        podar = _gravacoes % PODAR_A_CADA == 0
+    if podar:
+        _podar(conn)
+    conn.commit()
+
+
+def em_cache(tipo: str, modelo: str, versao: int, texto: str, gerar):
+    # Resposta guardada para esta entrada, ou gerar() (a chamada à IA) guardada para a próxima
+    saida = obter(tipo, modelo, versao, texto)
+    if saida is None:
+        saida = gerar()
+        if saida:  # resposta vazia não fica guardada: a próxima tentativa chama de novo
+            guardar(tipo, modelo, versao, texto, saida)
+    return saida
+
+
+def estatisticas():
+    with _lock:
+        stats = dict(_estatisticas)
+        stats["itens_memoria"] = len(_lru)
+    if PERSISTIR:
+        conn = _conectar()
+        # Acertos vindos do disco desde que cada resposta foi guardada (entre execuções)
+        stats["itens_disco"], stats["hits_acumulados"] = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_cache").fetchone()
+    consultas = stats["hits_memoria"] + stats["hits_disco"] + stats["misses"]
+    stats["taxa_acerto"] = (stats["hits_memoria"] + stats["hits_disco"]) / consultas if consultas else 0.0
+    return stats
+
+
+def limpar():
+    with _lock:
+        _lru.clear()
+    if PERSISTIR:
+        conn = _conectar()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
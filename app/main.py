@@ -1,14 +1,45 @@
+import startup
 import flet as ft
 import os
-import sqlite3
+import threading
+import time
 from datetime import datetime
-from ia import summarize_text, extract_tags, ocr_image, current_timestamp
-import shutil
+from ia import get_model
+import ocr
 from typing import List
 from functools import partial
-from ia import generate_embedding
-from embeddings import buscar_semanticamente
-from db import save_note,get_notes_grouped_by_day,ensure_embedding_column_exists,delete_note,update_note,get_note_by_id,get_all_notes,adicionar_coluna_embedding,init_db
+from embeddings import carregar_indice
+from search import search, separar_tags
+from scheduler import AgendadorBusca
+import jobs
+import reindexer
+import service
+import exporter
+import relacionadas
+import metricas
+import db
+from db import get_note_by_id,get_notes_page,get_notes_by_ids,init_db,count_legacy_embeddings,migrate_embeddings_to_blob,DB_PATH
+
+startup.marcar("imports")
+
+TAMANHO_PAGINA = 50
+MARGEM_ROLAGEM = 400  # px antes do fim da rolagem para buscar a próxima página
+RESUMO_PENDENTE = "⏳ Resumo em processamento..."
+STARTUP_LOG = os.path.join(os.path.dirname(DB_PATH), "startup_times.jsonl")
+
+def aquecer():
+    # Depois que a janela aparece: conversão legada, índice FAISS, modelo e reindexador
+    if count_legacy_embeddings():
+        print("🔄 Convertendo embeddings antigos para o formato binário...")
+        migrate_embeddings_to_blob()
+    carregar_indice()
+    startup.marcar("index_ready")
+    jobs.iniciar()
+    get_model()
+    startup.marcar("model_ready")
+    reindexer.iniciar()
+    print(startup.relatorio())
+    startup.registrar(STARTUP_LOG)
 
 def main(page: ft.Page):
     page.title = "🧠 Memoro – Memória Artificial Pessoal"
@@ -74,13 +105,16 @@ def main(page: ft.Page):
                 return
                 
             try:
-                novo_resumo = summarize_text(novo_conteudo)
-                update_note(note_id, novo_conteudo, novo_resumo, novas_tags)
+                # Salva na hora; novo resumo e embeddings chegam pela fila de jobs
+                service.atualizar_nota(note_id, novo_conteudo, novas_tags)
                 dlg.open = False
                 page.update()
                 show_note_details(note_id)
-                atualizar_lista()
-                show_dialog("Sucesso", "Anotação atualizada com sucesso!")
+                atualizar_na_tela(note_id)
+                if novo_conteudo != (content or "").strip():
+                    show_dialog("Sucesso", "Anotação atualizada! O resumo será refeito em segundo plano.")
+                else:
+                    show_dialog("Sucesso", "Tags atualizadas!")
             except Exception as err:
                 show_dialog("Erro", f"Não foi possível atualizar: {str(err)}")
 
@@ -123,10 +157,10 @@ def main(page: ft.Page):
         
         def deletar(e):
             try:
-                delete_note(note_id)
+                service.excluir_nota(note_id)
                 dlg.open = False
                 page.update()
-                atualizar_lista()
+                remover_da_tela(note_id)
                 selected_note_container.content = ft.Container(
                     content=ft.Column([
                         ft.Icon(ft.Icons.CHECK_CIRCLE, color="green", size=50),
@@ -193,19 +227,30 @@ def main(page: ft.Page):
             return
 
         content, summary, tags, timestamp = note
-        filename = f"memoro_{note_id}_{timestamp[:10]}.txt"
+        filename = f"memoro_{note_id}_{timestamp[:10]}.md"
         export_dir = "export"
         os.makedirs(export_dir, exist_ok=True)
         path = os.path.join(export_dir, filename)
 
         with open(path, "w", encoding="utf-8") as f:
-            f.write(f"🗂 Anotação de {timestamp}\n\n")
-            f.write(f"🧠 Resumo:\n{summary}\n\n")
-            f.write(f"📄 Conteúdo:\n{content}\n\n")
-            f.write(f"🏷 Tags: {tags}\n")
+            f.write(exporter.nota_markdown(note_id, content, summary, tags, timestamp))
 
         show_dialog("Exportado", f"Arquivo salvo em:\n{path}")
 
+    def exportar_tudo(e=None):
+        # Acervo inteiro num .zip (um .md por nota + notas.jsonl), fora do loop de eventos
+        path = os.path.join("export", f"memoro_{datetime.now():%Y-%m-%d_%H%M%S}.zip")
+
+        def trabalhar():
+            try:
+                resultado = exporter.exportar(path)
+            except Exception as err:
+                show_dialog("Erro", f"Falha ao exportar: {err}")
+                return
+            show_dialog("Exportado", f"{resultado['notas']} anotações salvas em:\n{path}")
+
+        threading.Thread(target=trabalhar, name="memoro-export", daemon=True).start()
+
     # ==== ABA 1 ====
     text_field = ft.TextField(
         label="Digite sua anotação",
@@ -217,6 +262,45 @@ def main(page: ft.Page):
     )
     summary_label = ft.Text(value="", selectable=True, style="bodyMedium")
     tags_label = ft.Text(value="", selectable=True, style="bodySmall")
+    fila_label = ft.Text(value="", size=11, color=ft.Colors.BLUE_GREY_400)
+    ultima_nota = {"id": None}
+    nota_aberta = {"id": None}  # detalhes mostrados na aba de busca
+
+    def atualizar_fila_label():
+        pendentes = jobs.pendentes()
+        estado = "⏸ pausada" if jobs.pausado() else "▶️ ativa"
+        fila_label.value = f"Fila de IA {estado} · {pendentes} tarefa(s) pendente(s)"
+        pausar_button.text = "▶️ Retomar IA" if jobs.pausado() else "⏸ Pausar IA"
+
+    def alternar_fila(e):
+        if jobs.pausado():
+            jobs.retomar()
+        else:
+            jobs.pausar()
+        atualizar_fila_label()
+        page.update()
+
+    pausar_button = ft.TextButton("⏸ Pausar IA", on_click=alternar_fila)
+
+    def ao_concluir_job(note_id, kind, status):
+        # Chamado na thread do worker da fila
+        if db.usuario_atual() is not None:
+            return  # job de um usuário da API (ver db.usuario), não desta janela
+        if kind in ('enrich', 'summary'):
+            if note_id == ultima_nota["id"]:
+                note = get_note_by_id(note_id)
+                if note and status == 'done':
+                    summary_label.value = f"🧠 Resumo:\n{note[1]}"
+                    tags_label.value = f"🏷 Tags: {note[2]}"
+                elif status == 'failed':
+                    summary_label.value = "❌ Não foi possível gerar o resumo (a nota está salva)."
+            atualizar_na_tela(note_id)
+        elif kind == 'related' and status == 'done' and note_id == nota_aberta["id"]:
+            show_note_details(note_id)
+        atualizar_fila_label()
+        page.update()
+
+    jobs.registrar_ouvinte(ao_concluir_job)
 
     def handle_submit(e):
         content = text_field.value.strip()
@@ -224,47 +308,49 @@ def main(page: ft.Page):
             show_dialog("Erro", "Digite algo para salvar.")
             return
         try:
-            summary = summarize_text(content)
-            tags = extract_tags(content)
-
-            embedding = generate_embedding(content)
-            save_note(content, summary, tags, embedding)
-
-            summary_label.value = f"🧠 Resumo:\n{summary}"
-            tags_label.value = f"🏷 Tags: {', '.join(tags)}"
+            # A nota é gravada já; resumo, tags e embedding vêm da fila de jobs
+            ultima_nota["id"] = service.criar_nota(content)["id"]
+            summary_label.value = f"🧠 Resumo:\n{RESUMO_PENDENTE}"
+            tags_label.value = ""
             upload_result.value = "✅ Anotação salva com sucesso!"
             text_field.value = ""
+            inserir_na_tela(ultima_nota["id"])
         except Exception as err:
-            upload_result.value = f"❌ Erro ao processar IA: {err}"
+            upload_result.value = f"❌ Erro ao salvar: {err}"
 
+        atualizar_fila_label()
+        page.update()
+
+    def extrair_em_segundo_plano(caminhos):
+        # Roda numa thread; o Tesseract trabalha no pool de processos de ocr.py.
+        # Cada página aparece no campo de texto assim que fica pronta.
+        text_field.value = ""
+        try:
+            for caminho, pagina, total, texto in ocr.extrair_paginas(caminhos):
+                if texto:
+                    text_field.value = f"{text_field.value}\n\n{texto}".strip()
+                upload_result.value = f"📸 {os.path.basename(caminho)}: página {pagina + 1}/{total}"
+                page.update()
+            upload_result.value = f"📸 Texto extraído de {len(caminhos)} arquivo(s)."
+        except Exception as err:
+            upload_result.value = f"❌ Erro ao processar a imagem: {err}"
         page.update()
 
     def handle_upload(e):
         if not file_picker.result or not file_picker.result.files:
             return
 
-        file = file_picker.result.files[0]
-        original_path = file.path
-
-        if not original_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp')):
-            upload_result.value = "❌ Formato de imagem não suportado."
+        caminhos = [file.path for file in file_picker.result.files]
+        invalidos = [c for c in caminhos if not c.lower().endswith(ocr.EXTENSOES)]
+        if invalidos:
+            upload_result.value = f"❌ Formato não suportado: {', '.join(os.path.basename(c) for c in invalidos)}"
             page.update()
             return
 
-        temp_path = f"temp_{file.name}"
-        shutil.copy(original_path, temp_path)
-
-        try:
-            extracted_text = ocr_image(temp_path)
-            text_field.value = extracted_text
-            upload_result.value = "📸 Texto extraído com sucesso da imagem."
-        except Exception as err:
-            upload_result.value = f"❌ Erro ao processar a imagem: {err}"
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-
+        upload_result.value = "📸 Lendo imagem..."
         page.update()
+        threading.Thread(target=extrair_em_segundo_plano, args=(caminhos,),
+                         name="memoro-ocr", daemon=True).start()
 
     file_picker = ft.FilePicker(on_result=handle_upload)
     page.overlay.append(file_picker)
@@ -277,9 +363,10 @@ def main(page: ft.Page):
                 text_field,
                 ft.Row([
                     ft.ElevatedButton("💾 Salvar", on_click=handle_submit),
-                    ft.ElevatedButton("📷 OCR de Imagem", on_click=lambda e: file_picker.pick_files(allow_multiple=False)),
+                    ft.ElevatedButton("📷 OCR de Imagem", on_click=lambda e: file_picker.pick_files(allow_multiple=True)),
                 ]),
                 upload_result,
+                ft.Row([fila_label, pausar_button]),
                 summary_label,
                 tags_label,
             ],
@@ -289,30 +376,62 @@ def main(page: ft.Page):
         padding=20,
         expand=True
     )
-    from db import get_notes_grouped_by_day  # certifique-se de importar isso no topo se ainda não tiver
 
-    timeline_column = ft.Column(scroll="auto", spacing=20)
+    # Timeline e lista carregam TAMANHO_PAGINA notas por vez (keyset por
+    # timestamp/id) e buscam a próxima página ao chegar perto do fim da rolagem.
+    # Salvar/editar/excluir mexe só no card afetado (ver inserir/atualizar/remover_da_tela).
+    timeline = {"cursor": None, "fim": False, "carregando": False, "cards": {}, "dias": {}}
+    timeline_lock = threading.Lock()
+
+    def card_timeline(note_id, summary, tags, timestamp):
+        return ft.Card(
+            content=ft.ListTile(
+                title=ft.Text(summary or RESUMO_PENDENTE),
+                subtitle=ft.Text(f"🏷 {tags}"),
+                trailing=ft.Text(timestamp[11:16]),
+                on_click=lambda e, nid=note_id: show_note_details(nid)
+            )
+        )
 
-    def atualizar_timeline():
-        timeline_column.controls.clear()
-        grouped_notes = get_notes_grouped_by_day()
+    def cabecalho_dia(data):
+        return ft.Text(f"📅 {data}", style="titleMedium", weight="bold")
 
-        for data, notas in grouped_notes.items():
-            timeline_column.controls.append(
-                ft.Text(f"📅 {data}", style="titleMedium", weight="bold")
-            )
+    @metricas.cronometrado('ui.refresh', tela='timeline')
+    def carregar_pagina_timeline():
+        with timeline_lock:
+            if timeline["fim"] or timeline["carregando"]:
+                return
+            timeline["carregando"] = True
+        try:
+            notas = get_notes_page(TAMANHO_PAGINA, before=timeline["cursor"])
             for note_id, summary, tags, timestamp in notas:
-                timeline_column.controls.append(
-                    ft.Card(
-                        content=ft.ListTile(
-                            title=ft.Text(summary),
-                            subtitle=ft.Text(f"🏷 {tags}"),
-                            trailing=ft.Text(timestamp[11:16]),
-                            on_click=lambda e, nid=note_id: show_note_details(nid)
-                        )
-                    )
-                )
-        page.update()
+                data = timestamp[:10]  # yyyy-mm-dd
+                if data not in timeline["dias"]:
+                    cabecalho = cabecalho_dia(data)
+                    timeline["dias"][data] = cabecalho
+                    timeline_column.controls.append(cabecalho)
+                card = card_timeline(note_id, summary, tags, timestamp)
+                timeline["cards"][note_id] = card
+                timeline_column.controls.append(card)
+            if notas:
+                timeline["cursor"] = (notas[-1][3], notas[-1][0])
+            timeline["fim"] = len(notas) < TAMANHO_PAGINA
+            page.update()
+        finally:
+            timeline["carregando"] = False
+
+    def rolagem_timeline(e: ft.OnScrollEvent):
+        if e.pixels >= e.max_scroll_extent - MARGEM_ROLAGEM:
+            carregar_pagina_timeline()
+
+    timeline_column = ft.Column(scroll="auto", spacing=20, expand=True,
+                                on_scroll=rolagem_timeline, on_scroll_interval=100)
+
+    def atualizar_timeline():
+        # Recarrega do zero (abertura do app); mudanças pontuais usam *_da_tela
+        timeline_column.controls.clear()
+        timeline.update(cursor=None, fim=False, cards={}, dias={})
+        carregar_pagina_timeline()
 
     aba_timeline = ft.Container(
         content=timeline_column,
@@ -321,36 +440,171 @@ def main(page: ft.Page):
     )
     
     # ==== ABA 2 ====
-    search_input = ft.TextField(label="🔍 Pesquisar", on_change=lambda e: atualizar_lista())
-    notas_listview = ft.ListView(expand=True, spacing=10)
+    search_input = ft.TextField(label="🔍 Pesquisar", hint_text="palavras e #tags", on_change=lambda e: agendador_busca.agendar(search_input.value))
+    lista = {"termo": "", "digitando": False, "cursor": None, "carregadas": 0, "fim": False, "carregando": False,
+             "cards": {}, "trechos": {}}
+    lista_lock = threading.Lock()
+    tempos_busca_label = ft.Text(value="", size=11, color=ft.Colors.BLUE_GREY_400)
+
+    def card_lista(note_id, summary, tags, timestamp):
+        subtitulo = ft.Text(f"🏷 {tags}")
+        trecho = lista["trechos"].get(note_id)
+        if trecho:
+            # Trecho da nota que mais se parece com a busca
+            subtitulo = ft.Column([
+                ft.Text(f"“{' '.join(trecho.split())}”", italic=True, size=12, overflow="ellipsis", max_lines=2),
+                subtitulo,
+            ], spacing=2)
+        return ft.Card(
+            content=ft.ListTile(
+                title=ft.Text(summary or RESUMO_PENDENTE, overflow="ellipsis", max_lines=2),
+                subtitle=subtitulo,
+                trailing=ft.Text(timestamp[:10], size=12, italic=True),
+                on_click=partial(show_note_details, note_id),
+            )
+        )
 
-    def atualizar_lista():
-        termo = search_input.value.strip().lower()
+    def buscar_pagina(termo, tempos=None, cancelado=None, cursor=None, offset=0, trechos=None, digitando=False):
+        # "#arte #viagem" no campo de busca filtra pelas tags (todas elas)
+        termo, tags = separar_tags(termo)
         if termo:
-            nota_ids = buscar_semanticamente(termo)
-            todas = get_all_notes()
-            notas = [n for n in todas if n[0] in nota_ids]
-        else:
-            notas = get_all_notes()
-
-        notas_listview.controls.clear()
-        for note_id, summary, tags, timestamp in notas:
-            if termo and termo not in summary.lower() and termo not in tags.lower():
-                continue
-            notas_listview.controls.append(
-                ft.Card(
-                    content=ft.ListTile(
-                        title=ft.Text(summary, overflow="ellipsis", max_lines=2),
-                        subtitle=ft.Text(f"🏷 {tags}"),
-                        trailing=ft.Text(timestamp[:10], size=12, italic=True),
-                        on_click=partial(show_note_details, note_id),
-                    )
-                )
-            )
+            return search(termo, limit=TAMANHO_PAGINA, offset=offset, tempos=tempos, cancelado=cancelado,
+                          trechos=trechos, tags=tags, prefixo=digitando)
+        inicio = time.perf_counter()
+        notas = get_notes_page(TAMANHO_PAGINA, before=cursor, tags=tags)
+        if tempos is not None:
+            tempos['fetch'] = (time.perf_counter() - inicio) * 1000
+        return notas
+
+    def adicionar_cards_lista(notas):
+        for row in notas:
+            card = card_lista(*row)
+            lista["cards"][row[0]] = card
+            notas_listview.controls.append(card)
+        lista["carregadas"] += len(notas)
+        if notas:
+            lista["cursor"] = (notas[-1][3], notas[-1][0])
+        lista["fim"] = len(notas) < TAMANHO_PAGINA
+
+    def executar_busca(termo, tempos, cancelado):
+        # Roda na thread do agendador, fora do loop de eventos do Flet
+        # Sem espaço no fim, a última palavra ainda está sendo digitada e casa como prefixo
+        trechos = {}
+        return buscar_pagina(termo.strip(), tempos=tempos, cancelado=cancelado, trechos=trechos,
+                             digitando=termo[-1:].isalnum()), trechos
+
+    @metricas.cronometrado('ui.refresh', tela='busca')
+    def publicar_busca(termo, resultado, tempos):
+        notas, trechos = resultado
+        inicio = time.perf_counter()
+        with lista_lock:
+            notas_listview.controls.clear()
+            lista.update(termo=termo.strip(), digitando=termo[-1:].isalnum(), cursor=None, carregadas=0, fim=False,
+                         cards={}, trechos=trechos)
+            adicionar_cards_lista(notas)
+        page.update()
+        tempos['render'] = (time.perf_counter() - inicio) * 1000
+        etapas = " · ".join(f"{etapa} {ms:.0f} ms" for etapa, ms in tempos.items())
+        mais = "+" if not lista["fim"] else ""
+        tempos_busca_label.value = f"{len(notas)}{mais} resultado(s) · {etapas}"
+        tempos_busca_label.update()
+
+    @metricas.cronometrado('ui.refresh', tela='lista')
+    def carregar_pagina_lista():
+        with lista_lock:
+            if lista["fim"] or lista["carregando"]:
+                return
+            lista["carregando"] = True
+            termo, cursor, offset = lista["termo"], lista["cursor"], lista["carregadas"]
+            digitando = lista["digitando"]
+        try:
+            trechos = {}
+            notas = buscar_pagina(termo, cursor=cursor, offset=offset, trechos=trechos, digitando=digitando)
+            with lista_lock:
+                if termo != lista["termo"]:
+                    return  # uma busca nova chegou enquanto esta página carregava
+                lista["trechos"].update(trechos)
+                notas = [row for row in notas if row[0] not in lista["cards"]]
+                adicionar_cards_lista(notas)
+            page.update()
+        finally:
+            lista["carregando"] = False
+
+    def rolagem_lista(e: ft.OnScrollEvent):
+        if e.pixels >= e.max_scroll_extent - MARGEM_ROLAGEM:
+            carregar_pagina_lista()
+
+    notas_listview = ft.ListView(expand=True, spacing=10, on_scroll=rolagem_lista, on_scroll_interval=100)
+
+    agendador_busca = AgendadorBusca(executar_busca, publicar_busca)
+
+    def atualizar_lista():
+        agendador_busca.agendar(search_input.value or "", imediato=True)
+
+    @metricas.cronometrado('ui.refresh', tela='inserir')
+    def inserir_na_tela(note_id):
+        # Nota nova é sempre a mais recente: entra no topo da timeline e, sem
+        # busca ativa, no topo da lista
+        rows = get_notes_by_ids([note_id])
+        if not rows:
+            return
+        row = rows[0]
+        data = row[3][:10]
+        with timeline_lock:
+            card = card_timeline(*row)
+            timeline["cards"][note_id] = card
+            cabecalho = timeline["dias"].get(data)
+            if cabecalho is not None and cabecalho in timeline_column.controls:
+                timeline_column.controls.insert(timeline_column.controls.index(cabecalho) + 1, card)
+            else:
+                cabecalho = cabecalho_dia(data)
+                timeline["dias"][data] = cabecalho
+                timeline_column.controls[0:0] = [cabecalho, card]
+        with lista_lock:
+            if not lista["termo"]:
+                card = card_lista(*row)
+                lista["cards"][note_id] = card
+                notas_listview.controls.insert(0, card)
+                lista["carregadas"] += 1
+        page.update()
+
+    @metricas.cronometrado('ui.refresh', tela='atualizar')
+    def atualizar_na_tela(note_id):
+        rows = get_notes_by_ids([note_id])
+        if not rows:
+            remover_da_tela(note_id)
+            return
+        row = rows[0]
+        for estado, controles, construir in ((timeline, timeline_column.controls, card_timeline),
+                                             (lista, notas_listview.controls, card_lista)):
+            antigo = estado["cards"].get(note_id)
+            if antigo is not None and antigo in controles:
+                novo = construir(*row)
+                controles[controles.index(antigo)] = novo
+                estado["cards"][note_id] = novo
+        page.update()
+
+    @metricas.cronometrado('ui.refresh', tela='remover')
+    def remover_da_tela(note_id):
+        card = timeline["cards"].pop(note_id, None)
+        if card is not None and card in timeline_column.controls:
+            i = timeline_column.controls.index(card)
+            timeline_column.controls.pop(i)
+            # Dia que ficou sem notas perde o cabeçalho
+            anterior = timeline_column.controls[i - 1] if i > 0 else None
+            seguinte = timeline_column.controls[i] if i < len(timeline_column.controls) else None
+            if anterior in timeline["dias"].values() and (seguinte is None or seguinte in timeline["dias"].values()):
+                timeline_column.controls.remove(anterior)
+                timeline["dias"] = {d: c for d, c in timeline["dias"].items() if c is not anterior}
+        card = lista["cards"].pop(note_id, None)
+        if card is not None and card in notas_listview.controls:
+            notas_listview.controls.remove(card)
+            lista["carregadas"] -= 1
         page.update()
 
     selected_note_container = ft.Container(padding=10)
 
+    @metricas.cronometrado('ui.refresh', tela='detalhes')
     def show_note_details(note_id: int, e=None):
         note = get_note_by_id(note_id)
         if not note:
@@ -359,6 +613,27 @@ def main(page: ft.Page):
             return
 
         content, summary, tags, timestamp = note
+        nota_aberta["id"] = note_id
+
+        # Vizinhas já guardadas no grafo kNN: uma leitura no banco, sem modelo
+        try:
+            vizinhas = relacionadas.relacionadas(note_id)
+        except Exception as erro:
+            print(f"⚠️ Notas relacionadas indisponíveis: {erro}")
+            vizinhas = []
+        if vizinhas is None:
+            # Lista na fila de jobs: ao_concluir_job reabre a nota quando ficar pronta
+            lista_relacionadas = ft.Text("⏳ Calculando...", italic=True, color=ft.Colors.BLUE_GREY_700)
+        elif vizinhas:
+            lista_relacionadas = ft.Column([
+                ft.TextButton(
+                    f"{ts[:10]} · {(resumo or RESUMO_PENDENTE)[:80]} ({score:.0%})",
+                    on_click=lambda e, vizinha=vizinha: show_note_details(vizinha),
+                )
+                for vizinha, resumo, _, ts, score in vizinhas
+            ], spacing=0)
+        else:
+            lista_relacionadas = ft.Text("Nenhuma ainda.", italic=True, color=ft.Colors.BLUE_GREY_700)
 
         selected_note_container.content = ft.Container(
             bgcolor=ft.Colors.BLUE_GREY_50,
@@ -368,7 +643,7 @@ def main(page: ft.Page):
                 ft.Text(f"🗂 Anotação de {timestamp[:10]}", style="titleMedium", weight="bold"),
                 ft.Divider(),
                 ft.Text("🧠 Resumo:", weight="bold"),
-                ft.Text(summary),
+                ft.Text(summary or RESUMO_PENDENTE),
                 ft.Divider(),
                 ft.Text("📄 Conteúdo:", weight="bold"),
                 ft.Text(content, selectable=True),
@@ -376,6 +651,9 @@ def main(page: ft.Page):
                 ft.Text("🏷 Tags:", weight="bold"),
                 ft.Text(tags, italic=True, color=ft.Colors.BLUE_GREY_700),
                 ft.Divider(),
+                ft.Text("🔗 Notas relacionadas:", weight="bold"),
+                lista_relacionadas,
+                ft.Divider(),
                 ft.Row([
                     ft.ElevatedButton(
                         " Editar ", 
@@ -402,8 +680,12 @@ def main(page: ft.Page):
 
     aba_listagem = ft.Container(
         content=ft.Column([
-            ft.Text("📚 Minhas Anotações", style="titleLarge"),
+            ft.Row([
+                ft.Text("📚 Minhas Anotações", style="titleLarge"),
+                ft.TextButton("Exportar tudo (.zip)", on_click=exportar_tudo, icon=ft.Icons.DOWNLOAD),
+            ], alignment="spaceBetween"),
             search_input,
+            tempos_busca_label,
             ft.Divider(),
             ft.Container(content=notas_listview, height=350),
             ft.Divider(),
@@ -428,12 +710,16 @@ def main(page: ft.Page):
 
 
     page.add(tabs)
+    startup.marcar("first_paint")
+    threading.Thread(target=aquecer, name="memoro-aquecimento", daemon=True).start()
+    atualizar_fila_label()
     atualizar_lista()
     atualizar_timeline()
 
 if __name__ == "__main__":
+    if os.getenv("MEMORO_METRICAS_PORTA"):
+        metricas.servir(int(os.getenv("MEMORO_METRICAS_PORTA")))
     init_db()
-    ensure_embedding_column_exists()
-    adicionar_coluna_embedding()
+    startup.marcar("init_db")
 
     ft.app(target=main)
\ No newline at end of file
@@ -0,0 +1,309 @@
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Instrumentação leve dos caminhos quentes (IA, encode, OCR, índice, SQLite,
+# tela). Cada operação medida é um span: nome + rótulos de baixa cardinalidade
+# (tipo de job, função do db.py... nunca ids ou textos). Na memória ficam só os
+# agregados por série (contagem, soma, máximo, erros, baldes de latência);
+# o detalhe de cada span vai para um arquivo JSONL quando configurado.
+# Ligado por padrão fica só o barato: um span por operação grossa (chamada à
+# IA, job, busca no índice, tela). O resto é opcional:
+#   MEMORO_METRICAS=0           desliga tudo (medir() vira um yield)
+#   MEMORO_METRICAS_SQL=1       também um span por execute do SQLite (db.py);
+#                               custa um frame e um lock por consulta
+#   MEMORO_METRICAS_JSONL=arq   uma linha JSON por span (com o span pai)
+#   MEMORO_LENTO_MS=500         spans acima disso aparecem no stderr (🐢)
+#   MEMORO_PERFIL=nome          cada span com esse nome roda sob cProfile
+#   MEMORO_METRICAS_PORTA=9464  /metrics no formato texto do Prometheus (app desktop)
+# O servidor HTTP (server.py) também expõe GET /metrics.
+ATIVO = os.getenv("MEMORO_METRICAS", "1") != "0"
+# Lido por db.get_connection ao abrir cada conexão
+SQL = ATIVO and os.getenv("MEMORO_METRICAS_SQL") == "1"
+# None: nada de 🐢 no console
+LIMITE_LENTO_MS = float(os.getenv("MEMORO_LENTO_MS")) if os.getenv("MEMORO_LENTO_MS") else None
+# Com o aviso ligado, operações que normalmente já passam do limite geral têm o seu
+LIMITES_LENTO_MS = {
+    'llm': 15_000,
+    'ocr': 10_000,
+    'index.build': 60_000,
+    'index.load': 5_000,
+    'job': 20_000,
+    'sqlite': 100,
+    'ui.refresh': 200,
+}
+PERFIL = os.getenv("MEMORO_PERFIL")
+PASTA_PERFIS = os.path.join(os.path.dirname(__file__), '..', 'perfis')
+BALDES_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10_000, 30_000)
+
+_lock = threading.Lock()
+_series = {}  # (nome, rótulos) -> [contagem, soma_ms, max_ms, erros, *baldes]
+_contadores = {}  # (nome, rótulos) -> valor
+_pai = ContextVar("memoro_span", default=None)
+_jsonl = None
+_perfil_lock = threading.Lock()
+
+
+def _chave(nome, rotulos):
+    if len(rotulos) < 2:  # o caso comum, sem ordenar
+        return nome, tuple((k, str(v)) for k, v in rotulos.items())
+    return nome, tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+
+def registrar(nome: str, ms: float, rotulos=None, erro: str = None, pai: str = None):
+    # Um span já medido (ex.: etapas da busca, que já cronometram por conta própria)
+    if not ATIVO:
+        return
+    rotulos = rotulos or {}
+    chave = _chave(nome, rotulos)
+    with _lock:
+        serie = _series.get(chave)
+        if serie is None:
+            serie = _series[chave] = [0, 0.0, 0.0, 0] + [0] * len(BALDES_MS)
+        serie[0] += 1
+        serie[1] += ms
+        serie[2] = max(serie[2], ms)
+        if erro is not None:
+            serie[3] += 1
+        balde = bisect.bisect_left(BALDES_MS, ms)
+        if balde < len(BALDES_MS):
+            serie[4 + balde] += 1
+        if _jsonl is not None:
+            _jsonl.write(json.dumps({
+                "ts": datetime.now().isoformat(), "span": nome, "ms": round(ms, 3), "parent": pai,
+                "labels": dict(chave[1]), "error": erro, "thread": threading.current_thread().name,
+            }, ensure_ascii=False) + "\n")
+    if LIMITE_LENTO_MS is not None and ms >= LIMITES_LENTO_MS.get(nome, LIMITE_LENTO_MS):
+        detalhes = ", ".join(f"{k}={v}" for k, v in chave[1])
+        print(f"🐢 {nome} levou {ms:.0f} ms" + (f" ({detalhes})" if detalhes else "")
+              + (f" dentro de {pai}" if pai else ""), file=sys.stderr)
+
+
+def contar(nome: str, valor: float = 1, **rotulos):
+    if not ATIVO:
+        return
+    chave = _chave(nome, rotulos)
+    with _lock:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+@contextmanager
+def medir(nome: str, **rotulos):
+    # with metricas.medir('index.search', tipo='hnsw'): ...
+    if not ATIVO:
+        yield
+        return
+    pai = _pai.get()
+    token = _pai.set(nome)
+    perfil = _iniciar_perfil(nome)
+    erro = None
+    inicio = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        erro = type(e).__name__
+        raise
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        _pai.reset(token)
+        if perfil is not None:
+            _salvar_perfil(perfil, nome)
+        registrar(nome, ms, rotulos, erro, pai)
+
+
+def cronometrado(nome: str, **rotulos):
+    # Decorador: cada chamada da função é um span
+    def decorador(fn):
+        @wraps(fn)
+        def medida(*args, **kwargs):
+            with medir(nome, **rotulos):
+                return fn(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def gravar_jsonl(caminho):
+    # Passa a escrever cada span em caminho (None para parar)
+    global _jsonl
+    with _lock:
+        if _jsonl is not None:
+            _jsonl.close()
+            _jsonl = None
+        if caminho:
+            os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+            _jsonl = open(caminho, "a", encoding="utf-8", buffering=1)
+
+
+# ---- cProfile ----
+
+def _iniciar_perfil(nome):
+    # Um perfil por vez (o cProfile é um só por processo)
+    if PERFIL != nome or not _perfil_lock.acquire(blocking=False):
+        return None
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:  # outro profiler ativo (ex.: --profile da CLI)
+        _perfil_lock.release()
+        return None
+    return perfil
+
+
+def _salvar_perfil(perfil, nome):
+    try:
+        perfil.disable()
+        os.makedirs(PASTA_PERFIS, exist_ok=True)
+        caminho = os.path.join(PASTA_PERFIS, f"{nome}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+        perfil.dump_stats(caminho)
+        print(f"🔬 Perfil de {nome} salvo em {caminho}")
+    finally:
+        _perfil_lock.release()
+
+
+@contextmanager
+def perfilar(caminho: str, linhas: int = 25):
+    # Tudo dentro do bloco sob cProfile: estatísticas em caminho (.prof, para
+    # snakeviz/pstats) e as funções mais caras (tempo acumulado) no stderr
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        perfil.dump_stats(caminho)
+        saida = io.StringIO()
+        pstats.Stats(perfil, stream=saida).sort_stats("cumulative").print_stats(linhas)
+        print(saida.getvalue(), file=sys.stderr)
+        print(f"🔬 Perfil salvo em {caminho}", file=sys.stderr)
+
+
+# ---- exportação ----
+
+def instantaneo():
+    # {"spans": [...], "counters": [...]} com os agregados desde o início do processo
+    with _lock:
+        series = [(chave, list(serie)) for chave, serie in _series.items()]
+        contadores = list(_contadores.items())
+    return {
+        "spans": [
+            {"span": nome, "labels": dict(rotulos), "count": serie[0], "total_ms": round(serie[1], 3),
+             "avg_ms": round(serie[1] / serie[0], 3), "max_ms": round(serie[2], 3), "errors": serie[3]}
+            for (nome, rotulos), serie in sorted(series)
+        ],
+        "counters": [
+            {"counter": nome, "labels": dict(rotulos), "value": valor}
+            for (nome, rotulos), valor in sorted(contadores)
+        ],
+    }
+
+
+def _nome_prometheus(nome):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", nome)
+
+
+def _valor_prometheus(valor):
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos_prometheus(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{_nome_prometheus(k)}="{_valor_prometheus(v)}"' for k, v in pares) + "}"
+
+
+def texto_prometheus() -> str:
+    # Formato de exposição em texto do Prometheus (histograma por span + contadores)
+    with _lock:
+        series = sorted((chave, list(serie)) for chave, serie in _series.items())
+        contadores = sorted(_contadores.items())
+    linhas = [
+        "# HELP memoro_span_seconds Duração das operações instrumentadas.",
+        "# TYPE memoro_span_seconds histogram",
+    ]
+    for (nome, rotulos), serie in series:
+        base = (("span", nome),) + rotulos
+        acumulado = 0
+        for limite, quantos in zip(BALDES_MS, serie[4:]):
+            acumulado += quantos
+            linhas.append(f"memoro_span_seconds_bucket{_rotulos_prometheus(base + (('le', str(limite / 1000)),))} "
+                          f"{acumulado}")
+        linhas.append(f"memoro_span_seconds_bucket{_rotulos_prometheus(base + (('le', '+Inf'),))} {serie[0]}")
+        linhas.append(f"memoro_span_seconds_sum{_rotulos_prometheus(base)} {serie[1] / 1000:.6f}")
+        linhas.append(f"memoro_span_seconds_count{_rotulos_prometheus(base)} {serie[0]}")
+    linhas += ["# HELP memoro_span_max_seconds Maior duração observada.", "# TYPE memoro_span_max_seconds gauge"]
+    for (nome, rotulos), serie in series:
+        linhas.append(f"memoro_span_max_seconds{_rotulos_prometheus((('span', nome),) + rotulos)} "
+                      f"{serie[2] / 1000:.6f}")
+    linhas += ["# HELP memoro_span_errors_total Spans que terminaram em exceção.",
+               "# TYPE memoro_span_errors_total counter"]
+    for (nome, rotulos), serie in series:
+        linhas.append(f"memoro_span_errors_total{_rotulos_prometheus((('span', nome),) + rotulos)} {serie[3]}")
+    vistos = set()
+    for (nome, rotulos), valor in contadores:
+        metrica = f"memoro_{_nome_prometheus(nome)}_total"
+        if metrica not in vistos:
+            vistos.add(metrica)
+            linhas.append(f"# TYPE {metrica} counter")
+        linhas.append(f"{metrica}{_rotulos_prometheus(rotulos)} {valor}")
+    return "\n".join(linhas) + "\n"
+
+
+def resumo() -> str:
+    # Tabela para o console: spans por tempo total
+    dados = instantaneo()
+    linhas = [f"{'span':<22} {'rótulos':<34} {'n':>7} {'total ms':>10} {'média':>8} {'máx':>8} {'erros':>5}"]
+    for s in sorted(dados["spans"], key=lambda s: -s["total_ms"]):
+        rotulos = ",".join(f"{k}={v}" for k, v in s["labels"].items())[:34]
+        linhas.append(f"{s['span']:<22} {rotulos:<34} {s['count']:>7} {s['total_ms']:>10.1f} "
+                      f"{s['avg_ms']:>8.2f} {s['max_ms']:>8.1f} {s['errors']:>5}")
+    for c in dados["counters"]:
+        rotulos = ",".join(f"{k}={v}" for k, v in c["labels"].items())
+        linhas.append(f"{c['counter']:<22} {rotulos:<34} {c['value']:>7g}")
+    return "\n".join(linhas)
+
+
+def limpar():
+    with _lock:
+        _series.clear()
+        _contadores.clear()
+
+
+class _HandlerMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        dados = texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def servir(porta: int, host: str = "127.0.0.1"):
+    # /metrics numa thread própria (para o app desktop, que não tem o server.py)
+    servidor = ThreadingHTTPServer((host, porta), _HandlerMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="memoro-metricas", daemon=True).start()
+    print(f"📈 Métricas em http://{host}:{porta}/metrics")
+    return servidor
+
+
+gravar_jsonl(os.getenv("MEMORO_METRICAS_JSONL"))
@@ -1,7 +1,217 @@
-from PIL import Image
-import pytesseract
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-def extract_text_from_image(image_path):
-    image = Image.open(image_path)
-    text = pytesseract.image_to_string(image)
-    return text.strip()
\ No newline at end of file
+import embedding_cache
+import metricas
+
+# OCR fora da thread da UI: cada página vira uma tarefa num pool de processos
+# (o Tesseract é CPU-bound e o GIL não ajuda). Os arquivos são lidos no lugar,
+# sem cópia; antes do reconhecimento a imagem é reduzida e binarizada.
+# O texto de cada página fica em cache pelo sha256 do arquivo, então reenviar
+# o mesmo scan não chama o Tesseract de novo.
+TESSERACT_CMD = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
+TESSDATA_PREFIX = r"C:\\Program Files\\Tesseract-OCR\\tessdata"
+IDIOMA = 'por'
+
+EXTENSOES_IMAGEM = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.tif', '.webp')
+EXTENSOES = EXTENSOES_IMAGEM + ('.pdf',)  # PDF precisa do pacote opcional pypdfium2
+
+LADO_MAXIMO = 2500  # px; fotos de celular maiores que isso só deixam o OCR lento
+DPI_PDF = 200
+BINARIZAR = True
+USAR_CACHE = True
+WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Mudou o pré-processamento? Incremente para não reaproveitar texto antigo do cache
+VERSAO = 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _comando_tesseract():
+    if os.path.exists(TESSERACT_CMD):
+        return TESSERACT_CMD, TESSDATA_PREFIX
+    return shutil.which("tesseract") or "tesseract", None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=WORKERS)
+    return _pool
+
+
+def encerrar():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# ---- cache (mesmo arquivo do cache de embeddings) ----
+
+def hash_arquivo(caminho: str) -> str:
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+_tabelas_criadas = set()  # caminhos de cache (um por usuário) já preparados
+
+
+def _conectar_cache():
+    caminho = embedding_cache.caminho_cache()
+    conn = embedding_cache.conexao()
+    if caminho not in _tabelas_criadas:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                hash TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                created_at TEXT,
+                PRIMARY KEY (hash, page)
+            )
+        ''')
+        _tabelas_criadas.add(caminho)
+    return conn
+
+
+def _chave(hash_: str) -> str:
+    return f"{hash_}:v{VERSAO}:{IDIOMA}"
+
+
+def _ler_cache(hash_: str):
+    conn = _conectar_cache()
+    rows = conn.execute("SELECT page, text FROM ocr_cache WHERE hash = ?", (_chave(hash_),)).fetchall()
+    return dict(rows)
+
+
+def _gravar_cache(hash_: str, pagina: int, texto: str):
+    conn = _conectar_cache()
+    conn.execute("INSERT OR REPLACE INTO ocr_cache (hash, page, text, created_at) VALUES (?, ?, ?, ?)",
+                 (_chave(hash_), pagina, texto, datetime.now().isoformat()))
+    conn.commit()
+
+
+# ---- páginas e pré-processamento (rodam nos processos do pool) ----
+
+def contar_paginas(caminho: str) -> int:
+    if caminho.lower().endswith('.pdf'):
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(caminho)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    from PIL import Image
+    with Image.open(caminho) as imagem:
+        return getattr(imagem, 'n_frames', 1)
+
+
+def carregar_pagina(caminho: str, pagina: int):
+    if caminho.lower().endswith('.pdf'):
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(caminho)
+        try:
+            return pdf[pagina].render(scale=DPI_PDF / 72).to_pil()
+        finally:
+            pdf.close()
+    from PIL import Image
+    with Image.open(caminho) as imagem:
+        imagem.seek(pagina)  # TIFF multipágina; demais formatos só têm a 0
+        imagem.load()
+        return imagem.copy()
+
+
+def preprocessar(imagem):
+    from PIL import Image, ImageOps
+    imagem = ImageOps.exif_transpose(imagem).convert('L')
+    maior = max(imagem.size)
+    if maior > LADO_MAXIMO:
+        escala = LADO_MAXIMO / maior
+        imagem = imagem.resize((round(imagem.width * escala), round(imagem.height * escala)), Image.LANCZOS)
+    if BINARIZAR:
+        imagem = ImageOps.autocontrast(imagem)
+        limiar = _limiar_otsu(imagem.histogram())
+        imagem = imagem.point(lambda p: 255 if p > limiar else 0, mode='1')
+    return imagem
+
+
+def _limiar_otsu(histograma):
+    total = sum(histograma)
+    soma_total = sum(i * n for i, n in enumerate(histograma))
+    soma_fundo = peso_fundo = 0
+    melhor, limiar = -1.0, 127
+    for i, n in enumerate(histograma):
+        peso_fundo += n
+        if peso_fundo == 0:
+            continue
+        peso_frente = total - peso_fundo
+        if peso_frente == 0:
+            break
+        soma_fundo += i * n
+        media_fundo = soma_fundo / peso_fundo
+        media_frente = (soma_total - soma_fundo) / peso_frente
+        variancia = peso_fundo * peso_frente * (media_fundo - media_frente) ** 2
+        if variancia > melhor:
+            melhor, limiar = variancia, i
+    return limiar
+
+
+def reconhecer_pagina(caminho: str, pagina: int, comando: str, tessdata, idioma: str = IDIOMA) -> str:
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = comando
+    if tessdata:
+        os.environ["TESSDATA_PREFIX"] = tessdata
+    imagem = preprocessar(carregar_pagina(caminho, pagina))
+    return pytesseract.image_to_string(imagem, lang=idioma).strip()
+
+
+# ---- API usada pelo app ----
+
+def extrair_paginas(caminhos):
+    # Gera (caminho, pagina, total_paginas, texto) na ordem dos arquivos e das
+    # páginas, assim que cada uma fica pronta. Páginas em cache saem na hora;
+    # as demais são distribuídas entre os processos do pool de uma vez.
+    if isinstance(caminhos, str):
+        caminhos = [caminhos]
+    comando, tessdata = _comando_tesseract()
+    planos = []
+    for caminho in caminhos:
+        hash_ = hash_arquivo(caminho)
+        total = contar_paginas(caminho)
+        cache = _ler_cache(hash_) if USAR_CACHE else {}
+        tarefas = {
+            pagina: _get_pool().submit(reconhecer_pagina, caminho, pagina, comando, tessdata)
+            for pagina in range(total) if pagina not in cache
+        }
+        planos.append((caminho, hash_, total, cache, tarefas))
+
+    enviado = time.perf_counter()
+    for caminho, hash_, total, cache, tarefas in planos:
+        for pagina in range(total):
+            if pagina in cache:
+                texto = cache[pagina]
+                metricas.contar('ocr_paginas', origem='cache')
+            else:
+                texto = tarefas[pagina].result()
+                # O Tesseract roda em outro processo: o span é a espera da página desde o envio ao pool
+                metricas.registrar('ocr', (time.perf_counter() - enviado) * 1000, {"etapa": "pagina"})
+                metricas.contar('ocr_paginas', origem='tesseract')
+                _gravar_cache(hash_, pagina, texto)
+            yield caminho, pagina, total, texto
+
+
+@metricas.cronometrado('ocr', etapa='arquivo')
+def extrair_texto(caminho: str) -> str:
+    return "\n\n".join(texto for _, _, _, texto in extrair_paginas(caminho) if texto).strip()
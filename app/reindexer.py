@@ -0,0 +1,121 @@
+import threading
+import time
+
+import db
+import ia
+import jobs
+
+# Refaz os embeddings de notas desatualizadas (texto editado, sem vetor, ou
+# vetores de outro modelo) em lotes: todos os trechos de um lote num único
+# model.encode e uma transação por lote. O índice FAISS é atualizado no lugar
+# pelo observador de db.py, então a busca segue funcionando durante o processo.
+TAMANHO_LOTE = 64
+INTERVALO_OCIOSO = 30  # segundos entre verificações quando não há nada a fazer
+
+_cond = threading.Condition()
+_thread = None
+_parar = False
+# Bancos de usuários (db.usuario) a verificar; o padrão (None) é sempre verificado
+_usuarios = set()
+
+
+def reindexar_lote(tamanho: int = TAMANHO_LOTE, after_id: int = 0):
+    # Devolve (ultimo_id, notas, trechos); ultimo_id None quando não há mais nada
+    rows = db.get_stale_notes(ia.MODEL_EMBEDDING, tamanho, after_id)
+    if not rows:
+        return None, 0, 0
+    conteudos = [content or '' for _, content, _ in rows]
+    resultados = ia.generate_chunk_embeddings(conteudos, batch_size=tamanho)
+    # O hash lido junto com o texto: se a nota mudar enquanto o lote codifica,
+    # ela continua desatualizada e volta na próxima passada
+    db.update_chunks_batch(
+        [(note_id, content_hash, spans, vetores)
+         for (note_id, _, content_hash), (spans, vetores) in zip(rows, resultados)],
+        model=ia.MODEL_EMBEDDING,
+    )
+    return rows[-1][0], len(rows), sum(len(spans) for spans, _ in resultados)
+
+
+def reindexar(tamanho: int = TAMANHO_LOTE, limite: int = None, progresso=None, interromper=None):
+    # Uma passada por id crescente sobre tudo que estava desatualizado.
+    # progresso(feitas, total, notas_por_s, trechos_por_s); interromper() para no próximo lote
+    total = db.count_stale_notes(ia.MODEL_EMBEDDING)
+    if limite is not None:
+        total = min(total, limite)
+    feitas = trechos = 0
+    ultimo = 0
+    inicio = time.perf_counter()
+    while feitas < total:
+        if interromper and interromper():
+            break
+        ultimo, notas, n_trechos = reindexar_lote(min(tamanho, total - feitas), ultimo)
+        if ultimo is None:
+            break
+        feitas += notas
+        trechos += n_trechos
+        if progresso:
+            decorrido = time.perf_counter() - inicio
+            progresso(feitas, total, feitas / decorrido if decorrido else 0.0,
+                      trechos / decorrido if decorrido else 0.0)
+    segundos = time.perf_counter() - inicio
+    return {"notas": feitas, "trechos": trechos, "segundos": segundos,
+            "notas_por_s": feitas / segundos if segundos else 0.0}
+
+
+def _passada(usuario):
+    # True se terminou (nada mais desatualizado nesse banco)
+    with db.usuario(usuario):
+        resultado = reindexar(interromper=lambda: _parar or jobs.pausado())
+        if resultado["notas"]:
+            print(f"🔁 {resultado['notas']} notas reindexadas "
+                  f"({resultado['notas_por_s']:.1f} notas/s)")
+        return not db.count_stale_notes(ia.MODEL_EMBEDDING)
+
+
+def _loop():
+    while True:
+        with _cond:
+            if _parar:
+                return
+            usuarios = [None, *sorted(_usuarios)]
+        for usuario in usuarios:
+            if _parar or jobs.pausado():
+                break
+            try:
+                if _passada(usuario):
+                    with _cond:
+                        _usuarios.discard(usuario)
+            except Exception as e:
+                print(f"⚠️ Erro no reindexador: {e}")
+        with _cond:
+            if not _parar:
+                _cond.wait(INTERVALO_OCIOSO)
+
+
+def iniciar():
+    global _thread, _parar
+    if _thread is not None:
+        return
+    _parar = False
+    _usuarios.update(db.listar_usuarios())
+    _thread = threading.Thread(target=_loop, name="memoro-reindexador", daemon=True)
+    _thread.start()
+
+
+def notificar():
+    # Acorda o reindexador antes do próximo intervalo (ex.: depois de trocar o modelo)
+    usuario = db.usuario_atual()
+    with _cond:
+        if usuario is not None:
+            _usuarios.add(usuario)
+        _cond.notify_all()
+
+
+def parar(timeout=None):
+    global _thread, _parar
+    with _cond:
+        _parar = True
+        _cond.notify_all()
+    if _thread is not None:
+        _thread.join(timeout)
+        _thread = None
@@ -0,0 +1,129 @@
+import time
+
+import numpy as np
+
+import db
+import embeddings
+import jobs
+
+# Notas relacionadas: grafo kNN guardado em note_neighbors, lido com uma
+# consulta pela chave ao abrir uma nota (sem modelo, sem busca). Cada nota é
+# representada pela média dos seus trechos (notes.embedding) e consultada no
+# índice de trechos do FAISS; um vizinho vale pelo seu trecho mais parecido.
+#
+# Manutenção:
+#   - reconstruir() monta o grafo inteiro em lotes (CLI `related --rebuild`)
+#   - db._gravar_trechos/delete_note apagam a lista da nota alterada e as listas
+#     em que ela aparecia; a próxima leitura (relacionadas()) enfileira um job
+#     'related' para refazê-la e devolve None (calculando) até lá
+#   - com o índice carregado, o observador abaixo enfileira um job 'related'
+#     (jobs.py) por nota salva/editada: o worker refaz a lista dela e a inclui
+#     nas listas dos vizinhos em que entra, fora da thread que salvou
+K = 8  # vizinhos guardados por nota
+# Abaixo disso o vizinho não tem relação de fato com a nota (o kNN sempre acha
+# K vizinhos, mesmo numa base pequena ou de assuntos distantes)
+SIMILARIDADE_MINIMA = 0.2
+LOTE = 256  # notas consultadas no índice de uma vez
+
+
+def _vizinhos(ids, medias):
+    # {note_id: [(vizinho, similaridade)]} a partir do índice de trechos
+    resultados = embeddings.buscar_notas_por_vetores(medias, K + 1)  # +1: a própria nota volta primeiro
+    return {
+        int(note_id): [(vizinho, sim) for vizinho, sim in encontrados
+                       if vizinho != note_id and sim >= SIMILARIDADE_MINIMA][:K]
+        for note_id, encontrados in zip(ids, resultados)
+    }
+
+
+def calcular(note_ids):
+    # Nota ainda sem vetores fica com a lista vazia (calculada): os vetores
+    # novos invalidam a lista em db._gravar_trechos
+    ids, medias = db.get_note_embeddings(note_ids)
+    listas = {int(note_id): [] for note_id in note_ids}
+    if len(ids):
+        listas.update(_vizinhos(ids, medias))
+    db.replace_related(listas)
+    return listas
+
+
+def relacionadas(note_id: int, limite: int = K):
+    # [(id, summary, tags, timestamp, score)], ou None enquanto a lista não foi
+    # calculada (nota nova ou invalidada): a busca no índice fica com o worker
+    # da fila e quem chamou (UI, requisição) só lê o banco
+    linhas = db.get_related_notes(note_id, limite)
+    if linhas is None:
+        with db.transaction():
+            db.enqueue_job(note_id, 'related')
+        jobs.notificar()
+    return linhas
+
+
+def _incluir_nos_vizinhos(listas, trechos):
+    # A nota s entra na lista de cada vizinho B se for mais parecida que o último
+    # dele. A similaridade é a de B: média de B contra o melhor trecho de s.
+    # Vizinhos sem lista calculada ficam para a próxima leitura.
+    candidatos = {vizinho for vizinhos in listas.values() for vizinho, _ in vizinhos} - set(listas)
+    atuais = db.get_related_scores(candidatos)
+    if not atuais:
+        return
+    ids, medias = db.get_note_embeddings(atuais)
+    medias = dict(zip(ids.tolist(), medias))
+    alteradas = {}
+    for note_id, vizinhos in listas.items():
+        for vizinho, _ in vizinhos:
+            if vizinho not in atuais or vizinho not in medias:
+                continue
+            lista = alteradas.get(vizinho, atuais[vizinho])
+            sim = float(np.max(trechos[note_id] @ medias[vizinho]))
+            if sim < SIMILARIDADE_MINIMA or (len(lista) >= K and sim <= lista[-1][1]):
+                continue
+            lista = sorted([par for par in lista if par[0] != note_id] + [(note_id, sim)], key=lambda par: -par[1])
+            alteradas[vizinho] = lista[:K]
+    db.replace_related(alteradas)
+
+
+def atualizar(note_ids, trechos):
+    # Notas com vetores novos: trechos é {note_id: matriz (n, 384)}
+    listas = calcular(note_ids)
+    _incluir_nos_vizinhos(listas, trechos)
+
+
+def atualizar_nota(note_id: int):
+    # Job 'related': os trechos vêm do banco (a nota pode ter mudado desde o save)
+    chaves, matriz = db.get_chunk_embeddings(db.get_chunk_keys([note_id]))
+    if len(chaves):
+        atualizar([note_id], {note_id: matriz})
+    else:
+        calcular([note_id])
+
+
+def reconstruir(lote: int = LOTE, progresso=None):
+    inicio = time.perf_counter()
+    ids = db.get_embedded_note_ids()
+    for i in range(0, len(ids), lote):
+        calcular(ids[i:i + lote])
+        if progresso:
+            progresso(min(i + lote, len(ids)), len(ids))
+    return {"notas": len(ids), "segundos": time.perf_counter() - inicio}
+
+
+def _ao_alterar_nota(evento, note_id, embedding):
+    # Roda na thread que salvou (UI, requisição do servidor): só enfileira; a
+    # busca no índice fica com o worker. Sem índice na memória (CLI,
+    # importação), as listas ficam para a próxima leitura.
+    if evento == 'delete' or not embeddings.indice_carregado():
+        return
+    if evento in ('save_many', 'update_many'):
+        note_ids = [i for i, m in zip(note_id, embedding) if m is not None and len(m)]
+    else:
+        note_ids = [note_id] if embedding is not None and len(embedding) else []
+    if not note_ids:
+        return
+    with db.transaction():
+        for i in note_ids:
+            db.enqueue_job(i, 'related')
+    jobs.notificar()
+
+
+db.registrar_observador(_ao_alterar_nota)
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from search import BuscaCancelada
+
+
+class AgendadorBusca:
+    # Debounce + uma única thread de trabalho para a busca da aba de notas.
+    # executar(query, tempos, cancelado) roda fora da thread da UI;
+    # publicar(query, resultados, tempos) só é chamado para a consulta mais recente.
+
+    def __init__(self, executar, publicar, atraso=0.25):
+        self._executar = executar
+        self._publicar = publicar
+        self._atraso = atraso
+        self._cond = threading.Condition()
+        self._lock_publicacao = threading.Lock()
+        self._geracao = 0
+        self._pendente = None  # (geracao, query, instante_limite)
+        self.ultimos_tempos = {}
+        self._thread = threading.Thread(target=self._loop, name="memoro-busca", daemon=True)
+        self._thread.start()
+
+    def agendar(self, query: str, imediato: bool = False):
+        with self._cond:
+            self._geracao += 1
+            atraso = 0 if imediato else self._atraso
+            self._pendente = (self._geracao, query, time.monotonic() + atraso)
+            self._cond.notify()
+
+    def _obsoleta(self, geracao):
+        return geracao != self._geracao
+
+    def _proxima(self):
+        with self._cond:
+            while True:
+                if self._pendente is None:
+                    self._cond.wait()
+                    continue
+                geracao, query, limite = self._pendente
+                restante = limite - time.monotonic()
+                if restante > 0:
+                    # Nova tecla durante a espera substitui _pendente e reinicia o prazo
+                    self._cond.wait(restante)
+                    continue
+                self._pendente = None
+                return geracao, query
+
+    def _loop(self):
+        while True:
+            geracao, query = self._proxima()
+            tempos = {}
+            try:
+                resultados = self._executar(query, tempos, lambda: self._obsoleta(geracao))
+            except BuscaCancelada:
+                continue
+            except Exception as e:
+                print(f"⚠️ Erro na busca '{query}': {e}")
+                continue
+
+            with self._lock_publicacao:
+                if self._obsoleta(geracao):
+                    continue
+                self._publicar(query, resultados, tempos)
+                self.ultimos_tempos = tempos
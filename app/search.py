@@ -0,0 +1,119 @@
+import re
+import time
+
+import db
+import metricas
+from embeddings import buscar_trechos
+
+# Constante da reciprocal-rank fusion: score = soma de 1 / (RRF_K + posição)
+RRF_K = 60
+# Quantos candidatos pedir a cada fonte antes da fusão (no mínimo)
+CANDIDATOS = 50
+
+
+class BuscaCancelada(Exception):
+    pass
+
+
+def _marcar(tempos, etapa, inicio):
+    # Acumula em ms por etapa (embed, search, fetch, ...) e conta nas métricas
+    ms = (time.perf_counter() - inicio) * 1000
+    metricas.registrar('search', ms, {"etapa": etapa})
+    if tempos is not None:
+        tempos[etapa] = tempos.get(etapa, 0.0) + ms
+
+
+def expressao_fts(query: str, prefixo: bool = False):
+    # Cada palavra vira um termo entre aspas (sem sintaxe FTS5 do usuário);
+    # com prefixo=True a última palavra casa como prefixo (busca enquanto digita)
+    termos = re.findall(r"\w+", query, re.UNICODE)
+    if not termos:
+        return None
+    partes = [f'"{t}"' for t in termos]
+    if prefixo:
+        partes[-1] += "*"
+    return " ".join(partes)
+
+
+def separar_tags(query: str):
+    # "#viagem #arte praia" -> ("praia", ["viagem", "arte"]): os #termos viram filtro de tags
+    tags = re.findall(r"#([\w-]+)", query, re.UNICODE)
+    return re.sub(r"#[\w-]+", " ", query, flags=re.UNICODE).strip(), tags
+
+
+def buscar_palavras_chave(query: str, limit: int, tags=None, modo_tags='and', prefixo=False):
+    # prefixo=True quando a última palavra ainda está sendo digitada: só ela
+    # casa como prefixo, e só se a busca exata não trouxer o suficiente
+    expr = expressao_fts(query)
+    if not expr:
+        return []
+    ids = db.search_keyword(expr, limit, tags, modo_tags)
+    if prefixo and len(ids) < limit:
+        # Prefixos curtos expandem para muitos termos e são bem mais caros,
+        # então só completam o ranking quando a busca exata não basta
+        vistos = set(ids)
+        extras = db.search_keyword(expressao_fts(query, prefixo=True), limit, tags, modo_tags)
+        ids += [i for i in extras if i not in vistos][:limit - len(ids)]
+    return ids
+
+
+def fundir_rankings(*rankings, k=RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for posicao, note_id in enumerate(ranking, start=1):
+            scores[note_id] = scores.get(note_id, 0.0) + 1.0 / (k + posicao)
+    return sorted(scores, key=lambda nid: scores[nid], reverse=True)
+
+
+def search(query: str, limit: int = 20, offset: int = 0, tempos=None, cancelado=None, trechos=None,
+           tags=None, modo_tags='and', prefixo=False):
+    # tempos: dict opcional preenchido com a duração de cada etapa em ms;
+    # cancelado: callable verificado entre etapas (levanta BuscaCancelada);
+    # trechos: dict opcional que recebe {note_id: trecho mais parecido} para destaque;
+    # tags/modo_tags: só notas com todas ('and') ou alguma ('or') dessas tags;
+    # prefixo: a última palavra está sendo digitada (busca enquanto digita)
+    def verificar():
+        if cancelado and cancelado():
+            raise BuscaCancelada()
+
+    query = query.strip()
+    if not query:
+        inicio = time.perf_counter()
+        notas = db.get_all_notes(limit=limit, offset=offset, tags=tags, modo_tags=modo_tags)
+        _marcar(tempos, 'fetch', inicio)
+        return notas
+
+    profundidade = max(CANDIDATOS, (offset + limit) * 2)
+
+    permitidas = None
+    if tags:
+        # Pré-filtro: a busca semântica só considera os trechos dessas notas
+        inicio = time.perf_counter()
+        permitidas = db.get_note_ids_with_tags(tags, modo_tags)
+        _marcar(tempos, 'filter', inicio)
+        if permitidas is not None and not permitidas:
+            return []
+
+    try:
+        acertos = buscar_trechos(query, top_k=profundidade, tempos=tempos, notas=permitidas)
+    except Exception as e:
+        # Sem modelo/índice a busca continua funcionando só com palavras-chave
+        print(f"⚠️ Busca semântica indisponível: {e}")
+        acertos = []
+    ids_vetor = [note_id for note_id, _, _ in acertos]
+    verificar()
+
+    inicio = time.perf_counter()
+    ids_palavras = buscar_palavras_chave(query, profundidade, tags, modo_tags, prefixo)
+    ranking = fundir_rankings(ids_palavras, ids_vetor)
+    _marcar(tempos, 'search', inicio)
+    verificar()
+
+    inicio = time.perf_counter()
+    pagina = ranking[offset:offset + limit]
+    notas = db.get_notes_by_ids(pagina)
+    if trechos is not None:
+        na_pagina = set(pagina)
+        trechos.update(db.get_passages([(n, c) for n, c, _ in acertos if n in na_pagina]))
+    _marcar(tempos, 'fetch', inicio)
+    return notas
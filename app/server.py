@@ -0,0 +1,301 @@
+import hmac
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import db
+import metricas
+import relacionadas
+import service
+
+# API HTTP local (JSON) sobre service.py, num processo só: modelo e índice
+# ficam carregados entre requisições. Só biblioteca padrão; as requisições são
+# atendidas por um pool fixo de threads, então cada thread reaproveita a sua
+# conexão SQLite (db.get_connection) em vez de abrir uma por requisição.
+#
+#   POST   /notes                 {"content": "..."}
+#   GET    /notes/<id>
+#   PUT    /notes/<id>            {"content": "...", "tags": [...]}
+#   DELETE /notes/<id>
+#   GET    /notes/<id>/related?limit=8  notas vizinhas (grafo kNN guardado)
+#   GET    /search?q=...&limit=20&offset=0
+#   GET    /timeline?limit=50&before_ts=...&before_id=...
+#   GET    /tags?limit=...                contagem de notas por tag (facetas)
+#   GET    /status
+#   GET    /metrics               métricas no formato texto do Prometheus (metricas.py)
+#
+# /search, /timeline e /tags aceitam tags=a,b (ou tags repetido) e
+# tags_mode=and|or: só notas com todas/alguma dessas tags.
+#
+# Modelo de confiança:
+#   - Sem tokens (padrão), quem alcança a porta é dono de tudo: o cabeçalho
+#     X-Memoro-User: <id> escolhe o banco e o índice daquele usuário
+#     (db.usuario) sem nenhuma verificação. Por isso o servidor só aceita
+#     escutar em loopback (processos da própria máquina, do mesmo dono);
+#     outro host exige tokens ou permitir_remoto=True (`serve --allow-remote`,
+#     para quem já protege a porta de outro jeito).
+#   - Com tokens (`serve --tokens tokens.json`: {"<token>": "<id>" ou null}),
+#     toda requisição manda Authorization: Bearer <token> (401 sem ele) e o
+#     usuário é o do token (null = banco padrão). X-Memoro-User vira só uma
+#     confirmação: diferente do usuário do token dá 403.
+#   - Os caches de embeddings, IA e OCR também são por usuário (embedding_cache).
+#     /metrics só tem agregados sem ids nem textos, de todos os usuários.
+HOST = "127.0.0.1"
+HOSTS_LOCAIS = ("127.0.0.1", "localhost", "::1")
+PORTA = 8765
+THREADS = 8
+LIMITE_MAXIMO = 200
+CORPO_MAXIMO = 1 << 20  # 1 MB
+TEMPO_OCIOSO = 30  # segundos
+
+
+class ErroHttp(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class ServidorMemoro(ThreadingHTTPServer):
+    # Cada conexão tem a sua thread (a do ThreadingHTTPServer), que só lê a
+    # requisição e escreve a resposta; o trabalho roda num pool fixo de threads,
+    # então cada uma reaproveita a sua conexão SQLite. Uma conexão keep-alive
+    # ociosa não segura nenhuma thread do pool.
+    daemon_threads = True
+
+    def __init__(self, endereco, threads=THREADS, tokens=None):
+        super().__init__(endereco, Handler)
+        self.tokens = tokens  # {token: usuário} ou None (confia em X-Memoro-User)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="memoro-http")
+
+    def executar(self, fn, *args):
+        return self._pool.submit(fn, *args).result()
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _inteiro(params, nome, padrao, minimo=0, maximo=None):
+    valor = params.get(nome, [None])[0]
+    if valor is None:
+        return padrao
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ErroHttp(400, f"'{nome}' precisa ser um número inteiro")
+    if valor < minimo or (maximo is not None and valor > maximo):
+        raise ErroHttp(400, f"'{nome}' fora do intervalo permitido")
+    return valor
+
+
+def _filtro_tags(params):
+    tags = [t for valor in params.get("tags", []) for t in valor.split(",") if t.strip()]
+    modo = params.get("tags_mode", ["and"])[0]
+    return tags or None, modo
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: o teste de carga reaproveita conexões
+    # Cabeçalhos e corpo saem em dois send(): com Nagle, o segundo espera o ACK
+    # atrasado do cliente (~40 ms por requisição em keep-alive)
+    disable_nagle_algorithm = True
+    server_version = "Memoro"
+    timeout = TEMPO_OCIOSO  # conexão keep-alive parada por mais que isso é fechada
+
+    ROTAS = [
+        ("POST", re.compile(r"^/notes$"), "criar"),
+        ("GET", re.compile(r"^/notes/(\d+)$"), "obter"),
+        ("PUT", re.compile(r"^/notes/(\d+)$"), "atualizar"),
+        ("DELETE", re.compile(r"^/notes/(\d+)$"), "excluir"),
+        ("GET", re.compile(r"^/notes/(\d+)/related$"), "relacionadas"),
+        ("GET", re.compile(r"^/search$"), "buscar"),
+        ("GET", re.compile(r"^/timeline$"), "timeline"),
+        ("GET", re.compile(r"^/tags$"), "tags"),
+        ("GET", re.compile(r"^/status$"), "status"),
+        ("GET", re.compile(r"^/metrics$"), "metricas"),
+    ]
+
+    def do_GET(self):
+        self._despachar("GET")
+
+    def do_POST(self):
+        self._despachar("POST")
+
+    def do_PUT(self):
+        self._despachar("PUT")
+
+    def do_DELETE(self):
+        self._despachar("DELETE")
+
+    def log_message(self, formato, *args):
+        pass  # uma linha por requisição atrapalharia o teste de carga
+
+    def _ler_corpo(self):
+        # Sempre consome o corpo antes de responder (inclusive em 404/405): o que
+        # sobrasse no socket seria lido como a próxima requisição da conexão
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True
+            raise ErroHttp(400, "Content-Length inválido")
+        if tamanho < 0 or tamanho > CORPO_MAXIMO:
+            self.close_connection = True  # não vale ler 1 MB+ só para descartar
+            raise ErroHttp(413, "corpo grande demais")
+        return self.rfile.read(tamanho) if tamanho else b""
+
+    def _despachar(self, metodo):
+        url = urlparse(self.path)
+        try:
+            self._corpo = self._ler_corpo()
+            rotas = [(verbo, nome, casamento) for verbo, padrao, nome in self.ROTAS
+                     for casamento in [padrao.match(url.path)] if casamento]
+            if not rotas:
+                raise ErroHttp(404, "rota não encontrada")
+            escolhida = next(((nome, casamento) for verbo, nome, casamento in rotas if verbo == metodo), None)
+            if escolhida is None:
+                raise ErroHttp(405, "método não permitido")
+            nome, casamento = escolhida
+            usuario = self._usuario()
+            status, corpo = self.server.executar(self._executar, usuario, nome, parse_qs(url.query),
+                                                 casamento.groups())
+        except ErroHttp as e:
+            status, corpo = e.status, {"error": str(e)}
+        except service.NotaNaoEncontrada as e:
+            status, corpo = 404, {"error": f"nota {e} não encontrada"}
+        except ValueError as e:
+            status, corpo = 400, {"error": str(e)}
+        except Exception as e:
+            print(f"⚠️ Erro em {metodo} {self.path}: {e}")
+            status, corpo = 500, {"error": "erro interno"}
+        self._responder(status, corpo)
+
+    def _usuario(self):
+        # De quem é a requisição (None = banco padrão); ver o modelo de confiança no topo
+        pedido = self.headers.get("X-Memoro-User") or None
+        tokens = self.server.tokens
+        if tokens is None:
+            return pedido
+        autorizacao = self.headers.get("Authorization") or ""
+        enviado = autorizacao[len("Bearer "):].encode("utf-8") if autorizacao.startswith("Bearer ") else b""
+        # compare_digest em todos: o tempo não diz quanto de um token acertou
+        donos = [usuario for token, usuario in tokens.items() if hmac.compare_digest(token.encode("utf-8"), enviado)]
+        if not enviado or not donos:
+            raise ErroHttp(401, "token ausente ou inválido")
+        if pedido is not None and pedido != donos[0]:
+            raise ErroHttp(403, "o token não dá acesso a este usuário")
+        return donos[0]
+
+    def _executar(self, usuario, nome, params, grupos):
+        # Numa thread do pool do servidor
+        with db.usuario(usuario), metricas.medir('http', rota=nome):
+            return getattr(self, "_" + nome)(params, *grupos)
+
+    def _ler_json(self):
+        try:
+            dados = json.loads(self._corpo or b"{}")
+        except json.JSONDecodeError:
+            raise ErroHttp(400, "JSON inválido")
+        if not isinstance(dados, dict):
+            raise ErroHttp(400, "esperado um objeto JSON")
+        return dados
+
+    def _responder(self, status, corpo):
+        if isinstance(corpo, str):  # /metrics: texto, não JSON
+            dados, tipo = corpo.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            dados = b"" if corpo is None else json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            tipo = "application/json; charset=utf-8"
+        self.send_response(status)
+        if corpo is not None:
+            self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(dados)))
+        if self.close_connection:  # corpo não lido (413, Content-Length inválido): o cliente não reaproveita
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(dados)
+
+    # ---- rotas ----
+
+    def _criar(self, params):
+        return 201, service.criar_nota(self._ler_json().get("content"))
+
+    def _obter(self, params, note_id):
+        return 200, service.obter_nota(int(note_id))
+
+    def _atualizar(self, params, note_id):
+        dados = self._ler_json()
+        return 200, service.atualizar_nota(int(note_id), dados.get("content"), dados.get("tags"))
+
+    def _excluir(self, params, note_id):
+        service.excluir_nota(int(note_id))
+        return 204, None
+
+    def _relacionadas(self, params, note_id):
+        limite = _inteiro(params, "limit", relacionadas.K, 1, relacionadas.K)
+        vizinhas = service.notas_relacionadas(int(note_id), limite)
+        if vizinhas is None:
+            # Lista na fila de jobs: o cliente tenta de novo em seguida
+            return 202, {"notes": [], "status": "computing"}
+        return 200, {"notes": vizinhas, "status": "ready"}
+
+    def _buscar(self, params):
+        tempos = {}
+        inicio = time.perf_counter()
+        tags, modo = _filtro_tags(params)
+        notas = service.buscar(params.get("q", [""])[0],
+                               limit=_inteiro(params, "limit", 20, 1, LIMITE_MAXIMO),
+                               offset=_inteiro(params, "offset", 0),
+                               tempos=tempos, tags=tags, modo_tags=modo)
+        tempos["total"] = (time.perf_counter() - inicio) * 1000
+        return 200, {"notes": notas, "timings_ms": {etapa: round(ms, 2) for etapa, ms in tempos.items()}}
+
+    def _timeline(self, params):
+        antes = None
+        if "before_ts" in params:
+            antes = (params["before_ts"][0], _inteiro(params, "before_id", 2 ** 62))
+        tags, modo = _filtro_tags(params)
+        return 200, service.timeline(_inteiro(params, "limit", 50, 1, LIMITE_MAXIMO), before=antes,
+                                     tags=tags, modo_tags=modo)
+
+    def _tags(self, params):
+        tags, modo = _filtro_tags(params)
+        return 200, {"tags": service.contar_tags(tags, modo, _inteiro(params, "limit", None, 1))}
+
+    def _status(self, params):
+        return 200, service.status()
+
+    def _metricas(self, params):
+        return 200, metricas.texto_prometheus()
+
+
+def carregar_tokens(caminho: str):
+    # {"<token>": "<id do usuário>" ou null}; ids inválidos falham aqui, não na requisição
+    with open(caminho, encoding="utf-8") as f:
+        tokens = json.load(f)
+    if not isinstance(tokens, dict) or not tokens:
+        raise ValueError(f"{caminho}: esperado um objeto JSON {{token: usuário}} não vazio")
+    for token, usuario in tokens.items():
+        if len(token) < 16:
+            raise ValueError(f"{caminho}: token curto demais (mínimo 16 caracteres)")
+        if usuario is not None:
+            db.caminho_usuario(usuario)
+    return tokens
+
+
+def servir(host: str = HOST, porta: int = PORTA, threads: int = THREADS, aquecer: bool = True,
+           tokens=None, permitir_remoto: bool = False):
+    if tokens is None and not permitir_remoto and host not in HOSTS_LOCAIS:
+        raise ValueError(f"sem tokens a API não tem autenticação e só escuta em loopback, não em {host} "
+                         "(use --tokens ou --allow-remote)")
+    service.iniciar(aquecer=aquecer)
+    servidor = ServidorMemoro((host, porta), threads, tokens)
+    print(f"🌐 Memoro ouvindo em http://{host}:{servidor.server_address[1]} ({threads} threads)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
@@ -0,0 +1,135 @@
+import threading
+
+import db
+import embeddings
+import ia
+import jobs
+import llm_cache
+import reindexer
+import relacionadas
+from search import search
+
+# Operações do Memoro sem depender da interface: usadas pela janela Flet
+# (main.py), pelo servidor HTTP (server.py) e por scripts. Entradas inválidas
+# levantam ValueError; nota inexistente levanta NotaNaoEncontrada.
+
+
+class NotaNaoEncontrada(Exception):
+    pass
+
+
+_iniciado = False
+_lock = threading.Lock()
+
+
+def iniciar(aquecer: bool = True, workers: int = 2):
+    # Migrações, índice FAISS, fila de jobs e (com aquecer) o modelo carregado
+    # antes da primeira requisição. Idempotente.
+    global _iniciado
+    with _lock:
+        if _iniciado:
+            return
+        db.init_db()
+        embeddings.carregar_indice()
+        jobs.iniciar(workers)
+        if aquecer:
+            ia.get_model()
+        reindexer.iniciar()
+        _iniciado = True
+
+
+def _tags(tags: str):
+    return [t.strip() for t in (tags or '').split(',') if t.strip()]
+
+
+def _resumo(row, trecho=None):
+    note_id, summary, tags, timestamp = row
+    nota = {"id": note_id, "summary": summary, "tags": _tags(tags), "timestamp": timestamp}
+    if trecho is not None:
+        nota["passage"] = trecho
+    return nota
+
+
+def _validar_conteudo(content):
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError("O conteúdo não pode estar vazio.")
+    return content.strip()
+
+
+def obter_nota(note_id: int):
+    note = db.get_note_by_id(note_id)
+    if note is None:
+        raise NotaNaoEncontrada(note_id)
+    content, summary, tags, timestamp = note
+    return {"id": note_id, "content": content, "summary": summary, "tags": _tags(tags), "timestamp": timestamp}
+
+
+def criar_nota(content: str):
+    # Grava na hora; resumo, tags e embeddings chegam pela fila de jobs
+    note_id = jobs.salvar_nota(_validar_conteudo(content))
+    return obter_nota(note_id)
+
+
+def atualizar_nota(note_id: int, content: str, tags=None):
+    # tags: lista ou texto separado por vírgula; None mantém as atuais
+    atual = obter_nota(note_id)
+    if tags is None:
+        tags = atual["tags"]
+    if isinstance(tags, str):
+        tags = _tags(tags)
+    content = _validar_conteudo(content)
+    db.update_note(note_id, content, atual["summary"], ','.join(tags))
+    if db.hash_conteudo(content) != db.hash_conteudo(atual["content"]):
+        # Só o texto novo pede resumo e embeddings; mudar só as tags não chama a IA
+        jobs.enfileirar(note_id, 'summary')
+        jobs.enfileirar(note_id, 'embed')
+    return obter_nota(note_id)
+
+
+def excluir_nota(note_id: int):
+    obter_nota(note_id)
+    db.delete_note(note_id)
+
+
+def buscar(query: str, limit: int = 20, offset: int = 0, tempos=None, tags=None, modo_tags: str = 'and'):
+    trechos = {}
+    rows = search(query or '', limit=limit, offset=offset, tempos=tempos, trechos=trechos,
+                  tags=tags, modo_tags=modo_tags)
+    return [_resumo(row, trechos.get(row[0])) for row in rows]
+
+
+def timeline(limit: int = 50, before=None, tags=None, modo_tags: str = 'and'):
+    # before: (timestamp, id) da última nota da página anterior, ou None.
+    # Devolve {"notes": [...], "next": (timestamp, id) ou None}
+    rows = db.get_notes_page(limit, before=before, tags=tags, modo_tags=modo_tags)
+    proximo = (rows[-1][3], rows[-1][0]) if len(rows) == limit else None
+    return {"notes": [_resumo(row) for row in rows], "next": proximo}
+
+
+def notas_relacionadas(note_id: int, limit: int = relacionadas.K):
+    # Vizinhas pelo grafo kNN guardado (relacionadas.py): sem modelo nem busca.
+    # None enquanto a lista está na fila para ser calculada
+    obter_nota(note_id)
+    vizinhas = relacionadas.relacionadas(note_id, limit)
+    if vizinhas is None:
+        return None
+    return [dict(_resumo(row[:4]), score=round(row[4], 4)) for row in vizinhas]
+
+
+def contar_tags(tags=None, modo_tags: str = 'and', limit: int = None):
+    # Facetas: [{"tag", "count"}]; com tags, só entre as notas filtradas
+    return [{"tag": tag, "count": n} for tag, n in db.get_tag_counts(tags, modo_tags, limit)]
+
+
+def status():
+    indice = embeddings.obter_indice()
+    return {
+        "queue": db.count_jobs(),
+        "queue_paused": jobs.pausado(),
+        "index_type": indice.tipo,
+        "index_vectors": indice.ntotal,
+        "model_loaded": ia.model_carregado(),
+        "stale_notes": db.count_stale_notes(ia.MODEL_EMBEDDING),
+        "related_lists": db.count_related(),
+        "llm_cache": llm_cache.estatisticas(),
+    }
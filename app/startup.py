@@ -0,0 +1,33 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# Importado primeiro por main.py: os marcos contam a partir daqui (ms)
+_INICIO = time.perf_counter()
+_marcos = {}
+
+
+def marcar(nome: str):
+    _marcos[nome] = (time.perf_counter() - _INICIO) * 1000
+
+
+def relatorio() -> str:
+    linhas = ["⏱ Inicialização:"]
+    for nome, ms in sorted(_marcos.items(), key=lambda item: item[1]):
+        linhas.append(f"   {nome:<16} {ms:8.1f} ms")
+    return "\n".join(linhas)
+
+
+def registrar(caminho: str):
+    # Uma linha JSON por execução, para comparar o time-to-first-paint entre versões
+    registro = {
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "marks_ms": {nome: round(ms, 1) for nome, ms in _marcos.items()},
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro) + "\n")
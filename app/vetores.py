@@ -0,0 +1,210 @@
+import os
+
+import numpy as np
+
+# Armazém de vetores em disco. Os vetores (float32, já normalizados) ficam num
+# arquivo só de anexação lido por mmap, e as chaves (db.chave_trecho) num
+# arquivo paralelo de int64: a linha i de um é a linha i do outro. Remover é
+# gravar -1 na chave (lápide); o espaço só volta na compactação, que escreve
+# uma geração nova com as linhas vivas. Varreduras e reconstruções leem em
+# blocos, então a memória do processo não cresce com o acervo: o que é lido
+# fica no cache de páginas do SO, que pode descartar quando precisar.
+#
+# Arquivos numa pasta ao lado do banco (memoro.vetores/):
+#   000001.f32 / 000001.ids  -> vetores e chaves da geração 1
+#   000001.faiss             -> estrutura do índice ANN dessa geração (ann.py)
+#   atual                    -> "geração dimensão" publicada; gerações sem
+#                               publicação (compactação interrompida) são lixo
+BLOCO = 16_384  # linhas por bloco nas varreduras (~24 MB de vetores)
+NOVAS_MAX = 65_536  # chaves anexadas fora do mapa ordenado antes de reordenar
+SUFIXOS = ('.f32', '.ids', '.faiss')
+
+
+def _geracoes(pasta):
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(int(nome[:-4]) for nome in os.listdir(pasta) if nome.endswith('.ids') and nome[:-4].isdigit())
+
+
+def _remover_arquivos(base):
+    for sufixo in SUFIXOS + ('.faiss.tmp',):
+        try:
+            os.remove(base + sufixo)
+        except OSError:
+            pass  # não existe, ou (Windows) ainda mapeado: a próxima publicação tenta de novo
+
+
+class ArmazemVetorial:
+
+    def __init__(self, pasta: str, geracao: int, dimensao: int):
+        self.pasta = pasta
+        self.geracao = geracao
+        self.dimensao = dimensao
+        self.caminho = os.path.join(pasta, f"{geracao:06d}")
+        for sufixo in ('.f32', '.ids'):
+            open(self.caminho + sufixo, 'ab').close()
+        # Gravação interrompida no meio de um anexo: vale o que os dois arquivos têm completo
+        linhas = min(os.path.getsize(self.caminho + '.ids') // 8,
+                     os.path.getsize(self.caminho + '.f32') // (4 * dimensao))
+        for sufixo, largura in (('.f32', 4 * dimensao), ('.ids', 8)):
+            if os.path.getsize(self.caminho + sufixo) != linhas * largura:
+                os.truncate(self.caminho + sufixo, linhas * largura)
+        self._n = linhas
+        self._mapeado = -1
+        self._vetores = self._chaves = None
+        self._ordem = None  # posições das chaves vivas, ordenadas pela chave
+        self._ordenadas = None
+        self._novas = {}  # chave -> posição, anexadas depois de montar _ordem
+        self.lapides = int(np.count_nonzero(self.chaves == -1))
+
+    @classmethod
+    def abrir(cls, pasta: str, dimensao: int):
+        # Geração publicada, ou None (pasta nova, de outra dimensão ou corrompida)
+        try:
+            with open(os.path.join(pasta, 'atual')) as f:
+                geracao, dimensao_gravada = (int(x) for x in f.read().split())
+        except (OSError, ValueError):
+            return None
+        if dimensao_gravada != dimensao or geracao not in _geracoes(pasta):
+            return None
+        return cls(pasta, geracao, dimensao)
+
+    @classmethod
+    def criar(cls, pasta: str, dimensao: int):
+        os.makedirs(pasta, exist_ok=True)
+        geracoes = _geracoes(pasta)
+        geracao = geracoes[-1] + 1 if geracoes else 1
+        return cls(pasta, geracao, dimensao)
+
+    def publicar(self):
+        # Passa a ser a geração aberta por abrir(); as outras são apagadas
+        self.sincronizar()
+        marcador = os.path.join(self.pasta, 'atual')
+        with open(marcador + '.tmp', 'w') as f:
+            f.write(f"{self.geracao} {self.dimensao}")
+        os.replace(marcador + '.tmp', marcador)
+        for geracao in _geracoes(self.pasta):
+            if geracao != self.geracao:
+                _remover_arquivos(os.path.join(self.pasta, f"{geracao:06d}"))
+
+    def descartar(self):
+        self.fechar()
+        _remover_arquivos(self.caminho)
+
+    def fechar(self):
+        self.sincronizar()
+        self._vetores = self._chaves = None
+        self._mapeado = -1
+
+    def sincronizar(self):
+        if isinstance(self._chaves, np.memmap):
+            self._chaves.flush()
+
+    def _mapear(self):
+        if self._mapeado == self._n:
+            return
+        if self._n == 0:
+            self._vetores = np.zeros((0, self.dimensao), dtype='float32')
+            self._chaves = np.zeros(0, dtype='int64')
+        else:
+            self._vetores = np.memmap(self.caminho + '.f32', dtype='float32', mode='r', shape=(self._n, self.dimensao))
+            self._chaves = np.memmap(self.caminho + '.ids', dtype='int64', mode='r+', shape=(self._n,))
+        self._mapeado = self._n
+
+    @property
+    def vetores(self):
+        self._mapear()
+        return self._vetores
+
+    @property
+    def chaves(self):
+        self._mapear()
+        return self._chaves
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def ntotal(self) -> int:
+        return self._n - self.lapides
+
+    def ids(self):
+        chaves = np.asarray(self.chaves)
+        return chaves[chaves != -1]
+
+    def blocos(self, inicio: int = 0, fim: int = None):
+        # (posição inicial, chaves, vetores) em fatias de BLOCO linhas
+        fim = self._n if fim is None else fim
+        for posicao in range(inicio, fim, BLOCO):
+            ate = min(fim, posicao + BLOCO)
+            yield posicao, np.array(self.chaves[posicao:ate]), self.vetores[posicao:ate]
+
+    def anexar(self, chaves, vetores) -> int:
+        # Sempre no fim; quem substitui uma chave remove a anterior antes
+        chaves = np.ascontiguousarray(chaves, dtype='int64')
+        vetores = np.ascontiguousarray(vetores, dtype='float32').reshape(-1, self.dimensao)
+        with open(self.caminho + '.f32', 'ab') as f:
+            f.write(vetores)
+        with open(self.caminho + '.ids', 'ab') as f:
+            f.write(chaves)
+        inicio = self._n
+        self._n += len(chaves)
+        if self._ordem is not None:
+            self._novas.update(zip(chaves.tolist(), range(inicio, self._n)))
+            if len(self._novas) > NOVAS_MAX:
+                self._ordem = None  # reordena tudo na próxima consulta
+        return inicio
+
+    def _ordenar(self):
+        chaves = np.asarray(self.chaves)
+        vivas = np.flatnonzero(chaves != -1)
+        self._ordem = vivas[np.argsort(chaves[vivas], kind='stable')]
+        self._ordenadas = chaves[self._ordem]
+        self._novas = {}
+
+    def posicao(self, chave: int):
+        chave = int(chave)
+        if self._ordem is None:
+            self._ordenar()
+        posicao = self._novas.get(chave)
+        if posicao is None:
+            i = int(np.searchsorted(self._ordenadas, chave))
+            if i == len(self._ordenadas) or self._ordenadas[i] != chave:
+                return None
+            posicao = int(self._ordem[i])
+        # Posição antiga de uma chave removida depois de ordenar: virou lápide
+        return posicao if self.chaves[posicao] == chave else None
+
+    def posicoes(self, chaves):
+        # posicao() de várias chaves de uma vez (searchsorted vetorizado); as ausentes ficam de fora
+        chaves = np.asarray(chaves, dtype='int64')
+        if self._ordem is None:
+            self._ordenar()
+        if len(self._ordenadas) == 0:
+            encontradas = np.zeros(0, dtype='int64')
+        else:
+            i = np.minimum(np.searchsorted(self._ordenadas, chaves), len(self._ordenadas) - 1)
+            encontradas = self._ordem[i[self._ordenadas[i] == chaves]]
+        if self._novas:
+            novas = [self._novas[chave] for chave in chaves.tolist() if chave in self._novas]
+            encontradas = np.concatenate([encontradas, np.asarray(novas, dtype='int64')])
+        encontradas = np.unique(encontradas)
+        return encontradas[np.asarray(self.chaves)[encontradas] != -1]
+
+    def remover(self, chaves):
+        posicoes = [p for p in (self.posicao(chave) for chave in chaves) if p is not None]
+        if posicoes:
+            self.chaves[posicoes] = -1
+            self.lapides += len(posicoes)
+        for chave in chaves:
+            self._novas.pop(int(chave), None)
+        return posicoes
+
+    def compactar(self, fim: int = None):
+        # Geração nova (não publicada) só com as linhas vivas de [0, fim)
+        novo = ArmazemVetorial.criar(self.pasta, self.dimensao)
+        for _, chaves, vetores in self.blocos(0, fim):
+            vivas = chaves != -1
+            if vivas.any():
+                novo.anexar(chaves[vivas], vetores[vivas])
+        return novo
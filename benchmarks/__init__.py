@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Os módulos do app usam imports planos (import db), como em `python app/main.py`
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+if APP not in sys.path:
+    sys.path.insert(0, APP)
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+import ann  # noqa: E402
+import vetores  # noqa: E402
+
+# Recall x latência dos tipos de índice de app/ann.py em corpora sintéticos de
+# 384 dimensões. Os vetores vêm de clusters gaussianos (parecido com embeddings
+# de notas sobre poucos assuntos) e as consultas são pontos do corpus com ruído.
+# Verdade de referência: busca exata (flat). Uso:
+#   python benchmarks/ann.py --tamanhos 10000 100000 1000000 --json resultados.json
+DIMENSAO = 384
+K = 10
+CONSULTAS = 500
+CONFIGURACOES = {
+    'flat': [{}],
+    'hnsw': [{'ef_search': ef} for ef in (16, 32, 64, 128, 256)],
+    'ivfpq': [{'nprobe': nprobe, 'refino': refino} for nprobe in (8, 32) for refino in (1, 4, 16)],
+}
+
+
+def corpus_sintetico(n: int, dimensao: int = DIMENSAO, clusters: int = 200, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centros = rng.standard_normal((clusters, dimensao)).astype('float32')
+    vetores = np.empty((n, dimensao), dtype='float32')
+    for inicio in range(0, n, 100_000):
+        fim = min(n, inicio + 100_000)
+        rotulos = rng.integers(0, clusters, fim - inicio)
+        vetores[inicio:fim] = centros[rotulos] + 0.6 * rng.standard_normal((fim - inicio, dimensao), dtype='float32')
+    consultas = vetores[rng.choice(n, CONSULTAS, replace=False)]
+    consultas = consultas + 0.3 * rng.standard_normal(consultas.shape, dtype='float32')
+    return vetores, consultas
+
+
+def recall(encontrados, referencia):
+    acertos = sum(len(set(a[a != -1]) & set(b)) for a, b in zip(encontrados, referencia))
+    return acertos / referencia.size
+
+
+def armazem_temporario(vetores_corpus, pasta):
+    # Mesmo caminho do app: vetores normalizados num armazém mapeado em disco
+    armazem = vetores.ArmazemVetorial.criar(pasta, vetores_corpus.shape[1])
+    for inicio in range(0, len(vetores_corpus), 100_000):
+        fatia = vetores_corpus[inicio:inicio + 100_000]
+        armazem.anexar(np.arange(inicio + 1, inicio + len(fatia) + 1, dtype='int64'), ann.normalizar(fatia))
+    return armazem
+
+
+def memoria_mb(indice):
+    # O que fica na memória do processo: a estrutura do FAISS (no flat, nada além do mmap)
+    if indice.index is None:
+        return 0.0
+    import faiss
+    return faiss.serialize_index(indice.index).nbytes / 2 ** 20
+
+
+def medir(indice, consultas, k=K):
+    # Uma consulta por vez, como no app
+    latencias = []
+    resultados = []
+    for vetor in consultas:
+        inicio = time.perf_counter()
+        _, ids = indice.buscar(vetor[None, :], k)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        resultados.append(ids[0])
+    return np.array(resultados), np.array(latencias)
+
+
+def comparar(n: int, tipos=ann.TIPOS):
+    corpus, consultas = corpus_sintetico(n)
+    pasta = tempfile.mkdtemp(prefix="memoro-ann-")
+    armazem = armazem_temporario(corpus, pasta)
+    del corpus
+    linhas = []
+    referencia = None
+    for tipo in tipos:
+        if tipo == 'ivfpq' and n < 39 * 2 ** ann.PQ_BITS:
+            continue
+        inicio = time.perf_counter()
+        indice = ann.IndiceVetorial.construir(armazem, tipo)
+        construcao = time.perf_counter() - inicio
+        memoria = memoria_mb(indice)
+        for parametros in CONFIGURACOES[tipo]:
+            indice.configurar(**parametros)
+            encontrados, latencias = medir(indice, consultas)
+            if referencia is None:
+                referencia = encontrados  # 'flat' vem primeiro: busca exata
+            linhas.append({
+                "n": n,
+                "tipo": tipo,
+                "parametros": parametros,
+                "construcao_s": round(construcao, 2),
+                "memoria_mb": round(memoria, 1),
+                "recall_at_10": round(recall(encontrados, referencia), 4),
+                "p50_ms": round(float(np.percentile(latencias, 50)), 3),
+                "p95_ms": round(float(np.percentile(latencias, 95)), 3),
+            })
+            print(f"{n:>9} {tipo:>6} {json.dumps(parametros):<30} "
+                  f"recall@{K} {linhas[-1]['recall_at_10']:.3f}  "
+                  f"p50 {linhas[-1]['p50_ms']:.2f} ms  p95 {linhas[-1]['p95_ms']:.2f} ms  "
+                  f"(construção {construcao:.1f}s, {memoria:.0f} MB)")
+        del indice
+    armazem.fechar()
+    shutil.rmtree(pasta, ignore_errors=True)
+    return linhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall x latência dos índices vetoriais do Memoro")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    args = parser.parse_args(argv)
+
+    resultados = []
+    for n in args.tamanhos:
+        resultados.extend(comparar(n))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
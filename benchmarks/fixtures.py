@@ -0,0 +1,87 @@
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks import stubs
+
+# Bancos sintéticos no formato do memoro.db, gerados uma vez por tamanho e
+# reaproveitados (benchmarks/.fixtures/memoro_<n>.db, fora do git). Conteúdo,
+# datas e embeddings saem de seeds fixas: a mesma fixture em qualquer máquina.
+PASTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures")
+LOTE = 2000
+PALAVRAS = (
+    "reunião projeto ideia cliente prazo relatório código teste banco dados viagem livro "
+    "estudo aula prova café treino corrida médico consulta compra mercado receita bolo "
+    "filme série música show aniversário presente família amigo trabalho equipe meta "
+    "orçamento fatura imposto carro oficina casa reforma jardim planta cachorro gato"
+).split()
+
+
+def texto_sintetico(rng, minimo=20, maximo=200):
+    return " ".join(rng.choice(PALAVRAS) for _ in range(rng.randint(minimo, maximo)))
+
+
+def caminho_fixture(n: int) -> str:
+    return os.path.join(PASTA, f"memoro_{n}.db")
+
+
+def pasta_indice(caminho: str) -> str:
+    # Mesmo nome que embeddings.pasta_vetores() dá ao armazém de um banco
+    return os.path.splitext(caminho)[0] + ".vetores"
+
+
+def gerar_banco(caminho: str, n: int, seed: int = 0):
+    import db
+    import embeddings
+    import ia
+    for arquivo in (caminho, caminho + "-wal", caminho + "-shm"):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+    shutil.rmtree(pasta_indice(caminho), ignore_errors=True)
+    db.close_connection()
+    db.DB_PATH = caminho
+    db.init_db()
+    embeddings.descarregar()  # sem índice nem armazém, os lotes não passam pelo observador
+
+    rng = random.Random(seed)
+    inicio = datetime(2023, 1, 1)
+    segundos = 2 * 365 * 24 * 3600  # notas espalhadas por dois anos
+    instantes = sorted(rng.randrange(segundos) for _ in range(n))
+    for base in range(0, n, LOTE):
+        notas = []
+        for i in range(base, min(n, base + LOTE)):
+            conteudo = texto_sintetico(rng)
+            tags = rng.sample(PALAVRAS, 3)
+            notas.append((conteudo, f"Resumo da nota {i}: {conteudo[:80]}", tags,
+                          (inicio + timedelta(seconds=instantes[i])).isoformat(),
+                          stubs.vetor_falso(conteudo)))
+        db.save_notes_batch(notas, model=ia.MODEL_EMBEDDING)
+    embeddings.carregar_indice()  # grava o armazém (memoro_N.vetores/) junto com a fixture
+    db.close_connection()
+
+
+def obter_fixture(n: int) -> str:
+    # Gera na primeira vez; depois só confere a contagem
+    import sqlite3
+    caminho = caminho_fixture(n)
+    if os.path.exists(caminho) and os.path.isdir(pasta_indice(caminho)):
+        conn = sqlite3.connect(caminho)
+        total = conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        conn.close()
+        if total == n:
+            return caminho
+    os.makedirs(PASTA, exist_ok=True)
+    print(f"🏗 Gerando fixture com {n} notas...")
+    gerar_banco(caminho, n)
+    return caminho
+
+
+def copia_temporaria(caminho_fixture: str) -> str:
+    # Pasta nova com memoro.db + índice copiados da fixture (o original fica intacto)
+    pasta = tempfile.mkdtemp(prefix="memoro-bench-")
+    destino = os.path.join(pasta, "memoro.db")
+    shutil.copy(caminho_fixture, destino)
+    shutil.copytree(pasta_indice(caminho_fixture), pasta_indice(destino))
+    return pasta
@@ -0,0 +1,220 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks import fixtures, stubs
+
+# Tempo dos caminhos quentes do app contra fixtures de 1k/10k/100k notas, com
+# LLM e modelo de embeddings substituídos (benchmarks/stubs.py). Cada operação
+# roda num processo próprio, então o pico de RSS é só dela. Uso:
+#   python -m benchmarks.hot_paths --json atual.json
+#   python -m benchmarks.hot_paths --json atual.json --base anterior.json
+TAMANHOS = [1_000, 10_000, 100_000]
+REPETICOES = 30
+TOLERANCIA = 0.2  # p50 20% mais lento que a base conta como regressão
+CONSULTAS = ["reunião com cliente sobre prazo", "receita de bolo", "treino de corrida",
+             "fatura do cartão", "ideia para o projeto"]
+# Palavras do vocabulário da fixture (casam com a maior parte das notas, o pior
+# caso do bm25); a última está pela metade, como na busca enquanto digita
+PALAVRAS_CHAVE = ["reunião cliente prazo", "receita bolo", "treino", "fatura imposto", "orçamento proj"]
+TAGS = ["trabalho", "viagem", "café", "família", "projeto"]
+
+
+def _preparar(caminho_fixture):
+    # Cópia descartável da fixture: save_note não pode sujar o original
+    pasta = fixtures.copia_temporaria(caminho_fixture)
+    stubs.instalar()
+    import db
+    db.DB_PATH = os.path.join(pasta, "memoro.db")
+    db.init_db()
+    return pasta
+
+
+def _imagem_teste(pasta):
+    from PIL import Image, ImageDraw
+    imagem = Image.new("L", (1200, 800), 255)
+    desenho = ImageDraw.Draw(imagem)
+    for linha in range(20):
+        desenho.text((40, 30 + linha * 36), fixtures.texto_sintetico(__import__("random").Random(linha), 8, 12), fill=0)
+    caminho = os.path.join(pasta, "ocr.png")
+    imagem.save(caminho)
+    return caminho
+
+
+def _sem_cache_ocr():
+    # Mede o Tesseract, não o cache por hash (que tornaria toda repetição instantânea)
+    import ocr
+    ocr.USAR_CACHE = False
+
+
+def _operacoes(pasta):
+    # nome -> (preparo fora da medição ou None, operação(i))
+    import db
+    import embeddings
+    import ia
+    import search
+
+    def semantica(i):
+        embeddings.buscar_semanticamente(CONSULTAS[i % len(CONSULTAS)] + f" {i}", top_k=50)
+
+    def semantica_com_tag(i):
+        # Pré-filtro por tag: a busca vetorial fica restrita às notas com a tag
+        search.search(CONSULTAS[i % len(CONSULTAS)] + f" {i}", limit=20, tags=[TAGS[i % len(TAGS)]])
+
+    def palavras_chave(i):
+        # Busca enquanto digita: FTS5 exato e, se faltar resultado, a última palavra como prefixo
+        search.buscar_palavras_chave(PALAVRAS_CHAVE[i % len(PALAVRAS_CHAVE)], search.CANDIDATOS, prefixo=True)
+
+    def salvar(i):
+        texto = f"nota de benchmark {i} " + CONSULTAS[i % len(CONSULTAS)]
+        db.save_note(texto, "resumo", ["benchmark"], ia.generate_embedding(texto))
+
+    operacoes = {
+        "buscar_semanticamente": (None, semantica),
+        "get_all_notes": (None, lambda i: db.get_all_notes()),
+        "get_notes_grouped_by_day": (None, lambda i: db.get_notes_grouped_by_day()),
+        "search_com_tag": (embeddings.carregar_indice, semantica_com_tag),
+        "search_keyword": (None, palavras_chave),
+        "get_tag_counts": (None, lambda i: db.get_tag_counts([TAGS[i % len(TAGS)]], limit=20)),
+        # Com o índice carregado, como no app: cada save também atualiza o FAISS
+        "save_note": (embeddings.carregar_indice, salvar),
+    }
+    if stubs.ocr_disponivel():
+        imagem = _imagem_teste(pasta)
+        operacoes["ocr_image"] = (_sem_cache_ocr, lambda i: ia.ocr_image(imagem))
+    return operacoes
+
+
+def _pico_rss_mb():
+    # VmHWM é o pico do próprio processo; ru_maxrss no Linux herda o do pai através do exec
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return round(int(linha.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def medir_operacao(caminho_fixture, nome, repeticoes):
+    # Roda no processo filho
+    pasta = _preparar(caminho_fixture)
+    try:
+        operacoes = _operacoes(pasta)
+        if nome not in operacoes:
+            return None
+        preparo, operacao = operacoes[nome]
+        if preparo:
+            preparo()
+        inicio = time.perf_counter()
+        operacao(-1)  # aquecimento: carrega índice, cache de páginas do SQLite
+        aquecimento = (time.perf_counter() - inicio) * 1000
+        tempos = []
+        for i in range(repeticoes):
+            inicio = time.perf_counter()
+            operacao(i)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return {
+            "primeira_ms": round(aquecimento, 3),
+            "p50_ms": round(float(np.percentile(tempos, 50)), 3),
+            "p95_ms": round(float(np.percentile(tempos, 95)), 3),
+            "media_ms": round(float(np.mean(tempos)), 3),
+            "pico_rss_mb": _pico_rss_mb(),
+        }
+    finally:
+        import db
+        import embeddings
+        embeddings.descarregar(salvar=False)  # o atexit não deve gravar o índice na pasta já apagada
+        db.close_connection()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(fixtures.PASTA), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(tamanhos, operacoes, repeticoes):
+    contexto = multiprocessing.get_context("spawn")
+    resultados = []
+    for n in tamanhos:
+        caminho = fixtures.obter_fixture(n)
+        for nome in operacoes:
+            with contexto.Pool(1) as pool:
+                medida = pool.apply(medir_operacao, (caminho, nome, repeticoes))
+            if medida is None:
+                print(f"{n:>7} {nome:<26} indisponível neste ambiente")
+                continue
+            resultados.append({"n": n, "operacao": nome, "repeticoes": repeticoes, **medida})
+            print(f"{n:>7} {nome:<26} p50 {medida['p50_ms']:9.2f} ms  p95 {medida['p95_ms']:9.2f} ms  "
+                  f"pico RSS {medida['pico_rss_mb']} MB")
+    return resultados
+
+
+def comparar(atual, base, tolerancia=TOLERANCIA):
+    # Devolve as regressões de p50 em relação a um JSON anterior
+    anteriores = {(r["n"], r["operacao"]): r for r in base["resultados"]}
+    regressoes = []
+    for r in atual["resultados"]:
+        anterior = anteriores.get((r["n"], r["operacao"]))
+        if anterior and anterior["p50_ms"] > 0 and r["p50_ms"] > anterior["p50_ms"] * (1 + tolerancia):
+            regressoes.append((r["n"], r["operacao"], anterior["p50_ms"], r["p50_ms"]))
+    return regressoes
+
+
+def main(argv=None):
+    stubs.instalar()
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes do Memoro")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS)
+    parser.add_argument("--operacoes", nargs="+",
+                        default=["buscar_semanticamente", "get_all_notes", "get_notes_grouped_by_day",
+                                 "search_com_tag", "search_keyword", "get_tag_counts", "save_note",
+                                 "ocr_image"])
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    parser.add_argument("--base", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = parser.parse_args(argv)
+
+    relatorio = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "platform": sys.platform,
+        "resultados": executar(args.tamanhos, args.operacoes, args.repeticoes),
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2)
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        regressoes = comparar(relatorio, base, args.tolerancia)
+        for n, nome, antes, agora in regressoes:
+            print(f"❌ {nome} ({n} notas): p50 {antes:.2f} ms -> {agora:.2f} ms")
+        if regressoes:
+            sys.exit(1)
+        print(f"✅ Nenhuma regressão acima de {args.tolerancia:.0%} em relação a {base.get('commit')}")
+
+
+if __name__ == "__main__":
+    main()
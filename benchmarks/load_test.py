@@ -0,0 +1,166 @@
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import threading
+import time
+from urllib.parse import quote, urlparse
+
+import numpy as np
+
+from benchmarks import fixtures, stubs
+
+# Teste de carga da API HTTP (app/server.py): N clientes com conexões
+# keep-alive disparam uma mistura de operações durante um tempo fixo e o script
+# reporta requisições/s e latência por operação. Sem --url, sobe um servidor
+# local sobre uma cópia de uma fixture, com a IA substituída (offline). Uso:
+#   python -m benchmarks.load_test --fixture 10000 --clientes 8 --duracao 15
+#   python -m benchmarks.load_test --url http://127.0.0.1:8765 --mix search=80,get=20
+#   python -m benchmarks.load_test --usuarios 50   # cada cliente alterna entre 50 bancos
+MIX_PADRAO = "search=60,get=20,timeline=10,create=10"
+CONSULTAS = ["reunião com cliente", "receita de bolo", "treino de corrida", "fatura do cartão",
+             "ideia para o projeto", "consulta médica", "viagem de férias", "livro sobre estudo"]
+
+
+def _servidor_local(caminho_fixture, fila, threads):
+    # Processo filho: cópia da fixture + stubs + servidor numa porta livre
+    import db
+    import server
+    import service
+    pasta = fixtures.copia_temporaria(caminho_fixture)
+    stubs.instalar()
+    db.DB_PATH = os.path.join(pasta, "memoro.db")
+    try:
+        service.iniciar()
+        servidor = server.ServidorMemoro(("127.0.0.1", 0), threads)
+        fila.put(servidor.server_address[1])
+        servidor.serve_forever()
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _mix(texto):
+    pesos = {}
+    for parte in texto.split(","):
+        nome, _, peso = parte.partition("=")
+        pesos[nome.strip()] = float(peso)
+    return pesos
+
+
+def _requisicao(conexao, operacao, rng, maior_id, cabecalhos):
+    if operacao == "search":
+        consulta = rng.choice(CONSULTAS)
+        conexao.request("GET", f"/search?q={quote(consulta)}&limit=20", headers=cabecalhos)
+    elif operacao == "get":
+        conexao.request("GET", f"/notes/{rng.randint(1, maior_id)}", headers=cabecalhos)
+    elif operacao == "timeline":
+        conexao.request("GET", "/timeline?limit=50", headers=cabecalhos)
+    elif operacao == "create":
+        corpo = json.dumps({"content": f"nota do teste de carga {rng.random()} " + rng.choice(CONSULTAS)})
+        conexao.request("POST", "/notes", body=corpo, headers={**cabecalhos, "Content-Type": "application/json"})
+    else:
+        raise ValueError(f"operação desconhecida: {operacao}")
+    resposta = conexao.getresponse()
+    resposta.read()
+    return resposta.status
+
+
+def _cliente(host, porta, pesos, prazo, maior_id, seed, usuarios, resultados):
+    rng = random.Random(seed)
+    nomes, valores = list(pesos), list(pesos.values())
+    conexao = http.client.HTTPConnection(host, porta, timeout=30)
+    while time.monotonic() < prazo:
+        operacao = rng.choices(nomes, valores)[0]
+        # Sem --usuarios, tudo no banco padrão (a fixture)
+        cabecalhos = {"X-Memoro-User": f"carga{rng.randrange(usuarios)}"} if usuarios else {}
+        inicio = time.perf_counter()
+        try:
+            status = _requisicao(conexao, operacao, rng, maior_id, cabecalhos)
+        except (OSError, http.client.HTTPException):
+            conexao.close()
+            conexao = http.client.HTTPConnection(host, porta, timeout=30)
+            status = None
+        resultados.append((operacao, (time.perf_counter() - inicio) * 1000, status))
+    conexao.close()
+
+
+def executar(host, porta, clientes, duracao, pesos, maior_id, usuarios=0):
+    resultados = []  # list.append é atômico: as threads dividem a mesma lista
+    prazo = time.monotonic() + duracao
+    threads = [threading.Thread(target=_cliente,
+                                args=(host, porta, pesos, prazo, maior_id, i, usuarios, resultados))
+               for i in range(clientes)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.perf_counter() - inicio
+
+    relatorio = {"clientes": clientes, "segundos": round(decorrido, 2), "requisicoes": len(resultados),
+                 "rps": round(len(resultados) / decorrido, 1), "operacoes": {}}
+    for operacao in pesos:
+        medidas = [(ms, status) for nome, ms, status in resultados if nome == operacao]
+        if not medidas:
+            continue
+        tempos = np.array([ms for ms, _ in medidas])
+        # 404 em get é esperado (ids apagados ou fora do intervalo), não conta como erro
+        erros = sum(1 for _, status in medidas if status is None or status >= 500)
+        relatorio["operacoes"][operacao] = {
+            "requisicoes": len(medidas),
+            "rps": round(len(medidas) / decorrido, 1),
+            "p50_ms": round(float(np.percentile(tempos, 50)), 2),
+            "p95_ms": round(float(np.percentile(tempos, 95)), 2),
+            "erros": erros,
+        }
+    return relatorio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga da API HTTP do Memoro")
+    parser.add_argument("--url", help="servidor já rodando (ex.: http://127.0.0.1:8765)")
+    parser.add_argument("--fixture", type=int, default=10_000, help="notas na fixture do servidor local")
+    parser.add_argument("--threads-servidor", type=int, default=8)
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--duracao", type=float, default=10.0, help="segundos")
+    parser.add_argument("--mix", default=MIX_PADRAO, help="pesos por operação: search, get, timeline, create")
+    parser.add_argument("--usuarios", type=int, default=0,
+                        help="espalha as requisições entre N usuários (X-Memoro-User)")
+    parser.add_argument("--json", help="grava o relatório neste arquivo")
+    args = parser.parse_args(argv)
+
+    processo = None
+    if args.url:
+        url = urlparse(args.url)
+        host, porta = url.hostname, url.port or 80
+    else:
+        caminho = fixtures.obter_fixture(args.fixture)
+        contexto = multiprocessing.get_context("spawn")
+        fila = contexto.Queue()
+        processo = contexto.Process(target=_servidor_local, args=(caminho, fila, args.threads_servidor), daemon=True)
+        processo.start()
+        host, porta = "127.0.0.1", fila.get(timeout=300)
+
+    try:
+        relatorio = executar(host, porta, args.clientes, args.duracao, _mix(args.mix), args.fixture,
+                             args.usuarios)
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.join()
+
+    print(f"🚀 {relatorio['requisicoes']} requisições em {relatorio['segundos']}s "
+          f"→ {relatorio['rps']} req/s com {relatorio['clientes']} clientes")
+    for operacao, dados in relatorio["operacoes"].items():
+        print(f"   {operacao:<9} {dados['rps']:8.1f} req/s  p50 {dados['p50_ms']:7.2f} ms  "
+              f"p95 {dados['p95_ms']:7.2f} ms  erros {dados['erros']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import json
+import shutil
+import sys
+import zlib
+
+import numpy as np
+
+# Substitutos determinísticos para o que depende de rede ou de modelo pesado:
+# os benchmarks rodam offline e dão o mesmo resultado em qualquer máquina.
+DIMENSAO = 384
+
+
+def vetor_falso(texto: str):
+    # Mesmo texto -> mesmo vetor, sem carregar o sentence-transformers
+    rng = np.random.default_rng(zlib.crc32(texto.encode("utf-8")))
+    return rng.standard_normal(DIMENSAO).astype(np.float32)
+
+
+class ModeloFalso:
+
+    def encode(self, textos, batch_size=32, **kwargs):
+        if isinstance(textos, str):
+            return vetor_falso(textos)
+        return np.array([vetor_falso(t) for t in textos], dtype=np.float32).reshape(len(textos), DIMENSAO)
+
+
+def resposta_falsa(messages, model, max_tokens=None, formato_json=False, **kwargs):
+    texto = messages[-1]["content"]
+    if formato_json:
+        return json.dumps({"resumo": f"Resumo sintético ({len(texto)} caracteres).",
+                           "tags": ["trabalho", "ideias", "pessoal"]})
+    if "tags" in texto:
+        return "trabalho, ideias, pessoal"
+    return f"Resumo sintético ({len(texto)} caracteres)."
+
+
+def instalar():
+    # Chamar antes de qualquer medição; importa os módulos do app já "desligados"
+    import embedding_cache
+    import ia
+    import llm_cache
+    import ocr
+    ia._model = ModeloFalso()
+    ia.call_openrouter = resposta_falsa
+    embedding_cache.PERSISTIR = False  # não grava memoro_cache.db ao lado da fixture
+    llm_cache.PERSISTIR = False
+    tesseract = shutil.which("tesseract")
+    if tesseract:
+        ocr.TESSERACT_CMD = tesseract
+        ocr.TESSDATA_PREFIX = ""
+
+
+def ocr_disponivel() -> bool:
+    try:
+        import PIL  # noqa: F401
+        import pytesseract  # noqa: F401
+    except ImportError:
+        return False
+    return shutil.which("tesseract") is not None or sys.platform == "win32"
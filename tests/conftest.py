@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+import db  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def banco(tmp_path, monkeypatch):
+    # Cada teste num banco próprio: nunca toca o memoro.db do repositório
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "memoro.db"))
+    import llm_cache
+    monkeypatch.setattr(llm_cache, "PERSISTIR", False)
+    yield db.DB_PATH
+    db.close_connection()
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import ann
+import vetores
+
+DIMENSAO = 384
+
+
+def _corpus(n, semente=0):
+    return ann.normalizar(np.random.default_rng(semente).standard_normal((n, DIMENSAO)).astype('float32'))
+
+
+def _armazem(pasta, matriz):
+    armazem = vetores.ArmazemVetorial.criar(str(pasta), DIMENSAO)
+    armazem.anexar(np.arange(len(matriz), dtype='int64') * 10, matriz)
+    return armazem
+
+
+def test_escolher_tipo_pelo_tamanho(monkeypatch):
+    monkeypatch.setattr(ann, "TIPO_FORCADO", None)
+    assert ann.escolher_tipo(0) == 'flat'
+    assert ann.escolher_tipo(ann.LIMITE_FLAT - 1) == 'flat'
+    assert ann.escolher_tipo(ann.LIMITE_FLAT) == 'hnsw'
+    assert ann.escolher_tipo(ann.LIMITE_HNSW) == 'ivfpq'
+
+    # Forçar ivfpq sem pontos para treinar os codebooks cai na escolha automática
+    monkeypatch.setattr(ann, "TIPO_FORCADO", 'ivfpq')
+    assert ann.escolher_tipo(100) == 'flat'
+    monkeypatch.setattr(ann, "TIPO_FORCADO", 'hnsw')
+    assert ann.escolher_tipo(100) == 'hnsw'
+
+
+@pytest.mark.parametrize("tipo", ['hnsw', 'ivfpq'])
+def test_aproximado_acha_os_mesmos_vizinhos_que_o_exato(tmp_path, monkeypatch, tipo):
+    # Codebooks de 4 bits: treino do IVF-PQ em menos de um segundo
+    monkeypatch.setattr(ann, "PQ_BITS", 4)
+    n = 2000
+    corpus = _corpus(n)
+    # Consultas perto de vetores conhecidos: o vizinho certo é inequívoco
+    alvos = np.arange(0, n, n // 20)
+    consultas = corpus[alvos] + 0.05 * _corpus(len(alvos), semente=1)
+
+    exato = ann.IndiceVetorial.construir(_armazem(tmp_path / "flat", corpus), 'flat')
+    aproximado = ann.IndiceVetorial.construir(_armazem(tmp_path / tipo, corpus), tipo)
+    assert aproximado.tipo == tipo
+
+    sim_exata, ids_exatos = exato.buscar(consultas, 5)
+    sim_aprox, ids_aprox = aproximado.buscar(consultas, 5)
+    assert ids_exatos[:, 0].tolist() == (alvos * 10).tolist()
+    assert np.mean(ids_aprox[:, 0] == ids_exatos[:, 0]) >= 0.95
+    # As similaridades devolvidas são as exatas do armazém, não as quantizadas
+    iguais = ids_aprox == ids_exatos
+    assert np.allclose(sim_aprox[iguais], sim_exata[iguais], atol=1e-5)
+
+
+def test_lapides_somem_da_busca_e_pedem_reconstrucao(tmp_path):
+    corpus = _corpus(500)
+    index = ann.IndiceVetorial.construir(_armazem(tmp_path, corpus), 'hnsw')
+    removidas = np.arange(0, 200, dtype='int64') * 10
+    index.remover(removidas)
+
+    _, ids = index.buscar(corpus[:200], 5)
+    assert not np.isin(ids, removidas).any()
+    assert (ids != -1).all()  # pede mais candidatos quando as lápides comem os k
+    assert index.precisa_reconstruir()  # 40% de lápides > LAPIDES_MAX
+
+
+def test_salvar_e_ler_mantem_o_tipo(tmp_path):
+    corpus = _corpus(300)
+    armazem = _armazem(tmp_path, corpus)
+    index = ann.IndiceVetorial.construir(armazem, 'hnsw')
+    index.salvar()
+    armazem.publicar()
+    armazem.fechar()
+
+    armazem = vetores.ArmazemVetorial.abrir(str(tmp_path), DIMENSAO)
+    lido = ann.IndiceVetorial.ler(armazem)
+    assert lido.tipo == 'hnsw'
+    # O índice lido continua recebendo vetores no lugar
+    lido.adicionar([99_999], corpus[:1] * -1)
+    assert lido.buscar(-corpus[:1], 1)[1][0, 0] == 99_999
+    armazem.fechar()
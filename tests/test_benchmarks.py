@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import embedding_cache  # noqa: E402
+import embeddings  # noqa: E402
+import ia  # noqa: E402
+import llm_cache  # noqa: E402
+import ocr  # noqa: E402
+from benchmarks import fixtures, hot_paths  # noqa: E402
+
+
+def _notas(caminho):
+    conn = sqlite3.connect(caminho)
+    try:
+        return conn.execute("SELECT id, content, summary, tags, timestamp, embedding FROM notes ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def fixture_pequena(tmp_path, monkeypatch):
+    # stubs.instalar() troca o modelo e a IA do processo: devolvidos no fim do teste
+    for modulo, nome in [(ia, "_model"), (ia, "call_openrouter"), (embedding_cache, "PERSISTIR"),
+                         (llm_cache, "PERSISTIR"), (ocr, "TESSERACT_CMD"), (ocr, "TESSDATA_PREFIX")]:
+        monkeypatch.setattr(modulo, nome, getattr(modulo, nome))
+    monkeypatch.setattr(fixtures, "PASTA", str(tmp_path / "fixtures"))
+    caminho = fixtures.obter_fixture(40)
+    embeddings.descarregar(caminho, salvar=False)
+    return caminho
+
+
+def test_fixture_deterministica(fixture_pequena, tmp_path):
+    outra = str(tmp_path / "outra.db")
+    fixtures.gerar_banco(outra, 40)
+    embeddings.descarregar(outra, salvar=False)
+
+    assert len(_notas(fixture_pequena)) == 40
+    assert _notas(outra) == _notas(fixture_pequena)
+    assert os.path.isdir(fixtures.pasta_indice(fixture_pequena))
+    # Já gerada com a contagem certa: obter_fixture não refaz
+    antes = os.path.getmtime(fixture_pequena)
+    assert fixtures.obter_fixture(40) == fixture_pequena
+    assert os.path.getmtime(fixture_pequena) == antes
+
+
+@pytest.mark.parametrize("operacao", ["save_note", "search_keyword", "buscar_semanticamente", "get_tag_counts"])
+def test_medir_operacao_numa_copia(fixture_pequena, operacao):
+    medida = hot_paths.medir_operacao(fixture_pequena, operacao, 3)
+
+    assert set(medida) == {"primeira_ms", "p50_ms", "p95_ms", "media_ms", "pico_rss_mb"}
+    assert 0 <= medida["p50_ms"] <= medida["p95_ms"]
+    assert len(_notas(fixture_pequena)) == 40  # save_note gravou na cópia, não na fixture
+
+
+def test_comparar_acusa_so_regressoes_acima_da_tolerancia():
+    base = {"resultados": [
+        {"n": 1000, "operacao": "a", "p50_ms": 10.0},
+        {"n": 1000, "operacao": "b", "p50_ms": 10.0},
+        {"n": 1000, "operacao": "c", "p50_ms": 0.0},
+    ]}
+    atual = {"resultados": [
+        {"n": 1000, "operacao": "a", "p50_ms": 11.9},
+        {"n": 1000, "operacao": "b", "p50_ms": 12.5},
+        {"n": 1000, "operacao": "c", "p50_ms": 5.0},
+        {"n": 10000, "operacao": "a", "p50_ms": 99.0},  # sem base para comparar
+    ]}
+
+    assert hot_paths.comparar(atual, base, tolerancia=0.2) == [(1000, "b", 10.0, 12.5)]
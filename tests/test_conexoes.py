@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+
+import pytest
+
+import db
+
+
+def _contar(conn=None):
+    return (conn or db.get_connection()).execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+
+def test_uma_conexao_por_thread_em_wal():
+    db.init_db()
+    conn = db.get_connection()
+    assert db.get_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == db.BUSY_TIMEOUT_MS
+
+    outras = []
+
+    def em_outra_thread():
+        outras.append(db.get_connection())
+        outras.append(db.get_connection())
+        db.close_connection()
+    t = threading.Thread(target=em_outra_thread)
+    t.start()
+    t.join()
+    assert outras[0] is outras[1]
+    assert outras[0] is not conn
+
+
+def test_conexoes_por_thread_limitadas(monkeypatch):
+    monkeypatch.setattr(db, "CONEXOES_POR_THREAD", 2)
+    db.init_db()
+    padrao = db.get_connection()
+    for usuario in ("ana", "bia", "caio"):
+        with db.usuario(usuario):
+            db.get_connection()
+    # A menos usada recentemente foi fechada; voltar a ela abre outra
+    with pytest.raises(sqlite3.ProgrammingError):
+        padrao.execute("SELECT 1")
+    assert db.get_connection() is not padrao
+    assert len(db._local.conexoes) == 2
+
+
+def test_transacao_aninhada_usa_a_externa():
+    db.init_db()
+    with db.transaction() as externa:
+        db.save_note("a", "a", [])  # save_note abre a sua transaction() por dentro
+        with db.transaction() as interna:
+            assert interna is externa
+            db.save_note("b", "b", [])
+        assert externa.in_transaction
+    assert _contar() == 2
+
+    # Um erro dentro da aninhada desfaz tudo, inclusive o que veio antes dela
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.save_note("c", "c", [])
+            with db.transaction():
+                db.save_note("d", "d", [])
+                raise RuntimeError("falhou")
+    assert _contar() == 2
+    assert not db.get_connection().in_transaction
+
+    # Depois do rollback, a próxima transação começa do zero
+    with db.transaction():
+        db.save_note("e", "e", [])
+    assert _contar() == 3
+
+
+def test_leitor_nao_espera_o_escritor():
+    db.init_db()
+    db.save_note("a", "a", [])
+    lido = []
+    with db.transaction():
+        db.save_note("b", "b", [])
+
+        # WAL: outra thread lê o último commit sem esperar o lock de escrita
+        def ler():
+            lido.append(_contar())
+            db.close_connection()
+        t = threading.Thread(target=ler)
+        t.start()
+        t.join(timeout=2)
+        assert lido == [1]
+    assert _contar() == 2
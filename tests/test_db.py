@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import db
+import ia
+
+
+def _vetor(*componentes):
+    vetor = np.zeros(db.EMBEDDING_DIM, dtype=np.float32)
+    vetor[:len(componentes)] = componentes
+    return vetor / np.linalg.norm(vetor)
+
+
+def test_embedding_sem_modelo_fica_com_o_modelo_atual():
+    db.init_db()
+    note_id = db.save_note("a", "a", [], embedding=_vetor(1))
+    db.update_note(note_id, "b", "b", "", new_embedding=_vetor(0, 1))
+    outra = db.save_note("c", "c", [], embedding=_vetor(1), model="antigo")
+
+    assert db.count_stale_notes(ia.MODEL_EMBEDDING) == 1  # só a gravada com outro modelo
+    modelos = dict(db.get_connection().execute("SELECT id, embedding_model FROM notes"))
+    assert modelos == {note_id: ia.MODEL_EMBEDDING, outra: "antigo"}
+
+
+def test_reindexador_pula_notas_com_job_embed_ativo():
+    db.init_db()
+    com_job = db.save_note("a", "a", [])
+    sem_job = db.save_note("b", "b", [])
+    db.enqueue_job(com_job, 'embed')
+
+    assert [row[0] for row in db.get_stale_notes(ia.MODEL_EMBEDDING, 10)] == [sem_job]
+    assert db.count_stale_notes(ia.MODEL_EMBEDDING) == 1
+
+    # Job que falhou de vez devolve a nota ao reindexador
+    job_id = db.claim_next_job(float("inf"))[0]
+    db.fail_job(job_id, "erro")
+    assert db.count_stale_notes(ia.MODEL_EMBEDDING) == 2
+
+
+def _todas_as_paginas(tamanho, **filtro):
+    paginas, antes = [], None
+    while True:
+        pagina = db.get_notes_page(tamanho, before=antes, **filtro)
+        if not pagina:
+            return paginas
+        paginas.append([nota[0] for nota in pagina])
+        antes = (pagina[-1][3], pagina[-1][0])
+
+
+def test_paginas_com_timestamps_iguais_nao_pulam_nem_repetem():
+    db.init_db()
+    mesmo = "2024-05-01T12:00:00"
+    ids = db.save_notes_batch([
+        ("velha", "v", ["Outra"], "2024-04-30T08:00:00", None),
+        *[(f"nota {i}", "s", ["Lote"], mesmo, None) for i in range(5)],
+        ("nova", "n", ["Lote"], "2024-05-02T08:00:00", None),
+    ])
+    velha, iguais, nova = ids[0], ids[1:6], ids[6]
+
+    paginas = _todas_as_paginas(2)
+
+    # Empate no timestamp desempata pelo id, do maior para o menor
+    assert paginas == [[nova, iguais[4]], [iguais[3], iguais[2]], [iguais[1], iguais[0]], [velha]]
+    # Cursor no meio do grupo empatado continua dentro dele
+    assert [n[0] for n in db.get_notes_page(10, before=(mesmo, iguais[2]))] == [iguais[1], iguais[0], velha]
+
+
+def test_paginas_com_filtro_de_tags():
+    db.init_db()
+    mesmo = "2024-05-01T12:00:00"
+    ids = db.save_notes_batch([(f"nota {i}", "s", ["Par" if i % 2 == 0 else "Ímpar"], mesmo, None) for i in range(6)])
+
+    assert _todas_as_paginas(2, tags=["par"]) == [[ids[4], ids[2]], [ids[0]]]
+    assert sum(_todas_as_paginas(4, tags=["par", "impar"], modo_tags="or"), []) == ids[::-1]
+
+
+def test_tags_normalizadas_e_facetas_e_ou():
+    db.init_db()
+    arte = db.save_note("a", "a", ["Arte", "Viagem"])
+    db.save_note("b", "b", ["arte ", "Música"])
+    db.save_note("c", "c", ["Artesanato"])
+
+    assert db.get_tag_counts() == [("Arte", 2), ("Artesanato", 1), ("Música", 1), ("Viagem", 1)]
+    assert sorted(db.get_note_ids_with_tags(["ARTE"])) == [arte, arte + 1]  # não casa com artesanato
+    assert db.get_note_ids_with_tags(["arte", "viagem"]) == [arte]
+    assert len(db.get_note_ids_with_tags(["#musica", "viagem"], modo_tags="or")) == 2
+    # Facetas dentro da seleção: o que mais aparece junto com "arte"
+    assert db.get_tag_counts(["arte"]) == [("Arte", 2), ("Música", 1), ("Viagem", 1)]
+    assert db.get_note_ids_with_tags([]) is None
+
+
+def test_modo_de_tags_invalido():
+    db.init_db()
+    with pytest.raises(ValueError):
+        db.get_tag_counts(["arte"], modo_tags="xor")
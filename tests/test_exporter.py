@@ -0,0 +1,116 @@
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+import db
+import exporter
+
+
+@pytest.fixture
+def notas():
+    db.init_db()
+    vetor = np.ones(db.EMBEDDING_DIM, dtype=np.float32) / np.sqrt(db.EMBEDDING_DIM)
+    ids = [
+        db.save_note("pão de fermentação natural", "pão", ["Cozinha", "Pão"], embedding=vetor, model="m"),
+        db.save_note("roteiro em Lisboa", "viagem", ["Viagem"], model="m"),
+        db.save_note("bolo de fubá", "bolo", ["Cozinha"], model="m"),
+    ]
+    for note_id, timestamp in zip(ids, ["2024-01-31T23:59:00", "2024-02-01T08:00:00", "2024-02-02T00:00:00"]):
+        db.get_connection().execute("UPDATE notes SET timestamp = ? WHERE id = ?", (timestamp, note_id))
+    return ids
+
+
+def _ids_jsonl(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return [json.loads(linha)["id"] for linha in f]
+
+
+def test_filtros_de_periodo_e_tags(notas, tmp_path):
+    a, b, c = notas
+    destino = str(tmp_path / "notas.jsonl")
+
+    assert exporter.exportar(destino)["notas"] == 3
+    assert _ids_jsonl(destino) == [a, b, c]
+    # As duas datas são inclusivas, o dia inteiro
+    exporter.exportar(destino, desde="2024-02-01", ate="2024-02-01")
+    assert _ids_jsonl(destino) == [b]
+    exporter.exportar(destino, ate="2024-01-31")
+    assert _ids_jsonl(destino) == [a]
+    exporter.exportar(destino, tags=["cozinha", "pao"])
+    assert _ids_jsonl(destino) == [a]
+    exporter.exportar(destino, tags=["pão", "viagem"], modo_tags="or")
+    assert _ids_jsonl(destino) == [a, b]
+    assert exporter.exportar(destino, desde="2030-01-01")["notas"] == 0
+    assert _ids_jsonl(destino) == []
+
+
+def test_jsonl_com_embeddings_traz_os_trechos(notas, tmp_path):
+    destino = str(tmp_path / "notas.jsonl")
+    exporter.exportar(destino, com_embeddings=True)
+
+    with open(destino, encoding="utf-8") as f:
+        linhas = [json.loads(linha) for linha in f]
+    assert linhas[0]["tags"] == ["Cozinha", "Pão"]
+    assert [len(linha["chunks"]) for linha in linhas] == [1, 0, 0]
+    trecho = linhas[0]["chunks"][0]
+    assert (trecho["start"], trecho["end"]) == (0, len("pão de fermentação natural"))
+    assert len(trecho["embedding"]) == db.EMBEDDING_DIM
+
+    exporter.exportar(destino)
+    with open(destino, encoding="utf-8") as f:
+        assert "chunks" not in json.loads(f.readline())
+
+
+def test_zip_tem_um_md_por_nota_e_o_jsonl(notas, tmp_path):
+    a, b, c = notas
+    destino = str(tmp_path / "backup.zip")
+    assert exporter.exportar(destino)["notas"] == 3
+
+    with zipfile.ZipFile(destino) as zf:
+        assert sorted(zf.namelist()) == sorted([
+            f"notas/2024-01-31-{a}.md", f"notas/2024-02-01-{b}.md", f"notas/2024-02-02-{c}.md", "notas.jsonl",
+        ])
+        assert "roteiro em Lisboa" in zf.read(f"notas/2024-02-01-{b}.md").decode("utf-8")
+        assert [json.loads(linha)["id"] for linha in zf.read("notas.jsonl").decode("utf-8").splitlines()] == [a, b, c]
+
+
+def test_md_na_saida_padrao(notas, capsys):
+    assert exporter.exportar("-", formato="md")["notas"] == 3
+    saida = capsys.readouterr().out
+    assert saida.count("\n---\n") == 2
+    assert saida.index("pão de fermentação") < saida.index("Lisboa") < saida.index("fubá")
+
+
+def test_formato_invalido(notas, tmp_path):
+    with pytest.raises(ValueError):
+        exporter.exportar(str(tmp_path / "notas.txt"))
+    with pytest.raises(ValueError):
+        exporter.exportar("-", formato="zip")
+
+
+@pytest.mark.parametrize("nome", ["notas.md", "notas.zip"])
+def test_falha_no_meio_nao_troca_o_destino(notas, tmp_path, monkeypatch, nome):
+    # O destino só é substituído quando a exportação termina: uma falha deixa o
+    # backup anterior intacto e não sobra .tmp
+    pasta = tmp_path / "backups"
+    pasta.mkdir()
+    destino = pasta / nome
+    destino.write_bytes(b"backup anterior")
+    original = exporter.nota_markdown
+
+    def falhar_na_segunda(note_id, *args):
+        if note_id == notas[1]:
+            raise OSError("disco cheio")
+        return original(note_id, *args)
+    monkeypatch.setattr(exporter, "nota_markdown", falhar_na_segunda)
+
+    with pytest.raises(OSError):
+        exporter.exportar(str(destino))
+    assert destino.read_bytes() == b"backup anterior"
+    assert sorted(p.name for p in pasta.iterdir()) == [nome]
+
+    monkeypatch.setattr(exporter, "nota_markdown", original)
+    assert exporter.exportar(str(destino))["notas"] == 3
+    assert sorted(p.name for p in pasta.iterdir()) == [nome]
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import ia
+
+
+def test_ler_enriquecimento_tolera_cerca_e_texto_em_volta():
+    resposta = 'Claro!\n```json\n{"resumo": " Pão de fermentação natural. ", "tags": ["#pão", "receita", "pão", " "]}\n```'
+
+    assert ia.ler_enriquecimento(resposta) == ("Pão de fermentação natural.", ["pão", "receita"])
+
+
+def test_ler_enriquecimento_aceita_summary_e_tags_em_texto():
+    resumo, tags = ia.ler_enriquecimento('{"summary": "ok", "tags": "a, b, c"}')
+
+    assert (resumo, tags) == ("ok", ["a", "b", "c"])
+
+
+def test_ler_enriquecimento_limita_as_tags():
+    tags = [f"t{i}" for i in range(ia.MAX_TAGS + 3)]
+
+    assert ia.ler_enriquecimento(json.dumps({"resumo": "r", "tags": tags}))[1] == tags[:ia.MAX_TAGS]
+
+
+@pytest.mark.parametrize("resposta", [
+    "sem json nenhum",
+    '{"resumo": "corta no meio',
+    '{"resumo": ["r"], "tags": []}',
+    '{"tags": ["a"]}',
+    '{"resumo": "   ", "tags": []}',
+    '{"resumo": "r", "tags": 3}',
+])
+def test_ler_enriquecimento_rejeita(resposta):
+    with pytest.raises(ValueError):
+        ia.ler_enriquecimento(resposta)
+
+
+@pytest.fixture
+def respostas(monkeypatch):
+    # Respostas do modelo em ordem; guarda as mensagens de cada chamada
+    fila, chamadas = [], []
+
+    def chamar(messages, model, max_tokens=ia.MAX_TOKENS_SAIDA, formato_json=False, tipo="chat"):
+        chamadas.append([dict(m) for m in messages])
+        return fila.pop(0)
+
+    monkeypatch.setattr(ia, "call_openrouter", chamar)
+    return fila, chamadas
+
+
+def test_enriquecer_pede_de_novo_quando_o_json_vem_invalido(respostas):
+    fila, chamadas = respostas
+    fila += ["Aqui está o resumo: ótima nota", '{"resumo": "r", "tags": ["a"]}']
+
+    saida = ia._enriquecer_validado("texto", False)
+
+    assert json.loads(saida) == {"resumo": "r", "tags": ["a"]}
+    assert len(chamadas) == 2
+    assert chamadas[1][1] == {"role": "assistant", "content": "Aqui está o resumo: ótima nota"}
+    assert chamadas[1][2]["role"] == "user"
+
+
+def test_enriquecer_desiste_depois_da_segunda_resposta_invalida(respostas):
+    fila, chamadas = respostas
+    fila += ["nada", '{"tags": []}']
+
+    with pytest.raises(ValueError):
+        ia._enriquecer_validado("texto", False)
+    assert len(chamadas) == 2  # o resto fica com a fila de jobs
+
+
+def test_enrich_text_guarda_no_cache_a_forma_validada(respostas):
+    fila, chamadas = respostas
+    fila += ['```json\n{"resumo": "r", "tags": ["#a", "a"]}\n```']
+
+    assert ia.enrich_text("nota só para o teste de cache") == ("r", ["a"])
+    assert ia.enrich_text("nota só para o teste de cache") == ("r", ["a"])
+    assert len(chamadas) == 1
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import db
+import ia
+
+
+class _Stub:
+    # Servidor OpenRouter falso: cada requisição consome a próxima resposta do roteiro
+    def __init__(self, roteiro):
+        self.roteiro = list(roteiro)
+        self.requisicoes = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                stub.requisicoes += 1
+                status, cabecalhos, atraso = stub.roteiro.pop(0) if stub.roteiro else (200, {}, 0)
+                threading.Event().wait(atraso)  # time.sleep é trocado no teste
+                corpo = json.dumps({"choices": [{"message": {"content": " ok "}}],
+                                    "usage": {"prompt_tokens": 3, "completion_tokens": 1}}).encode()
+                self.send_response(status)
+                for nome, valor in cabecalhos.items():
+                    self.send_header(nome, valor)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/chat"
+
+    def fechar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+@pytest.fixture
+def openrouter(monkeypatch):
+    stubs = []
+    esperas = []
+
+    def criar(*roteiro):
+        stub = _Stub(roteiro)
+        stubs.append(stub)
+        monkeypatch.setattr(ia, "OPENROUTER_API_URL", stub.url)
+        return stub
+
+    db.init_db()
+    monkeypatch.setattr(ia, "_limite", ia.TokenBucket(1000, 1000))
+    monkeypatch.setattr(ia.time, "sleep", esperas.append)
+    criar.esperas = esperas
+    yield criar
+    for stub in stubs:
+        stub.fechar()
+
+
+def _chamar():
+    return ia.call_openrouter([{"role": "user", "content": "oi"}], "modelo", tipo="teste")
+
+
+def test_429_respeita_retry_after_com_teto(openrouter):
+    stub = openrouter((429, {"Retry-After": "3600"}, 0), (429, {"Retry-After": "2"}, 0))
+    assert _chamar() == "ok"
+    assert stub.requisicoes == 3
+    assert openrouter.esperas == [ia.ESPERA_MAXIMA, 2.0]
+
+
+@pytest.mark.parametrize("valor", ["-5", "nan", "inf", "amanhã"])
+def test_retry_after_invalido_cai_no_backoff(openrouter, valor):
+    openrouter((429, {"Retry-After": valor}, 0))
+    assert _chamar() == "ok"
+    assert 0 <= openrouter.esperas[0] <= ia.BACKOFF_BASE
+
+
+def test_5xx_tenta_de_novo_com_backoff_exponencial(openrouter):
+    stub = openrouter((503, {}, 0), (502, {}, 0), (500, {}, 0))
+    assert _chamar() == "ok"
+    assert stub.requisicoes == 4
+    for tentativa, espera in enumerate(openrouter.esperas):
+        assert 0 <= espera <= ia.BACKOFF_BASE * 2 ** tentativa
+    uso = db.get_llm_usage()
+    assert [(tipo, chamadas, falhas) for tipo, _, chamadas, falhas, *_ in uso] == [("teste", 1, 0)]
+
+
+def test_5xx_desiste_apos_max_tentativas(openrouter):
+    stub = openrouter(*[(503, {}, 0)] * ia.MAX_TENTATIVAS)
+    with pytest.raises(requests.HTTPError):
+        _chamar()
+    assert stub.requisicoes == ia.MAX_TENTATIVAS
+    assert db.get_llm_usage()[0][3] == 1  # uma falha registrada
+
+
+def test_erro_do_cliente_nao_repete(openrouter):
+    stub = openrouter((400, {}, 0))
+    with pytest.raises(requests.HTTPError):
+        _chamar()
+    assert stub.requisicoes == 1
+    assert openrouter.esperas == []
+
+
+def test_timeout_de_leitura_tenta_de_novo(openrouter, monkeypatch):
+    monkeypatch.setattr(ia, "TIMEOUT", (1, 0.2))
+    stub = openrouter((200, {}, 0.5))
+    assert _chamar() == "ok"
+    assert stub.requisicoes == 2
+
+
+def test_timeout_em_todas_as_tentativas_levanta(openrouter, monkeypatch):
+    monkeypatch.setattr(ia, "TIMEOUT", (1, 0.1))
+    openrouter(*[(200, {}, 0.3)] * ia.MAX_TENTATIVAS)
+    with pytest.raises(requests.Timeout):
+        _chamar()
+    assert db.get_llm_usage()[0][3] == 1
+
+
+def test_token_bucket_limita_a_taxa():
+    balde = ia.TokenBucket(taxa=20, capacidade=2)
+    inicio = time.monotonic()
+    for _ in range(6):
+        balde.adquirir()
+    # 2 da rajada + 4 a 20/s
+    assert time.monotonic() - inicio >= 0.18
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import db
+import ia
+import importer
+
+
+@pytest.fixture
+def ia_falsa(monkeypatch):
+    # Encode e enriquecimento sem modelo nem rede; guarda o tamanho de cada lote codificado
+    lotes = []
+
+    def gerar(textos, batch_size=64):
+        lotes.append(len(textos))
+        return np.ones((len(textos), db.EMBEDDING_DIM), dtype=np.float32)
+
+    def enriquecer(texto):
+        if "falha" in texto:
+            raise RuntimeError("OpenRouter fora do ar")
+        return f"resumo de {texto[:5]}", ["importada"]
+
+    monkeypatch.setattr(ia, "generate_embeddings", gerar)
+    monkeypatch.setattr(ia, "enrich_text", enriquecer)
+    db.init_db()
+    return lotes
+
+
+def test_importa_em_lotes_e_retoma_pelo_checkpoint(ia_falsa, tmp_path):
+    pasta = tmp_path / "notas"
+    (pasta / "sub").mkdir(parents=True)
+    for i in range(5):
+        (pasta / f"nota{i}.txt").write_text(f"conteúdo {i}", encoding="utf-8")
+    (pasta / "sub" / "longa.md").write_text(" ".join(["palavra"] * 200), encoding="utf-8")
+    (pasta / "vazia.txt").write_text("   ", encoding="utf-8")
+    (pasta / "ignorada.pdf.bak").write_text("x", encoding="utf-8")
+
+    resultado = importer.importar_diretorio(str(pasta), batch_size=2, workers=2)
+
+    assert (resultado["total"], resultado["importadas"], resultado["falhas"]) == (7, 6, 1)
+    # Um model.encode por lote de arquivos, com todos os trechos deles (a longa tem 2)
+    assert sum(ia_falsa) == 7 and len(ia_falsa) == 4
+    rows = db.get_connection().execute("SELECT content, summary, tags, enrichment_status FROM notes").fetchall()
+    assert len(rows) == 6
+    assert all(status == 'done' and tags == "importada" for _, _, tags, status in rows)
+    assert len(db.get_chunk_keys()) == 7
+    assert db.count_stale_notes(ia.MODEL_EMBEDDING) == 0
+
+    # Segunda passada: só o que mudou ou ainda não entrou
+    (pasta / "nova.txt").write_text("nova", encoding="utf-8")
+    resultado = importer.importar_diretorio(str(pasta), batch_size=2, workers=2)
+    assert (resultado["total"], resultado["importadas"]) == (2, 1)  # a vazia é tentada de novo
+
+
+def test_falha_no_enriquecimento_deixa_a_nota_pendente(ia_falsa, tmp_path):
+    (tmp_path / "a.txt").write_text("vai dar falha", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("tudo certo", encoding="utf-8")
+
+    resultado = importer.importar_diretorio(str(tmp_path), batch_size=10)
+
+    assert resultado["importadas"] == 2
+    rows = dict(db.get_connection().execute("SELECT content, enrichment_status FROM notes"))
+    assert rows == {"vai dar falha": "pending", "tudo certo": "done"}
+    assert db.count_jobs() == {'queued': 1}
+
+
+def test_sem_enriquecer_tudo_vai_para_a_fila(ia_falsa, tmp_path):
+    for nome in ("a.txt", "b.md"):
+        (tmp_path / nome).write_text(nome, encoding="utf-8")
+
+    importer.importar_diretorio(str(tmp_path), enriquecer_agora=False)
+
+    assert db.count_jobs() == {'queued': 2}
+    assert {s for (s,) in db.get_connection().execute("SELECT enrichment_status FROM notes")} == {'pending'}
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import db
+import embeddings
+
+
+def _vetor(*componentes):
+    vetor = np.zeros(db.EMBEDDING_DIM, dtype=np.float32)
+    vetor[:len(componentes)] = componentes
+    return vetor / np.linalg.norm(vetor)
+
+
+def _mais_proxima(*componentes):
+    return embeddings.buscar_notas_por_vetores([_vetor(*componentes)], top_k=1)[0][0][0]
+
+
+@pytest.fixture
+def indice(monkeypatch):
+    db.init_db()
+    ids = [db.save_note(texto, texto, [], embedding=_vetor(*v), model="m")
+           for texto, v in [("a", (1, 0, 0)), ("b", (0, 1, 0)), ("c", (0, 0, 1))]]
+    embeddings.carregar_indice()
+
+    # Daqui em diante nada pode reconstruir o índice do zero: só atualizar no lugar
+    def proibido(*args, **kwargs):
+        raise AssertionError("índice reconstruído do zero")
+    monkeypatch.setattr(embeddings, "criar_indice_faiss", proibido)
+    yield ids
+    embeddings.descarregar(salvar=False)
+
+
+def test_salvar_alterar_e_excluir_atualizam_no_lugar(indice):
+    a, b, c = indice
+    index = embeddings.obter_indice()
+    assert index.ntotal == 3
+
+    nova = db.save_note("d", "d", [], embedding=_vetor(1, 1, 0), model="m")
+    assert _mais_proxima(1, 1, 0) == nova
+    db.update_note(a, "a2", "a2", "", new_embedding=_vetor(0, 1, 1))
+    assert _mais_proxima(0, 1, 1) == a
+    assert _mais_proxima(1, 0, 0) != a
+    db.delete_note(b)
+    assert b not in [note_id for note_id, _ in embeddings.buscar_notas_por_vetores([_vetor(0, 1, 0)], 10)[0]]
+
+    assert embeddings.obter_indice() is index
+    assert index.ntotal == 3
+
+
+def test_indice_volta_do_disco_sem_reconstruir(indice):
+    a, b, c = indice
+    embeddings.salvar_indice()
+    embeddings.descarregar()
+    assert not embeddings.indice_carregado()
+
+    # Alterações com o índice fora da memória vão direto para o armazém em disco
+    nova = db.save_note("d", "d", [], embedding=_vetor(1, 1, 0), model="m")
+    db.delete_note(c)
+
+    assert _mais_proxima(1, 1, 0) == nova
+    assert _mais_proxima(1, 0, 0) == a
+    assert sorted(db.nota_da_chave(chave)[0] for chave in embeddings.obter_indice().ids()) == sorted([a, b, nova])
+
+
+def test_carregar_repara_divergencia_pequena(indice):
+    a, b, c = indice
+    embeddings.descarregar()
+    # Nota gravada por outro processo (sem evento aqui): o carregamento compara com note_chunks
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM note_chunks WHERE note_id = ?", (c,))
+
+    embeddings.carregar_indice()
+
+    assert sorted(db.nota_da_chave(chave)[0] for chave in embeddings.obter_indice().ids()) == [a, b]
@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+import ia
+import startup
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+
+def test_importar_nao_carrega_bibliotecas_pesadas():
+    # O que a janela importa antes do primeiro desenho não pode trazer o modelo,
+    # o FAISS nem o OCR: esses só chegam em get_model()/carregar_indice()/ocr_image
+    codigo = (
+        "import sys; sys.path.insert(0, sys.argv[1])\n"
+        "import ia, embeddings, db, search, jobs, ocr, service, exporter, relacionadas\n"
+        "pesadas = ['sentence_transformers', 'torch', 'faiss', 'PIL', 'pytesseract']\n"
+        "print([m for m in pesadas if m in sys.modules])\n"
+    )
+    saida = subprocess.run([sys.executable, "-c", codigo, APP], capture_output=True, text=True, check=True)
+    assert saida.stdout.strip() == "[]"
+
+
+def _modelo_falso(monkeypatch, carregamentos):
+    class SentenceTransformer:
+        def __init__(self, nome):
+            carregamentos.append(nome)
+            time.sleep(0.05)  # janela para as outras threads chegarem no meio do carregamento
+
+        def encode(self, texto, **kwargs):
+            return np.ones(384, dtype=np.float32)
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=SentenceTransformer))
+    monkeypatch.setattr(ia, "_model", None)
+
+
+def test_modelo_carregado_uma_vez_mesmo_com_varias_threads(monkeypatch):
+    carregamentos = []
+    _modelo_falso(monkeypatch, carregamentos)
+    assert not ia.model_carregado()
+
+    modelos = []
+    threads = [threading.Thread(target=lambda: modelos.append(ia.get_model())) for _ in range(4)]
+    threads.append(ia.aquecer_modelo())
+    for t in threads[:4]:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert carregamentos == [ia.MODEL_EMBEDDING]
+    assert all(m is modelos[0] for m in modelos) and ia.get_model() is modelos[0]
+    assert ia.model_carregado()
+
+
+def test_embedding_em_cache_nao_carrega_o_modelo(monkeypatch):
+    import embedding_cache
+    carregamentos = []
+    _modelo_falso(monkeypatch, carregamentos)
+    monkeypatch.setattr(embedding_cache, "PERSISTIR", False)
+    embedding_cache.guardar("já visto", ia.MODEL_EMBEDDING, np.zeros(384, dtype=np.float32))
+
+    assert ia.generate_embedding("já visto") == [0.0] * 384
+    assert carregamentos == []
+    assert ia.generate_embedding("novo") == [1.0] * 384
+    assert carregamentos == [ia.MODEL_EMBEDDING]
+
+
+def test_marcos_de_inicializacao_registrados(tmp_path, monkeypatch):
+    monkeypatch.setattr(startup, "_marcos", {})
+    startup.marcar("imports")
+    startup.marcar("first_paint")
+    destino = tmp_path / "logs" / "startup_times.jsonl"
+
+    startup.registrar(str(destino))
+    startup.registrar(str(destino))
+
+    linhas = [json.loads(linha) for linha in destino.read_text(encoding="utf-8").splitlines()]
+    assert len(linhas) == 2
+    assert list(linhas[0]["marks_ms"]) == ["imports", "first_paint"]
+    assert linhas[0]["marks_ms"]["imports"] <= linhas[0]["marks_ms"]["first_paint"]
+    assert "first_paint" in startup.relatorio()
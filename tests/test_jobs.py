@@ -0,0 +1,104 @@
+import pytest
+
+import db
+import jobs
+
+
+@pytest.fixture
+def fila(monkeypatch):
+    # Relógio controlado pelo teste e ouvinte que registra o desfecho
+    db.init_db()
+    agora = [1000.0]
+    avisos = []
+    monkeypatch.setattr(jobs.time, "time", lambda: agora[0])
+    monkeypatch.setattr(jobs, "_ouvintes", [lambda note_id, kind, status: avisos.append((note_id, kind, status))])
+    monkeypatch.setattr(jobs, "_usuarios", {})
+    return agora, avisos
+
+
+def _job(note_id, kind):
+    return db.get_connection().execute(
+        "SELECT status, attempts, next_run_at, last_error FROM jobs WHERE note_id = ? AND kind = ?",
+        (note_id, kind)).fetchone()
+
+
+def _status(note_id):
+    return db.get_connection().execute("SELECT enrichment_status FROM notes WHERE id = ?", (note_id,)).fetchone()[0]
+
+
+def test_falha_reagenda_com_backoff_e_desiste(fila, monkeypatch):
+    agora, avisos = fila
+
+    def falhar(note_id, content):
+        raise RuntimeError("fora do ar")
+
+    monkeypatch.setitem(jobs.EXECUTORES, 'enrich', falhar)
+    note_id = db.save_note("texto", None, [], enrichment_status='pending')
+    jobs.enfileirar(note_id, 'enrich')
+
+    for tentativa in range(1, jobs.MAX_TENTATIVAS):
+        assert jobs.processar_um()
+        status, tentativas, proxima, erro = _job(note_id, 'enrich')
+        assert (status, tentativas, erro) == ('queued', tentativa, "RuntimeError: fora do ar")
+        assert proxima == agora[0] + jobs.BACKOFF_BASE * 2 ** (tentativa - 1)
+        assert not jobs.processar_um()  # ainda em backoff
+        agora[0] = proxima
+
+    assert jobs.processar_um()
+    assert _job(note_id, 'enrich')[:2] == ('failed', jobs.MAX_TENTATIVAS)
+    assert _status(note_id) == 'failed'
+    assert avisos == [(note_id, 'enrich', 'failed')]
+    assert jobs.pendentes() == 0
+
+
+def test_sucesso_depois_de_uma_falha(fila, monkeypatch):
+    agora, avisos = fila
+    resultados = [RuntimeError("429"), None]
+
+    def instavel(note_id, content):
+        erro = resultados.pop(0)
+        if erro:
+            raise erro
+        db.update_summary(note_id, "resumo")
+
+    monkeypatch.setitem(jobs.EXECUTORES, 'summary', instavel)
+    note_id = db.save_note("texto", "velho", [])
+    jobs.enfileirar(note_id, 'summary')
+    assert _status(note_id) == 'pending'
+
+    assert jobs.processar_um()
+    agora[0] += jobs.BACKOFF_BASE
+    assert jobs.processar_um()
+
+    assert _job(note_id, 'summary') is None  # job concluído sai da tabela
+    assert avisos == [(note_id, 'summary', 'done')]
+
+
+def test_falha_de_job_que_nao_e_enriquecimento_nao_marca_a_nota(fila, monkeypatch):
+    def falhar(note_id, content):
+        raise RuntimeError("sem índice")
+
+    monkeypatch.setattr(jobs, "MAX_TENTATIVAS", 1)
+    monkeypatch.setitem(jobs.EXECUTORES, 'related', falhar)
+    note_id = db.save_note("texto", "resumo", [])
+    jobs.enfileirar(note_id, 'related')
+
+    assert jobs.processar_um()
+    assert _job(note_id, 'related')[0] == 'failed'
+    assert _status(note_id) == 'done'
+
+
+def test_reenfileirar_nao_duplica_e_nota_apagada_conclui(fila):
+    note_id = db.save_note("texto", "resumo", [])
+    jobs.enfileirar(note_id, 'embed')
+    jobs.enfileirar(note_id, 'embed')
+    assert jobs.pendentes() == 1
+
+    db.delete_note(note_id)  # leva os jobs junto
+    assert jobs.pendentes() == 0
+
+    outra = db.save_note("texto", "resumo", [])
+    jobs.enfileirar(outra, 'embed')
+    db.get_connection().execute("DELETE FROM notes WHERE id = ?", (outra,))  # apagada por outro processo
+    assert jobs.processar_um()
+    assert jobs.pendentes() == 0
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+import ia
+import llm_cache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    # Cache em disco no banco temporário do teste, sem sobras de outros testes na memória
+    monkeypatch.setattr(llm_cache, "PERSISTIR", True)
+    monkeypatch.setattr(llm_cache, "_estatisticas", dict.fromkeys(llm_cache._estatisticas, 0))
+    llm_cache.limpar()
+    yield llm_cache
+    llm_cache.limpar()
+
+
+def test_mesmo_texto_normalizado_acerta(cache):
+    cache.guardar("tags", "m", 1, "Café  com\n leite", "café, leite")
+
+    assert cache.obter("tags", "m", 1, "Café com leite") == "café, leite"
+    assert cache.obter("tags", "m", 1, " Cafe\u0301 com leite ") == "café, leite"  # NFD vira NFC
+    assert cache.obter("tags", "m", 1, "café com leite") is None  # maiúsculas contam
+
+
+@pytest.mark.parametrize("tipo, modelo, versao", [
+    ("summary", "m", 1),  # outro tipo de resposta
+    ("tags", "outro", 1),  # trocar de modelo invalida
+    ("tags", "m", 2),  # trocar a versão do prompt invalida
+])
+def test_tipo_modelo_e_versao_fazem_parte_da_chave(cache, tipo, modelo, versao):
+    cache.guardar("tags", "m", 1, "texto", "a, b")
+
+    assert cache.obter(tipo, modelo, versao, "texto") is None
+
+
+def test_resposta_sobrevive_ao_reinicio_pelo_disco(cache):
+    cache.guardar("tags", "m", 1, "texto", "a, b")
+    with cache._lock:
+        cache._lru.clear()  # como um processo novo
+
+    assert cache.obter("tags", "m", 1, "texto") == "a, b"
+    assert cache.obter("tags", "m", 1, "texto") == "a, b"
+    stats = cache.estatisticas()
+    assert (stats["hits_disco"], stats["hits_memoria"], stats["itens_disco"]) == (1, 1, 1)
+
+
+def test_em_cache_so_chama_a_ia_uma_vez_e_nao_guarda_vazio(cache):
+    chamadas = []
+
+    def gerar(saida):
+        def chamar():
+            chamadas.append(saida)
+            return saida
+        return chamar
+
+    assert cache.em_cache("tags", "m", 1, "a", gerar("x, y")) == "x, y"
+    assert cache.em_cache("tags", "m", 1, "a", gerar("outra")) == "x, y"
+    assert cache.em_cache("tags", "m", 1, "b", gerar("")) == ""
+    assert cache.em_cache("tags", "m", 1, "b", gerar("z")) == "z"
+    assert chamadas == ["x, y", "", "z"]
+
+
+def test_poda_por_idade_e_por_quantidade(cache, monkeypatch):
+    for i in range(5):
+        cache.guardar("tags", "m", 1, f"texto {i}", f"saida {i}")
+    conn = cache._conectar()
+    velha = time.time() - (cache.MAX_IDADE_DIAS + 1) * 86400
+    conn.execute("UPDATE llm_cache SET created_at = ? WHERE output = 'saida 0'", (velha,))
+    conn.execute("UPDATE llm_cache SET last_used = 0 WHERE output = 'saida 1'")
+    monkeypatch.setattr(cache, "MAX_ITENS", 3)
+
+    cache._podar(conn)
+    conn.commit()
+
+    restantes = {row[0] for row in conn.execute("SELECT output FROM llm_cache")}
+    assert restantes == {"saida 2", "saida 3", "saida 4"}
+
+
+def test_extract_tags_usa_o_cache(cache, monkeypatch):
+    chamadas = []
+
+    def chamar(messages, model, max_tokens=ia.MAX_TOKENS_SAIDA, formato_json=False, tipo="chat"):
+        chamadas.append(tipo)
+        return "viagem, praia"
+    monkeypatch.setattr(ia, "call_openrouter", chamar)
+
+    assert ia.extract_tags("Férias na praia") == ["viagem", "praia"]
+    assert ia.extract_tags("Férias  na praia\n") == ["viagem", "praia"]
+    assert chamadas == ["tags"]
+
+    monkeypatch.setattr(ia, "PROMPT_VERSAO_TAGS", ia.PROMPT_VERSAO_TAGS + 1)
+    ia.extract_tags("Férias na praia")
+    assert chamadas == ["tags", "tags"]
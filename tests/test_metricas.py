@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import db
+import metricas
+
+
+@pytest.fixture(autouse=True)
+def limpo(monkeypatch):
+    monkeypatch.setattr(metricas, "ATIVO", True)
+    monkeypatch.setattr(metricas, "SQL", False)
+    monkeypatch.setattr(metricas, "LIMITE_LENTO_MS", None)
+    metricas.limpar()
+    yield
+    metricas.limpar()
+
+
+def _spans(nome):
+    return [s for s in metricas.instantaneo()["spans"] if s["span"] == nome]
+
+
+def test_medir_agrega_por_rotulos_e_conta_erros():
+    with metricas.medir("job", tipo="embed"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metricas.medir("job", tipo="embed"):
+            raise RuntimeError()
+    with metricas.medir("job", tipo="enrich"):
+        pass
+
+    por_tipo = {s["labels"]["tipo"]: s for s in _spans("job")}
+    assert por_tipo["embed"]["count"] == 2
+    assert por_tipo["embed"]["errors"] == 1
+    assert por_tipo["enrich"]["count"] == 1
+
+
+def test_texto_prometheus_tem_histograma_e_contadores():
+    metricas.registrar("llm", 7.0, {"tipo": "resumo"})
+    metricas.contar("erros", onde="observador")
+
+    texto = metricas.texto_prometheus()
+
+    assert 'memoro_span_seconds_bucket{span="llm",tipo="resumo",le="0.01"} 1' in texto
+    assert 'memoro_span_seconds_bucket{span="llm",tipo="resumo",le="0.005"} 0' in texto
+    assert 'memoro_span_seconds_count{span="llm",tipo="resumo"} 1' in texto
+    assert 'memoro_erros_total{onde="observador"} 1' in texto
+
+
+def test_desligado_nao_registra(monkeypatch):
+    monkeypatch.setattr(metricas, "ATIVO", False)
+    with metricas.medir("job"):
+        pass
+    metricas.contar("erros")
+    assert metricas.instantaneo() == {"spans": [], "counters": []}
+
+
+def test_sql_so_e_medido_quando_ligado(monkeypatch):
+    db.init_db()
+    db.get_all_notes()
+    assert type(db.get_connection()) is sqlite3.Connection
+    assert _spans("sqlite") == []
+
+    db.close_connection()
+    monkeypatch.setattr(metricas, "SQL", True)
+    db.get_all_notes()
+
+    assert {"consulta": "get_all_notes"} in [s["labels"] for s in _spans("sqlite")]
+
+
+def test_aviso_de_lentidao_so_com_limite_e_no_stderr(monkeypatch, capsys):
+    metricas.registrar("job", 10_000.0)
+    assert capsys.readouterr() == ("", "")
+
+    monkeypatch.setattr(metricas, "LIMITE_LENTO_MS", 5.0)
+    metricas.registrar("busca", 6.0)
+    metricas.registrar("llm", 6.0)  # limite próprio (15 s)
+
+    saida = capsys.readouterr()
+    assert saida.out == ""
+    assert saida.err.count("🐢") == 1 and "busca" in saida.err
@@ -0,0 +1,94 @@
+import json
+import sqlite3
+
+import db
+
+
+def _banco_baseline(caminho, notas):
+    # Formato anterior ao schema_version: notes com embedding JSON em TEXT
+    conn = sqlite3.connect(caminho)
+    conn.execute('''
+        CREATE TABLE notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT,
+            summary TEXT,
+            tags TEXT,
+            timestamp TEXT
+        )
+    ''')
+    conn.execute("ALTER TABLE notes ADD COLUMN embedding TEXT")
+    conn.executemany("INSERT INTO notes (content, summary, tags, timestamp, embedding) VALUES (?, ?, ?, ?, ?)", notas)
+    conn.commit()
+    conn.close()
+
+
+def _vetor_json(valor):
+    return json.dumps([valor] * db.EMBEDDING_DIM)
+
+
+def test_migracoes_em_banco_baseline(banco):
+    _banco_baseline(banco, [
+        ("Receita de pão", "pão caseiro", "Cozinha, Pão", "2024-01-01T10:00:00", _vetor_json(0.1)),
+        ("Viagem a Lisboa", "férias", "Viagem", "2024-01-02T10:00:00", _vetor_json(0.2)),
+        ("Sem vetor", "rascunho", "", "2024-01-03T10:00:00", None),
+        ("Vetor quebrado", "x", "Cozinha", "2024-01-04T10:00:00", "[1, 2"),
+    ])
+
+    db.init_db()
+
+    c = db.get_connection().cursor()
+    assert db.get_schema_version(c) == db.SCHEMA_MIGRATIONS[-1][0]
+    assert db.count_legacy_embeddings() == 3
+    assert db.search_keyword("lisboa", 10) == [2]
+    assert db.get_tag_counts() == [("Cozinha", 2), ("Pão", 1), ("Viagem", 1)]
+    # Os vetores antigos valem (eram do all-MiniLM-L6-v2); só outro modelo refaz tudo
+    assert db.count_stale_notes("all-MiniLM-L6-v2") == 1
+    assert db.count_stale_notes("qualquer") == 4
+    assert db.count_jobs() == {}
+
+    assert db.migrate_embeddings_to_blob(batch_size=2) == 3
+    assert db.count_legacy_embeddings() == 0
+    assert db.count_stale_notes("all-MiniLM-L6-v2") == 2  # o vetor quebrado foi descartado
+    assert sorted(db.nota_da_chave(chave) for chave in db.get_chunk_keys()) == [(1, 0), (2, 0)]
+    ids, medias = db.get_note_embeddings([1, 2, 3, 4])
+    assert ids.tolist() == [1, 2]
+    assert medias.shape == (2, db.EMBEDDING_DIM)
+
+
+def test_init_db_de_novo_nao_reaplica(banco):
+    _banco_baseline(banco, [("a", "a", "Tag", "2024-01-01T10:00:00", None)])
+    db.init_db()
+    db.init_db()
+
+    c = db.get_connection().cursor()
+    versoes = [row[0] for row in c.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versoes == [versao for versao, _ in db.SCHEMA_MIGRATIONS]
+    assert db.get_tag_counts() == [("Tag", 1)]
+
+
+def test_migracoes_nao_dependem_do_codigo_atual(banco, monkeypatch):
+    # Migrações publicadas congelam o que faziam: mudar helpers e constantes de
+    # hoje não muda o que um banco antigo recebe
+    import chunking
+    import ia
+
+    def proibido(*args, **kwargs):
+        raise AssertionError("migração chamou um helper vivo")
+
+    monkeypatch.setattr(db, "_gravar_tags", proibido)
+    monkeypatch.setattr(db, "enqueue_job", proibido)
+    monkeypatch.setattr(chunking, "quantidade", proibido)
+    monkeypatch.setattr(chunking, "PALAVRAS_POR_TRECHO", 2)
+    monkeypatch.setattr(ia, "MODEL_EMBEDDING", "outro-modelo")
+    monkeypatch.setattr(db, "EMBEDDING_BYTES", 8)
+    _banco_baseline(banco, [
+        ("curta demais para dois trechos", "x", "#Café ,cafe, Chá", "2024-01-01T10:00:00", _vetor_json(0.1)),
+        (" ".join(["palavra"] * 151), "y", "", "2024-01-02T10:00:00", _vetor_json(0.2)),
+    ])
+
+    db.init_db()
+
+    assert db.get_tag_counts() == [("#Café", 1), ("Chá", 1)]
+    assert db.count_stale_notes("all-MiniLM-L6-v2") == 0
+    c = db.get_connection().cursor()
+    assert c.execute("SELECT note_id, kind, status FROM jobs").fetchall() == [(2, 'embed', 'queued')]
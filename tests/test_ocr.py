@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ocr
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def tesseract_falso(monkeypatch):
+    # Pool de threads no lugar do de processos e um "Tesseract" que descreve a página
+    chamadas = []
+
+    def reconhecer(caminho, pagina, comando, tessdata, idioma=ocr.IDIOMA):
+        chamadas.append((caminho, pagina))
+        imagem = ocr.preprocessar(ocr.carregar_pagina(caminho, pagina))
+        return f"página {pagina} {imagem.mode} {imagem.size[0]}"
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(ocr, "_get_pool", lambda: pool)
+    monkeypatch.setattr(ocr, "reconhecer_pagina", reconhecer)
+    monkeypatch.setattr(ocr, "USAR_CACHE", True)
+    yield chamadas
+    pool.shutdown()
+
+
+def _tiff(caminho, paginas, tamanho=(60, 40)):
+    imagens = [Image.new("L", tamanho, color=40 * i) for i in range(paginas)]
+    imagens[0].save(caminho, save_all=True, append_images=imagens[1:])
+    return str(caminho)
+
+
+def test_limiar_otsu_separa_dois_picos():
+    histograma = [0] * 256
+    histograma[30] = 500
+    histograma[220] = 300
+
+    assert 30 <= ocr._limiar_otsu(histograma) < 220
+
+
+def test_preprocessar_reduz_e_binariza(monkeypatch):
+    monkeypatch.setattr(ocr, "LADO_MAXIMO", 100)
+    imagem = Image.new("RGB", (400, 200), "white")
+    imagem.paste((20, 20, 20), (50, 50, 150, 100))
+
+    saida = ocr.preprocessar(imagem)
+
+    assert saida.size == (100, 50)
+    assert saida.mode == "1"
+    assert saida.getextrema() == (0, 255)
+
+
+def test_paginas_em_ordem_e_cache_pelo_conteudo(tesseract_falso, tmp_path):
+    tiff = _tiff(tmp_path / "scan.tiff", 3)
+    png = tmp_path / "foto.png"
+    Image.new("L", (30, 30), 255).save(png)
+
+    paginas = list(ocr.extrair_paginas([tiff, str(png)]))
+
+    assert [(p[1], p[2]) for p in paginas] == [(0, 3), (1, 3), (2, 3), (0, 1)]
+    assert paginas[1][3] == "página 1 1 60"
+    assert sorted(tesseract_falso) == sorted([(tiff, 0), (tiff, 1), (tiff, 2), (str(png), 0)])
+
+    # Mesmo conteúdo com outro nome: vem do cache, sem Tesseract
+    copia = tmp_path / "copia.tiff"
+    copia.write_bytes(open(tiff, "rb").read())
+    tesseract_falso.clear()
+    assert ocr.extrair_texto(str(copia)) == "página 0 1 60\n\npágina 1 1 60\n\npágina 2 1 60"
+    assert tesseract_falso == []
+
+
+def test_versao_nova_do_preprocessamento_invalida_o_cache(tesseract_falso, tmp_path, monkeypatch):
+    png = tmp_path / "foto.png"
+    Image.new("L", (30, 30), 255).save(png)
+    ocr.extrair_texto(str(png))
+    monkeypatch.setattr(ocr, "VERSAO", ocr.VERSAO + 1)
+
+    ocr.extrair_texto(str(png))
+
+    assert tesseract_falso == [(str(png), 0), (str(png), 0)]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import db
+import embeddings
+import jobs
+import relacionadas
+
+
+def _vetor(*componentes):
+    vetor = np.zeros(db.EMBEDDING_DIM, dtype=np.float32)
+    vetor[:len(componentes)] = componentes
+    return vetor / np.linalg.norm(vetor)
+
+
+@pytest.fixture
+def notas():
+    db.init_db()
+    ids = [
+        db.save_note("a", "a", [], embedding=_vetor(1, 0, 0), model="m"),
+        db.save_note("b", "b", [], embedding=_vetor(1, 0.1, 0), model="m"),
+        db.save_note("c", "c", [], embedding=_vetor(1, 0.5, 0), model="m"),
+        db.save_note("d", "d", [], embedding=_vetor(0, 0, 1), model="m"),
+    ]
+    yield ids
+    embeddings.descarregar(salvar=False)
+
+
+def _processar_fila():
+    while jobs.processar_um():
+        pass
+
+
+def test_relacionadas_em_ordem_de_similaridade(notas):
+    a, b, c, d = notas
+
+    # A leitura não consulta o índice: enfileira o cálculo e avisa que está calculando
+    assert relacionadas.relacionadas(a) is None
+    assert db.count_jobs() == {'queued': 1}
+    _processar_fila()
+    vizinhas = relacionadas.relacionadas(a)
+
+    # d é ortogonal a a (similaridade 0): abaixo de SIMILARIDADE_MINIMA
+    assert [linha[0] for linha in vizinhas] == [b, c]
+    scores = [linha[4] for linha in vizinhas]
+    assert scores == sorted(scores, reverse=True)
+    assert all(score >= relacionadas.SIMILARIDADE_MINIMA for score in scores)
+    assert db.get_related_scores([a])[a][0][0] == b  # ficou guardada
+
+
+def test_lista_vazia_fica_marcada_como_calculada(notas):
+    a, b, c, d = notas
+    sem_vetor = db.save_note("e", "e", [])
+
+    assert relacionadas.relacionadas(d) is None
+    assert relacionadas.relacionadas(sem_vetor) is None
+    _processar_fila()
+
+    assert relacionadas.relacionadas(d) == []
+    assert relacionadas.relacionadas(sem_vetor) == []
+    assert db.count_jobs() == {}  # a segunda leitura não enfileira de novo
+
+
+def test_vetores_novos_invalidam_a_lista_e_as_que_citam_a_nota(notas):
+    a, b, c, d = notas
+    relacionadas.reconstruir()
+
+    db.update_note(c, "c", "c", "", new_embedding=_vetor(1, 0.05, 0), model="m")
+
+    # c estava nas listas de a e b; a de d (vazia) continua valendo
+    assert db.get_related_scores([a, b, c, d]) == {d: []}
+    assert relacionadas.relacionadas(a) is None
+    _processar_fila()
+    assert [linha[0] for linha in relacionadas.relacionadas(a)] == [c, b]
+
+
+def test_observador_enfileira_e_o_worker_atualiza_os_vizinhos(notas):
+    a, b, c, d = notas
+    embeddings.obter_indice()
+    relacionadas.reconstruir()
+
+    nova = db.save_note("e", "e", [], embedding=_vetor(1, 0.02, 0), model="m")
+
+    # Quem salvou não calculou nada: só o job ficou na fila
+    assert db.get_related_scores([nova]) == {}
+    assert db.count_jobs() == {'queued': 1}
+    _processar_fila()
+    assert db.get_related_scores([nova])[nova][0][0] == a
+    assert [vizinho for vizinho, _ in db.get_related_scores([a])[a]][:2] == [nova, b]
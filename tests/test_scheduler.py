@@ -0,0 +1,117 @@
+import threading
+import time
+
+from scheduler import AgendadorBusca
+from search import BuscaCancelada
+
+
+class _Registro:
+    # Coleta o que o agendador executou e publicou; esperar() bloqueia até a n-ésima publicação
+    def __init__(self, executar=None):
+        self.executadas = []
+        self.publicadas = []
+        self._cond = threading.Condition()
+        self._executar = executar
+
+    def executar(self, query, tempos, cancelado):
+        self.executadas.append(query)
+        if self._executar:
+            self._executar(query, cancelado)
+        tempos["search"] = 1.0
+        return [query.upper()]
+
+    def publicar(self, query, resultados, tempos):
+        with self._cond:
+            self.publicadas.append((query, resultados))
+            self._cond.notify_all()
+
+    def esperar(self, n, timeout=5):
+        with self._cond:
+            assert self._cond.wait_for(lambda: len(self.publicadas) >= n, timeout)
+
+
+def test_teclas_seguidas_viram_uma_busca():
+    registro = _Registro()
+    agendador = AgendadorBusca(registro.executar, registro.publicar, atraso=0.3)
+    for prefixo in ("c", "ca", "caf", "café"):
+        agendador.agendar(prefixo)
+        time.sleep(0.01)
+
+    registro.esperar(1)
+    time.sleep(0.4)
+    assert registro.executadas == ["café"]
+    assert registro.publicadas == [("café", ["CAFÉ"])]
+    assert agendador.ultimos_tempos == {"search": 1.0}
+
+
+def test_imediato_nao_espera_o_atraso():
+    registro = _Registro()
+    agendador = AgendadorBusca(registro.executar, registro.publicar, atraso=10)
+
+    agendador.agendar("enter", imediato=True)
+
+    registro.esperar(1, timeout=2)
+    assert registro.publicadas == [("enter", ["ENTER"])]
+
+
+def test_busca_superada_e_cancelada_e_nao_publica():
+    comecou, liberar = threading.Event(), threading.Event()
+
+    def executar(query, cancelado):
+        if query == "lenta":
+            comecou.set()
+            liberar.wait(5)
+            if cancelado():
+                raise BuscaCancelada()
+
+    registro = _Registro(executar)
+    agendador = AgendadorBusca(registro.executar, registro.publicar, atraso=0)
+    agendador.agendar("lenta")
+    assert comecou.wait(5)
+    agendador.agendar("nova")  # chega enquanto a anterior roda
+    liberar.set()
+
+    registro.esperar(1)
+    time.sleep(0.05)
+    assert registro.executadas == ["lenta", "nova"]
+    assert registro.publicadas == [("nova", ["NOVA"])]
+
+
+def test_resultado_que_chega_depois_de_outra_tecla_e_descartado():
+    # A busca não checou o cancelamento, mas a consulta já é outra: não publica
+    comecou, liberar = threading.Event(), threading.Event()
+
+    def executar(query, cancelado):
+        if query == "a":
+            comecou.set()
+            liberar.wait(5)
+
+    registro = _Registro(executar)
+    agendador = AgendadorBusca(registro.executar, registro.publicar, atraso=0)
+    agendador.agendar("a")
+    assert comecou.wait(5)
+    agendador.agendar("ab")
+    liberar.set()
+
+    registro.esperar(1)
+    time.sleep(0.05)
+    assert registro.publicadas == [("ab", ["AB"])]
+
+
+def test_erro_na_busca_nao_derruba_o_agendador(capsys):
+    rodou = threading.Event()
+
+    def executar(query, cancelado):
+        if query == "quebra":
+            rodou.set()
+            raise RuntimeError("falhou")
+
+    registro = _Registro(executar)
+    agendador = AgendadorBusca(registro.executar, registro.publicar, atraso=0)
+    agendador.agendar("quebra")
+    assert rodou.wait(5)
+    agendador.agendar("ok")
+
+    registro.esperar(1)
+    assert registro.publicadas == [("ok", ["OK"])]
+    assert "falhou" in capsys.readouterr().out
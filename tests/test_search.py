@@ -0,0 +1,96 @@
+import pytest
+
+import db
+import search
+
+
+def test_fundir_rankings_soma_as_posicoes():
+    # 3: 1/61 + 1/63 > 2: 2/62 > 1: 1/61 > 4: 1/63
+    assert search.fundir_rankings([1, 2, 3], [3, 2, 4]) == [3, 2, 1, 4]
+
+
+def test_fundir_rankings_presente_nas_duas_listas_ganha():
+    assert search.fundir_rankings([1, 2], [3, 2]) == [2, 1, 3]
+
+
+def test_fundir_rankings_empate_mantem_a_primeira_vista():
+    assert search.fundir_rankings([1], [2]) == [1, 2]
+    assert search.fundir_rankings([], [5, 6]) == [5, 6]
+    assert search.fundir_rankings() == []
+
+
+def test_fundir_rankings_k_menor_favorece_o_topo():
+    # 3 está em 3º nas duas listas: com k=60 soma mais que um 1º lugar isolado,
+    # com k=0 perde para os primeiros de cada lista
+    assert search.fundir_rankings([1, 2, 3], [4, 5, 3])[0] == 3
+    assert search.fundir_rankings([1, 2, 3], [4, 5, 3], k=0) == [1, 4, 3, 2, 5]
+
+
+@pytest.fixture
+def notas():
+    db.init_db()
+    return [
+        db.save_note("bolo de cenoura", "receita", ["Cozinha"]),
+        db.save_note("bolo de chocolate", "receita", ["Cozinha"]),
+        db.save_note("viagem a Lisboa", "férias", ["Viagem"]),
+    ]
+
+
+def test_search_funde_palavras_chave_e_vetores(notas, monkeypatch):
+    cenoura, chocolate, lisboa = notas
+    # Semântica põe Lisboa na frente; só as duas receitas têm "bolo"
+    monkeypatch.setattr(search, "buscar_trechos",
+                        lambda query, top_k, tempos=None, notas=None: [(lisboa, 0, 0.9), (chocolate, 0, 0.8)])
+
+    ids = [nota[0] for nota in search.search("bolo")]
+
+    assert ids[0] == chocolate  # nas duas listas
+    assert set(ids) == {cenoura, chocolate, lisboa}
+
+
+def test_search_sem_indice_usa_so_palavras_chave(notas, monkeypatch):
+    def indisponivel(*args, **kwargs):
+        raise RuntimeError("sem modelo")
+
+    monkeypatch.setattr(search, "buscar_trechos", indisponivel)
+
+    assert [nota[0] for nota in search.search("lisboa")] == [notas[2]]
+
+
+def test_separar_tags():
+    assert search.separar_tags("#viagem #arte praia") == ("praia", ["viagem", "arte"])
+    assert search.separar_tags("bolo #Cozinha-2024 de #ação") == ("bolo   de", ["Cozinha-2024", "ação"])
+    assert search.separar_tags("sem tags # aqui") == ("sem tags # aqui", [])
+    assert search.separar_tags("#so-tag") == ("", ["so-tag"])
+
+
+def test_search_filtra_pelas_tags(notas, monkeypatch):
+    cenoura, chocolate, lisboa = notas
+    monkeypatch.setattr(search, "buscar_trechos",
+                        lambda query, top_k, tempos=None, notas=None: [(n, 0, 0.5) for n in notas or []])
+
+    assert {nota[0] for nota in search.search("bolo", tags=["cozinha"])} == {cenoura, chocolate}
+    assert search.search("bolo", tags=["inexistente"]) == []
+    assert [nota[0] for nota in search.search("", tags=["viagem"])] == [lisboa]
+
+
+def test_palavras_chave_prefixo_so_na_palavra_sendo_digitada(notas):
+    cenoura, chocolate, lisboa = notas
+
+    assert search.buscar_palavras_chave("bolo choc", 10) == []
+    assert search.buscar_palavras_chave("bolo choc", 10, prefixo=True) == [chocolate]
+    # Só a última palavra vira prefixo
+    assert search.buscar_palavras_chave("bol chocolate", 10, prefixo=True) == []
+
+
+def test_search_keyword_ranqueia_so_as_notas_mais_recentes(notas, monkeypatch):
+    cenoura, chocolate, lisboa = notas
+    expr = search.expressao_fts("bolo")
+    todas = db.search_keyword(expr, 10)
+    assert set(todas) == {cenoura, chocolate}
+
+    # Com teto 1, só a nota mais nova que casa entra no ranking
+    monkeypatch.setattr(db, "CANDIDATOS_FTS", 1)
+    assert db.search_keyword(expr, 1) == [chocolate]
+    # Pedir mais do que o teto ainda devolve tudo
+    assert set(db.search_keyword(expr, 10)) == {cenoura, chocolate}
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import chunking
+import db
+import embeddings
+
+
+def _vetor(*componentes):
+    vetor = np.zeros(db.EMBEDDING_DIM, dtype=np.float32)
+    vetor[:len(componentes)] = componentes
+    return vetor / np.linalg.norm(vetor)
+
+
+def test_chave_trecho_ida_e_volta_e_limite():
+    chave = db.chave_trecho(123456, 65535)
+    assert db.nota_da_chave(chave) == (123456, 65535)
+    assert db.nota_da_chave(db.chave_trecho(7, 0)) == (7, 0)
+    # O índice 65536 cairia no note_id seguinte
+    with pytest.raises(ValueError):
+        db.chave_trecho(7, 1 << db.BITS_TRECHO)
+    with pytest.raises(ValueError):
+        db.chave_trecho(7, -1)
+
+
+def test_dividir_para_no_maximo_de_trechos(monkeypatch):
+    monkeypatch.setattr(chunking, "MAXIMO_TRECHOS", 3)
+    texto = " ".join(f"p{i}" for i in range(100))
+
+    trechos = chunking.dividir(texto, tamanho=10, sobreposicao=2)
+
+    assert len(trechos) == 3
+    assert trechos[0] == (0, texto.index(" p10"))
+    assert trechos[-1][1] == len(texto)  # o último cobre o resto do texto
+
+
+def test_dividir_sobrepoe_e_cobre_o_texto():
+    texto = " ".join(f"p{i}" for i in range(24))
+
+    trechos = chunking.dividir(texto, tamanho=10, sobreposicao=3)
+
+    assert [texto[inicio:fim].split()[0] for inicio, fim in trechos] == ["p0", "p7", "p14"]
+    assert trechos[-1][1] == len(texto)
+    assert chunking.dividir("curto", tamanho=10) == [(0, 5)]
+
+
+@pytest.fixture
+def indice(monkeypatch):
+    db.init_db()
+    monkeypatch.setattr(embeddings, "generate_embedding", lambda texto: _vetor(1, 0, 0))
+    yield
+    embeddings.descarregar(salvar=False)
+
+
+def test_busca_agrupa_os_trechos_pela_nota(indice):
+    longa = db.save_note("longa", "l", [])
+    curta = db.save_note("curta", "c", [])
+    # Os dez trechos da nota longa são mais parecidos com a consulta que a curta
+    db.update_chunks(longa, [(i, i + 1) for i in range(10)],
+                     np.stack([_vetor(1, 0.01 * (i + 1), 0) for i in range(10)]), model="m")
+    db.update_chunks(curta, [(0, 5)], _vetor(1, 1, 0).reshape(1, -1), model="m")
+
+    # top_k * TRECHOS_POR_NOTA = 6 trechos seriam todos da longa: a busca pede mais
+    acertos = embeddings.buscar_trechos("consulta", top_k=2)
+
+    assert [(note_id, chunk_index) for note_id, chunk_index, _ in acertos] == [(longa, 0), (curta, 0)]
+    assert acertos[0][2] > acertos[1][2]
+    assert [note_id for note_id, _ in embeddings.buscar_notas_por_vetores([_vetor(1, 0, 0)], top_k=2)[0]] \
+        == [longa, curta]
+
+
+def test_busca_com_filtro_de_notas(indice):
+    ids = [db.save_note(f"n{i}", "s", [], embedding=_vetor(1, 0.1 * i, 0), model="m") for i in range(4)]
+
+    acertos = embeddings.buscar_trechos("consulta", top_k=10, notas=[ids[3], ids[1]])
+
+    assert [note_id for note_id, _, _ in acertos] == [ids[1], ids[3]]
+    assert embeddings.buscar_trechos("consulta", notas=[]) == []
@@ -0,0 +1,125 @@
+import threading
+
+import numpy as np
+
+import embeddings
+import vetores
+
+DIMENSAO = 4
+
+
+def _vetores(n, inicio=0):
+    return np.arange(inicio * DIMENSAO, (inicio + n) * DIMENSAO, dtype='float32').reshape(n, DIMENSAO)
+
+
+def test_remover_vira_lapide_e_some_das_consultas(tmp_path):
+    armazem = vetores.ArmazemVetorial.criar(str(tmp_path), DIMENSAO)
+    armazem.anexar([10, 20, 30], _vetores(3))
+
+    assert armazem.remover([20, 99]) == [1]
+
+    assert armazem.lapides == 1
+    assert armazem.ntotal == 2
+    assert armazem.posicao(20) is None
+    assert armazem.posicao(30) == 2
+    assert armazem.posicoes([10, 20, 30]).tolist() == [0, 2]
+    assert armazem.ids().tolist() == [10, 30]
+
+
+def test_remover_chave_anexada_depois_de_ordenar(tmp_path):
+    armazem = vetores.ArmazemVetorial.criar(str(tmp_path), DIMENSAO)
+    armazem.anexar([1, 2], _vetores(2))
+    armazem.posicao(1)  # monta o mapa ordenado
+    armazem.anexar([3], _vetores(1, 2))
+
+    armazem.remover([3])
+
+    assert armazem.posicao(3) is None
+    assert armazem.posicoes([1, 2, 3]).tolist() == [0, 1]
+
+
+def test_compactar_publicar_e_reabrir(tmp_path):
+    pasta = str(tmp_path)
+    armazem = vetores.ArmazemVetorial.criar(pasta, DIMENSAO)
+    armazem.anexar([1, 2, 3, 4], _vetores(4))
+    armazem.publicar()
+    armazem.remover([2, 4])
+
+    novo = armazem.compactar()
+    # Ainda não publicado: abrir() continua na geração antiga
+    assert vetores.ArmazemVetorial.abrir(pasta, DIMENSAO).geracao == armazem.geracao
+    armazem.fechar()
+    novo.publicar()
+    novo.fechar()
+
+    reaberto = vetores.ArmazemVetorial.abrir(pasta, DIMENSAO)
+    assert reaberto.geracao == novo.geracao
+    assert len(reaberto) == 2
+    assert reaberto.lapides == 0
+    assert reaberto.ids().tolist() == [1, 3]
+    np.testing.assert_array_equal(reaberto.vetores, _vetores(4)[[0, 2]])
+    assert vetores._geracoes(pasta) == [novo.geracao]  # a geração antiga foi apagada
+
+
+def test_reabrir_mantem_lapides_e_descarta_anexo_incompleto(tmp_path):
+    pasta = str(tmp_path)
+    armazem = vetores.ArmazemVetorial.criar(pasta, DIMENSAO)
+    armazem.anexar([1, 2], _vetores(2))
+    armazem.publicar()
+    armazem.remover([1])
+    armazem.fechar()
+    with open(armazem.caminho + '.ids', 'ab') as f:
+        f.write(np.array([3], dtype='int64').tobytes())  # vetor da chave 3 nunca chegou ao .f32
+
+    reaberto = vetores.ArmazemVetorial.abrir(pasta, DIMENSAO)
+
+    assert len(reaberto) == 2
+    assert reaberto.lapides == 1
+    assert reaberto.ids().tolist() == [2]
+
+
+def test_abrir_outra_dimensao_ou_sem_publicacao(tmp_path):
+    pasta = str(tmp_path)
+    assert vetores.ArmazemVetorial.abrir(pasta, DIMENSAO) is None
+    armazem = vetores.ArmazemVetorial.criar(pasta, DIMENSAO)
+    armazem.anexar([1], _vetores(1))
+    assert vetores.ArmazemVetorial.abrir(pasta, DIMENSAO) is None
+    armazem.publicar()
+    assert vetores.ArmazemVetorial.abrir(pasta, DIMENSAO + 1) is None
+
+
+def test_descarregar_espera_a_reconstrucao(tmp_path):
+    class Indice:
+        def __init__(self, armazem):
+            self.armazem = armazem
+
+        def salvar(self):
+            pass
+
+    armazem = vetores.ArmazemVetorial.criar(str(tmp_path), DIMENSAO)
+    caminho = str(tmp_path / "memoro.db")
+    estado = embeddings._estado(caminho)
+    estado.index = Indice(armazem)
+    liberar = threading.Event()
+    fechado_durante = []
+
+    def reconstruir():
+        liberar.wait(5)
+        with estado.lock:
+            fechado_durante.append(estado.index is None)
+            estado.reconstrucao = None
+
+    estado.reconstrucao = threading.Thread(target=reconstruir)
+    estado.reconstrucao.start()
+    descarga = threading.Thread(target=embeddings.descarregar, args=(caminho,))
+    descarga.start()
+    descarga.join(0.2)
+
+    assert descarga.is_alive()  # não fecha o armazém com o treino em andamento
+    assert estado.index is not None
+    liberar.set()
+    descarga.join(5)
+    assert not descarga.is_alive()
+    assert fechado_durante == [False]
+    assert estado.index is None
+    assert caminho not in embeddings._estados